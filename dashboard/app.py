@@ -1,8 +1,10 @@
 import os
 
+import pandas as pd
 from dash import Dash, html, page_container, page_registry, Input, Output
 from .pages import components
 from .storage import LocalFileStorage
+from .storage.sessions import SESSION_TTL, SessionLifecycle
 
 BOOTSTRAP_CDN = (
     "https://cdn.jsdelivr.net/npm/bootstrap@5.2.3/dist/css/bootstrap.min.css"
@@ -12,10 +14,28 @@ FONT_AWESOME_CDN = (
 )
 VERSION = "v2.1.0"
 
+# cached dataframes are shared as shallow copies, so writes to them must copy the
+# data; always the case from pandas 3, where the option is deprecated
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 fs_dir = os.environ.get("DRUG_SCREENING_DATA_DIR", ".drug-screening-data")
 
 file_storage = LocalFileStorage.set_data_folder(fs_dir)
 
+# files of sessions unused for the TTL, or the oldest ones above the quota, are deleted
+session_ttl_hours = float(
+    os.environ.get("DRUG_SCREENING_SESSION_TTL_HOURS", SESSION_TTL / 3600)
+)
+data_quota_gb = os.environ.get("DRUG_SCREENING_DATA_QUOTA_GB")
+session_lifecycle = SessionLifecycle(
+    fs_dir,
+    ttl=session_ttl_hours * 3600,
+    max_bytes=int(float(data_quota_gb) * 2**30) if data_quota_gb else None,
+)
+LocalFileStorage.set_session_lifecycle(session_lifecycle)
+session_lifecycle.start()
+
 app = Dash(
     __name__, external_stylesheets=[BOOTSTRAP_CDN, FONT_AWESOME_CDN], use_pages=True
 )
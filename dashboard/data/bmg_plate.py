@@ -5,6 +5,9 @@ import logging
 
 from collections import namedtuple
 from enum import Enum, auto
+from typing import Callable
+
+from dashboard.data.jobs import JobProgress
 
 logger = logging.getLogger(__name__)
 
@@ -177,20 +180,22 @@ def parse_bmg_file(filename: str, filecontent: io.StringIO) -> np.ndarray:
 
 
 def parse_bmg_files(
-    files: tuple[str, io.StringIO]
+    files: tuple[str, io.StringIO],
+    on_progress: Callable[[int, int, dict[str, str]], None] | None = None,
 ) -> tuple[pd.DataFrame, np.ndarray, dict[str, str]]:
     """
     Parse file from iostring with BMG files to DataFrame
 
     :param files: tuple containing names and content of files
-    :param failed_files: dictionary with failed files
+    :param on_progress: called after every file with the number of parsed files,
+        the number of all files and the failed files so far
     :return: DataFrame with BMG files (=plates) as rows,
         plates values as np.array and failed files with errors
     """
     plate_summaries = []
     plate_values = []
     failed_files = {}
-    for filename, filecontent in files:
+    for parsed, (filename, filecontent) in enumerate(files, start=1):
         try:
             barcode, plate_array = parse_bmg_file(filename, filecontent)
             plate = Plate(barcode, plate_array)
@@ -200,11 +205,33 @@ def parse_bmg_files(
         except Exception as e:
             logger.warning(f"Error while parsing file {filename}: {e}")
             failed_files[filename] = str(e)
+        if on_progress is not None:
+            on_progress(parsed, len(files), failed_files)
     df = pd.DataFrame(plate_summaries)
     plate_values = np.asarray(plate_values)
     return df, plate_values, failed_files
 
 
+def parse_bmg_job(
+    files: tuple[tuple[str, str], ...], progress: JobProgress
+) -> tuple[pd.DataFrame, np.ndarray, dict[str, str]]:
+    """
+    Background job of `parse_bmg_files`, the failed files so far are its partial
+    result
+
+    :param files: names and decoded contents of the files
+    :param progress: progress of the job
+    :return: DataFrame with BMG files (=plates) as rows,
+        plates values as np.array and failed files with errors
+    """
+    return parse_bmg_files(
+        tuple((filename, io.StringIO(content)) for filename, content in files),
+        lambda parsed, total, failed_files: progress.update(
+            parsed / total, f"Parsed {parsed} of {total} files", dict(failed_files)
+        ),
+    )
+
+
 def calculate_activation_inhibition_zscore(
     values: np.ndarray,
     stats: dict,
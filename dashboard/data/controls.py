@@ -1,36 +1,50 @@
-import itertools
-
 import numpy as np
 import pandas as pd
 
-from typing import Any
+from dashboard.data.similarity_search import popcount_rows
+
+# above this many controls only the labeled ones and a random sample of the rest
+# are generated, 2^12 covers all combinations of up to 12 assays
+MAX_CONTROLS = 2**12
+# annotations of controls shown on the projection plots, only these get labels
+LABELED_ANNOTATIONS = (
+    "ALL NEGATIVE",
+    "ALL POSITIVE",
+    "ALL BUT ONE NEGATIVE",
+    "ALL BUT ONE POSITIVE",
+)
 
 
-def controls_index_annotator(index: Any) -> str:
+def annotate_control_masks(masks: np.ndarray, num_assays: int) -> np.ndarray:
     """
-    Annotate control index.
+    Annotate controls encoded as bitmasks by their numbers of positive and
+    negative assays.
 
-    :param index: index value to annotate
-    :return: control annotation
+    :param masks: uint64 array of controls, bit i set if assay i is positive
+    :param num_assays: number of assays
+    :return: array with control annotations
     """
-    index_as_str = str(index)
-    num_assays = index_as_str.count("%")
-    if not num_assays:
-        return "NOT CONTROL"
-    pos, neg = index_as_str.split(";")
-    pos_assays = pos.count("%")
+    pos_assays = popcount_rows(np.asarray(masks, dtype=np.uint64)[:, None])
     neg_assays = num_assays - pos_assays
-    if not pos_assays:
-        return "ALL NEGATIVE"
-    if not neg_assays:
-        return "ALL POSITIVE"
-    if pos_assays == 1 and neg_assays != 1:
-        return "ALL BUT ONE NEGATIVE"
-    if pos_assays != 1 and neg_assays == 1:
-        return "ALL BUT ONE POSITIVE"
-    if pos_assays >= neg_assays:
-        return "MORE POSITIVE"
-    return "MORE NEGATIVE"
+    return np.select(
+        [
+            np.full(len(pos_assays), num_assays == 0),
+            pos_assays == 0,
+            neg_assays == 0,
+            (pos_assays == 1) & (neg_assays != 1),
+            (pos_assays != 1) & (neg_assays == 1),
+            pos_assays >= neg_assays,
+        ],
+        [
+            "NOT CONTROL",
+            "ALL NEGATIVE",
+            "ALL POSITIVE",
+            "ALL BUT ONE NEGATIVE",
+            "ALL BUT ONE POSITIVE",
+            "MORE POSITIVE",
+        ],
+        default="MORE NEGATIVE",
+    ).astype(object)
 
 
 def create_control_id(values: np.ndarray, columns: list[str]) -> str:
@@ -50,23 +64,85 @@ def create_control_id(values: np.ndarray, columns: list[str]) -> str:
     return f"{positive}; {negative}"
 
 
-def generate_controls(columns: list[str], key_column: str = "EOS") -> pd.DataFrame:
+def control_mask_bits(masks: np.ndarray, num_assays: int) -> np.ndarray:
+    """
+    Decode controls encoded as bitmasks
+
+    :param masks: uint64 array of controls, bit i set if assay i is positive
+    :param num_assays: number of assays
+    :return: uint8 array of shape (n, num_assays), 1 for positive assays
+    """
+    shifts = np.arange(num_assays, dtype=np.uint64)
+    bits = (np.asarray(masks, dtype=np.uint64)[:, None] >> shifts) & np.uint64(1)
+    return bits.astype(np.uint8)
+
+
+def generate_control_masks(
+    num_assays: int, max_controls: int | None = MAX_CONTROLS, random_state: int = 0
+) -> np.ndarray:
+    """
+    Generate all positive/negative combinations of assays as bitmasks. If there are
+    more than max_controls of them, all controls with labeled annotations are kept
+    and the rest is randomly sampled.
+
+    :param num_assays: number of assays, at most 63
+    :param max_controls: maximal number of controls, None for all combinations
+    :param random_state: seed of the sampling
+    :return: sorted uint64 array of controls, bit i set if assay i is positive
+    """
+    if num_assays > 63:
+        raise ValueError("At most 63 assays can be encoded as control bitmasks")
+    num_controls = 2**num_assays
+    if max_controls is None or num_controls <= max_controls:
+        return np.arange(num_controls, dtype=np.uint64)
+
+    extremes = np.array([0, num_controls - 1], dtype=np.uint64)
+    single = np.left_shift(np.uint64(1), np.arange(num_assays, dtype=np.uint64))
+    labeled = np.unique(np.concatenate([extremes, single, extremes[1] ^ single]))
+
+    rng = np.random.default_rng(random_state)
+    n_samples = max(max_controls - len(labeled), 0)
+    sampled = rng.integers(
+        0, num_controls, size=n_samples, dtype=np.uint64, endpoint=False
+    )
+    return np.union1d(labeled, sampled)
+
+
+def generate_controls(
+    columns: list[str],
+    key_column: str = "EOS",
+    max_controls: int | None = MAX_CONTROLS,
+    random_state: int = 0,
+) -> pd.DataFrame:
     """
     Generate control data for a given set of columns with all possible positive/negative activations.
-    For inhibition values are inverted.
+    For inhibition values are inverted. Controls are encoded as bitmasks and annotated
+    by counting positive assays, ID labels are created only for labeled annotations.
     :param columns: list of chemical assay columns
     :param key_column: name of the ID column, defaults to "EOS"
-    :return: dataframe with control data
+    :param max_controls: maximal number of controls, see `generate_control_masks`
+    :param random_state: seed of the sampling of controls
+    :return: dataframe with control data, bitmask and annotation of each control
     """
-    sequences = list(itertools.product([0, 1], repeat=len(columns)))
-    control_data = np.array(sequences)
-    is_activation = np.array(["ACTIVATION" in col for col in columns])
+    masks = generate_control_masks(len(columns), max_controls, random_state)
+    control_data = control_mask_bits(masks, len(columns))
+    annotations = annotate_control_masks(masks, len(columns))
+
+    is_activation = np.array(["ACTIVATION" in col for col in columns], dtype=bool)
     column_prefixes = [col.split("-")[0].strip() for col in columns]
-    control_index = [create_control_id(row, column_prefixes) for row in control_data]
+    labeled = np.flatnonzero(np.isin(annotations, LABELED_ANNOTATIONS))
+    control_index = np.full(len(masks), None, dtype=object)
+    control_index[labeled] = [
+        create_control_id(control_data[i], column_prefixes) for i in labeled
+    ]
+
     control_data[:, ~is_activation] ^= 1
-    control_data = control_data * 100
     control_data = pd.DataFrame(
-        control_data, columns=columns, index=range(len(sequences))
+        control_data.astype(np.int64) * 100,
+        columns=columns,
+        index=range(len(masks)),
     )
     control_data[key_column] = control_index
+    control_data["control_mask"] = masks.astype(np.int64)
+    control_data["annotation"] = annotations
     return control_data
@@ -1,7 +1,11 @@
+from typing import Callable
+
 import numpy as np
 import pandas as pd
 from scipy.optimize import curve_fit
 
+from dashboard.data.jobs import JobProgress
+
 
 def four_param_logistic(
     x: float, lower_limit: float, upper_limit: float, ic50: float, slope: float
@@ -57,12 +61,17 @@ def calculate_modulation_ic50_and_concentration_50(row: pd.Series) -> pd.Series:
     )
 
 
-def curve_fit_for_activation(screen_df: pd.DataFrame) -> pd.DataFrame:
+def curve_fit_for_activation(
+    screen_df: pd.DataFrame,
+    on_progress: Callable[[int, int, list[str]], None] | None = None,
+) -> pd.DataFrame:
     """
     For each compound, performs the curve fitting based on CONCENTRATION column
     (x axis) and VALUE column (y axis)
 
     :param screen_df: screening dataframe mapping EOS-CONCENTRATION pair into a value
+    :param on_progress: called after every compound with the number of fitted
+        compounds, the number of all compounds and the compounds failing the fit
     :return: dataframe denoting curve fit parameters for every EOS
     """
     LOWER_BOUND = -100
@@ -73,7 +82,8 @@ def curve_fit_for_activation(screen_df: pd.DataFrame) -> pd.DataFrame:
     curve_fit_params = {
         key: [] for key in ["EOS", *fit_props, *concentration_props, "r2"]
     }
-    for key, group in by_eos:
+    unfit = []
+    for fitted, (key, group) in enumerate(by_eos, start=1):
         by_conc = group.groupby("CONCENTRATION")
         values_avg = by_conc["VALUE"].mean()
         x = values_avg.index.to_numpy()
@@ -83,6 +93,7 @@ def curve_fit_for_activation(screen_df: pd.DataFrame) -> pd.DataFrame:
         except RuntimeError:
             print(f"EOS: {key} - curve_fit failed")
             params = [np.nan] * 4
+            unfit.append(key)
 
         curve_fit_params["EOS"].append(key)
         for i, name in enumerate(fit_props):
@@ -97,6 +108,8 @@ def curve_fit_for_activation(screen_df: pd.DataFrame) -> pd.DataFrame:
         ss_tot = np.sum((y - np.mean(y)) ** 2)
         r2 = 1 - (ss_res / ss_tot)
         curve_fit_params["r2"].append(r2)
+        if on_progress is not None:
+            on_progress(fitted, by_eos.ngroups, unfit)
 
     curve_fit_df = pd.DataFrame(curve_fit_params)
     curve_fit_df["operator"] = np.where(
@@ -180,6 +193,7 @@ def perform_hit_determination(
     concentration_upper_bound: float,
     top_lower_bound: float,
     top_upper_bound: float,
+    on_progress: Callable[[int, int, list[str]], None] | None = None,
 ) -> pd.DataFrame:
     """
     Performs hit determination on the screening data.
@@ -189,10 +203,11 @@ def perform_hit_determination(
     :param concentration_upper_bound: upper bound for concentration
     :param top_lower_bound: lower bound for top
     :param top_upper_bound: upper bound for top
+    :param on_progress: progress of the curve fitting, see `curve_fit_for_activation`
     :return: hit determination data
     """
     sorted_df = screen_df.sort_values(by=["EOS", "CONCENTRATION"])
-    curve_fit_df = curve_fit_for_activation(screen_df)
+    curve_fit_df = curve_fit_for_activation(screen_df, on_progress)
 
     aggregated_df = (
         sorted_df.groupby(["EOS", "CONCENTRATION"])
@@ -218,3 +233,35 @@ def perform_hit_determination(
         top_lower_bound,
         top_upper_bound,
     )
+
+
+def hit_determination_job(
+    screen_df: pd.DataFrame,
+    concentration_lower_bound: float,
+    concentration_upper_bound: float,
+    top_lower_bound: float,
+    top_upper_bound: float,
+    progress: JobProgress,
+) -> pd.DataFrame:
+    """
+    Background job of `perform_hit_determination`, the compounds failing the
+    curve fit so far are its partial result
+
+    :param screen_df: screening data
+    :param concentration_lower_bound: lower bound for concentration
+    :param concentration_upper_bound: upper bound for concentration
+    :param top_lower_bound: lower bound for top
+    :param top_upper_bound: upper bound for top
+    :param progress: progress of the job
+    :return: hit determination data
+    """
+    return perform_hit_determination(
+        screen_df,
+        concentration_lower_bound,
+        concentration_upper_bound,
+        top_lower_bound,
+        top_upper_bound,
+        lambda fitted, total, unfit: progress.update(
+            fitted / total, f"Fitted {fitted} of {total} compounds", list(unfit)
+        ),
+    )
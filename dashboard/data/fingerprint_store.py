@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import pathlib
+import threading
+import typing
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dashboard.data.jobs import process_instance
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+SEGMENT_PATTERN = "segment-*.pq"
+MAX_SEGMENTS = 32
+# lock file of a store directory, held while its segments are merged
+COMPACT_LOCK = ".compact.lock"
+
+
+class FingerprintStore:
+    """
+    On-disk store of bit-packed fingerprints keyed by canonical SMILES, shared
+    across sessions and worker processes.
+
+    Every batch of new fingerprints is appended as a separate, atomically renamed
+    parquet segment, so concurrent writers never overwrite each other. Segments are
+    merged by one process at a time once there are more than MAX_SEGMENTS of them;
+    other processes load the merged segment again. Non-canonical input
+    spellings are stored as aliases, so repeated uploads are not parsed again.
+    """
+
+    def __init__(
+        self, directory: pathlib.Path | str, radius: int = 2, n_bits: int = 2048
+    ) -> None:
+        """
+        :param directory: root directory of the store
+        :param radius: radius of the stored Morgan fingerprints
+        :param n_bits: length of the stored fingerprints in bits
+        """
+        self.radius = radius
+        self.n_bits = n_bits
+        self.n_bytes = n_bits // 8
+        self.directory = pathlib.Path(directory) / f"ecfp_r{radius}_{n_bits}"
+        self._lock = threading.Lock()
+        self._loaded_segments = set()
+        self._index = {}
+        self._fingerprints = np.empty((0, self.n_bytes), dtype=np.uint8)
+
+    def __reduce__(self) -> tuple:
+        # pickled as its location, e.g. for background jobs, and unpickled as the
+        # store of the location shared by all jobs of the process
+        return (
+            process_instance,
+            (FingerprintStore, self.directory.parent, self.radius, self.n_bits),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def lookup(self, smiles: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find stored fingerprints of the given smiles
+
+        :param smiles: list of smiles
+        :return: positions of found smiles and their bit-packed fingerprints
+        """
+        with self._lock:
+            self._refresh()
+            index = self._index
+            positions, rows = [], []
+            for i, key in enumerate(smiles):
+                row = index.get(key) if isinstance(key, str) else None
+                if row is not None:
+                    positions.append(i)
+                    rows.append(row)
+            return (
+                np.array(positions, dtype=np.int64),
+                self._fingerprints[np.array(rows, dtype=np.int64)],
+            )
+
+    def add(
+        self,
+        canonical_smiles: list[str],
+        fingerprints: np.ndarray,
+        aliases: list[str] | None = None,
+    ) -> None:
+        """
+        Append fingerprints missing from the store as a new segment
+
+        :param canonical_smiles: canonical smiles of the fingerprints
+        :param fingerprints: uint8 array of bit-packed fingerprints
+        :param aliases: input spellings of the same smiles, stored if not canonical
+        """
+        keys = list(canonical_smiles)
+        rows = list(range(len(keys)))
+        for i, alias in enumerate(aliases or []):
+            if alias != keys[i]:
+                keys.append(alias)
+                rows.append(i)
+
+        with self._lock:
+            self._refresh()
+            new_keys, new_rows, seen = [], [], set()
+            for key, row in zip(keys, rows):
+                if key not in self._index and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(row)
+            if not new_keys:
+                return
+            self._write_segment(new_keys, fingerprints[new_rows])
+            self._refresh()
+            if len(self._segment_paths()) > MAX_SEGMENTS:
+                self._compact()
+
+    def _segment_paths(self) -> list[pathlib.Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob(SEGMENT_PATTERN))
+
+    def _write_segment(self, keys: list[str], fingerprints: np.ndarray) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fingerprints = np.ascontiguousarray(fingerprints, dtype=np.uint8)
+        fp_array = pa.FixedSizeBinaryArray.from_buffers(
+            pa.binary(self.n_bytes),
+            len(keys),
+            [None, pa.py_buffer(fingerprints.tobytes())],
+        )
+        table = pa.table({"smiles": pa.array(keys, pa.string()), "fp": fp_array})
+        name = f"segment-{uuid.uuid4().hex}.pq"
+        temp_path = self.directory / f".{name}.tmp"
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, self.directory / name)
+
+    def _read_segment(self, path: pathlib.Path) -> tuple[list[str], np.ndarray]:
+        table = pq.read_table(path)
+        fp_column = table.column("fp").combine_chunks()
+        data = np.frombuffer(fp_column.buffers()[1], dtype=np.uint8)
+        offset = fp_column.offset * self.n_bytes
+        fingerprints = data[offset : offset + len(fp_column) * self.n_bytes]
+        return (
+            table.column("smiles").to_pylist(),
+            fingerprints.reshape(-1, self.n_bytes),
+        )
+
+    def _refresh(self) -> None:
+        """
+        Load segments written since the last refresh (also by other processes).
+        Once loaded segments are gone, merged by another process, everything is
+        loaded again from the current segments.
+        """
+        paths = self._segment_paths()
+        names = {path.name for path in paths}
+        if not self._loaded_segments <= names:
+            self._loaded_segments = set()
+            self._index = {}
+            self._fingerprints = np.empty((0, self.n_bytes), dtype=np.uint8)
+
+        new_keys, new_fingerprints = [], []
+        for path in paths:
+            if path.name in self._loaded_segments:
+                continue
+            try:
+                keys, fingerprints = self._read_segment(path)
+            except FileNotFoundError:  # merged away by another process
+                continue
+            self._loaded_segments.add(path.name)
+            new_keys.extend(keys)
+            new_fingerprints.append(fingerprints)
+        if not new_keys:
+            return
+        offset = len(self._fingerprints)
+        self._fingerprints = np.concatenate([self._fingerprints, *new_fingerprints])
+        for i, key in enumerate(new_keys):
+            self._index.setdefault(key, offset + i)
+
+    @contextlib.contextmanager
+    def _compact_lock(self) -> typing.Iterator[None]:
+        # exclusive across the processes sharing the store
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / COMPACT_LOCK, "ab") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _compact(self) -> None:
+        """
+        Merge all segments into a single one, unless another process just did
+        """
+        with self._compact_lock():
+            self._refresh()
+            merged_paths = [
+                path
+                for path in self._segment_paths()
+                if path.name in self._loaded_segments
+            ]
+            if len(merged_paths) <= MAX_SEGMENTS:
+                return
+            keys = list(self._index)
+            fingerprints = self._fingerprints[list(self._index.values())]
+            self._write_segment(keys, fingerprints)
+            for path in merged_paths:
+                path.unlink(missing_ok=True)
+            self._refresh()
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import pathlib
+import pickle
+import threading
+import time
+import typing
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# worker processes of one job runner, started on the first submitted job
+JOB_WORKERS = int(os.environ.get("DRUG_SCREENING_JOB_WORKERS", 2))
+# files of jobs are kept this long after their last update, then deleted
+JOB_TTL = 24 * 3600
+# progress of a running job is written at most this often
+PROGRESS_INTERVAL = 0.5
+# workers of process pools are started by a clean server process, not forked from
+# a process whose threads (e.g. of numba or OpenMP) do not survive a fork
+START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+# modules with the functions of process pools, imported once by the forkserver, so
+# that their workers start without importing them again
+PRELOAD_MODULES = [
+    "dashboard.data.scaffolds",
+    "dashboard.data.structural_similarity",
+    "dashboard.data.substructure_search",
+    "dashboard.pages.hit_validation.report.generate_report",
+    "dashboard.visualization.ic50_images",
+]
+# subdirectory of the data folder with the files of the shared job runner
+JOB_DIRECTORY = "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# lock file of a job directory, held while a job is looked up and queued
+SUBMIT_LOCK = ".submit.lock"
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def process_instance(cls: type, *args: typing.Hashable) -> typing.Any:
+    """
+    Get the instance of a class for the arguments, created once per process.
+    Stores passed to jobs are unpickled through it, so all jobs of a worker
+    process share one store with its in-memory caches.
+
+    :param cls: class of the instance
+    :param args: arguments of the class
+    :return: shared instance
+    """
+    with _instances_lock:
+        key = (cls, args)
+        if key not in _instances:
+            _instances[key] = cls(*args)
+        return _instances[key]
+
+
+def worker_context() -> multiprocessing.context.BaseContext:
+    """
+    Get the context starting worker processes of process pools, see START_METHOD
+
+    :return: multiprocessing context
+    """
+    context = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == "forkserver":
+        context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+def input_hash(*inputs: typing.Any) -> str:
+    """
+    Hash inputs of a job, dataframes and arrays by their content
+
+    :param inputs: values to hash, nested in lists, tuples and dicts
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in inputs:
+        _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+def _update_digest(digest: hashlib.blake2b, value: typing.Any) -> None:
+    digest.update(type(value).__qualname__.encode())
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((value.columns.tolist(), value.dtypes.tolist())).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update(repr((value.shape, value.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (bytes, str)):
+        data = value.encode() if isinstance(value, str) else value
+        # the length keeps consecutive values apart
+        digest.update(f"{len(data)}:".encode())
+        digest.update(data)
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{len(value)}:".encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f"{len(value)}:".encode())
+        for key, item in sorted(value.items()):
+            _update_digest(digest, key)
+            _update_digest(digest, item)
+    else:
+        digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+@dataclass
+class JobStatus:
+    """
+    State of a job with its progress, the partial result reported by the job so
+    far and the error of a failed job
+    """
+
+    state: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    partial: typing.Any = None
+    error: str | None = None
+    pid: int | None = None
+    updated: float = field(default_factory=time.time)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED)
+
+
+class JobProgress:
+    """
+    Reports progress and partial results of a job from its worker process
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """
+        :param path: status file of the job
+        """
+        self.path = path
+        self._written = 0.0
+
+    def update(
+        self, progress: float, message: str = "", partial: typing.Any = None
+    ) -> None:
+        """
+        Report progress, written at most every PROGRESS_INTERVAL seconds
+
+        :param progress: finished fraction of the job, from 0 to 1
+        :param message: description of the current step
+        :param partial: picklable partial result, shown while the job runs
+        """
+        now = time.monotonic()
+        if progress < 1 and now - self._written < PROGRESS_INTERVAL:
+            return
+        self._written = now
+        _write_status(
+            self.path,
+            JobStatus(RUNNING, progress, message, partial, pid=os.getpid()),
+        )
+
+
+def _write_atomic(path: pathlib.Path, content: bytes) -> None:
+    temp_path = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+def _write_status(path: pathlib.Path, status: JobStatus) -> None:
+    _write_atomic(path, pickle.dumps(status, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _process_alive(pid: int | None) -> bool:
+    if pid is None or os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _run_job(
+    directory: str,
+    key: str,
+    fn: typing.Callable,
+    args: tuple,
+    kwargs: dict,
+) -> None:
+    directory = pathlib.Path(directory)
+    status_path = directory / f"{key}.status"
+    _write_status(status_path, JobStatus(RUNNING, pid=os.getpid()))
+    try:
+        result = fn(*args, progress=JobProgress(status_path), **kwargs)
+        _write_atomic(
+            directory / f"{key}.pkl",
+            pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+    except Exception as e:
+        logger.exception("Job %s failed", key)
+        status = JobStatus(FAILED, error=str(e) or type(e).__name__, pid=os.getpid())
+    else:
+        status = JobStatus(DONE, 1.0, pid=os.getpid())
+    _write_status(status_path, status)
+
+
+class JobRunner:
+    """
+    Runs heavy functions of callbacks in a local pool of worker processes, no
+    broker needed. Status, progress and results of jobs are files in a directory,
+    so any server process can poll a job started by another one. Jobs are keyed by
+    the hash of the function and its inputs, so a job submitted again (repeated
+    upload, another session or server process) is not run twice.
+    """
+
+    def __init__(
+        self,
+        directory: pathlib.Path | str,
+        max_workers: int = JOB_WORKERS,
+        ttl: float = JOB_TTL,
+    ) -> None:
+        """
+        :param directory: directory of the status and result files
+        :param max_workers: number of jobs running at once
+        :param ttl: seconds after the last update when files of a job are deleted
+        """
+        self.directory = pathlib.Path(directory)
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, fn: typing.Callable, *args, **kwargs) -> str:
+        """
+        Start a job, unless the same one is queued, running or done. A failed or
+        interrupted job is started again.
+
+        :param fn: module level function, called in a worker process with the
+            arguments and a JobProgress as the `progress` keyword argument,
+            returning a picklable result
+        :return: key of the job
+        """
+        key = (
+            f"{fn.__name__}_{input_hash(fn.__module__, fn.__qualname__, args, kwargs)}"
+        )
+        with self._submit_lock():
+            status = self.status(key)
+            if status is not None and status.state != FAILED:
+                return key
+            self._delete_expired()
+            _write_status(self._status_path(key), JobStatus(QUEUED, pid=os.getpid()))
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=worker_context()
+                )
+            future = self._executor.submit(
+                _run_job, str(self.directory), key, fn, args, kwargs
+            )
+            future.add_done_callback(functools.partial(self._on_done, key))
+        return key
+
+    @contextlib.contextmanager
+    def _submit_lock(self) -> typing.Iterator[None]:
+        # exclusive across the server processes sharing the directory, so that
+        # only one of them starts a job
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(self.directory / SUBMIT_LOCK, "ab") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def status(self, key: str) -> JobStatus | None:
+        """
+        Get the status of a job
+
+        :param key: key of the job
+        :return: status, None for unknown or deleted jobs; unfinished jobs whose
+            process is gone are reported as failed
+        """
+        try:
+            with open(self._status_path(key), "rb") as file:
+                status = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        if status.state == DONE and not self._result_path(key).exists():
+            return None
+        if not status.finished and not _process_alive(status.pid):
+            return JobStatus(FAILED, error="The job was interrupted")
+        return status
+
+    def result(self, key: str) -> typing.Any:
+        """
+        Load the result of a finished job
+
+        :param key: key of the job
+        :return: value returned by the job function
+        """
+        with open(self._result_path(key), "rb") as file:
+            return pickle.load(file)
+
+    def _status_path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.status"
+
+    def _result_path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.pkl"
+
+    def _on_done(self, key: str, future: Future) -> None:
+        # the job function's own errors are recorded by the worker, these are
+        # errors of the pool, e.g. unpicklable inputs or a killed worker
+        error = future.exception()
+        if error is None:
+            return
+        logger.error("Job %s could not run: %s", key, error)
+        _write_status(
+            self._status_path(key), JobStatus(FAILED, error=str(error) or repr(error))
+        )
+        if isinstance(error, BrokenProcessPool):
+            # may run in submit, holding the lock, for a pool broken already
+            self._executor = None
+
+    def _delete_expired(self) -> None:
+        expired = time.time() - self.ttl
+        for path in self.directory.iterdir():
+            if path.name == SUBMIT_LOCK:
+                continue
+            try:
+                if path.stat().st_mtime < expired:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def shared_runner(data_folder: pathlib.Path | str) -> JobRunner:
+    """
+    Get the job runner of a data folder, created once per process, so that all
+    pages submit their jobs to a single pool of workers
+
+    :param data_folder: data folder of the app
+    :return: shared job runner
+    """
+    return process_instance(JobRunner, pathlib.Path(data_folder) / JOB_DIRECTORY)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import resource
+import threading
+
+# bound on the memory of dense chunks materialized by out-of-core computations,
+# set with the DRUG_SCREENING_CHUNK_MEMORY_MB environment variable
+CHUNK_MEMORY_LIMIT = (
+    int(os.environ.get("DRUG_SCREENING_CHUNK_MEMORY_MB", 256)) * 2**20
+)
+
+
+def current_rss() -> int:
+    """
+    Get resident set size of the current process
+
+    :return: memory in bytes, peak memory of the process if current is not available
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def row_chunks(
+    n_rows: int, row_bytes: int, memory_limit: int | None = None, min_rows: int = 1
+) -> list[slice]:
+    """
+    Split rows into chunks, each taking at most the memory limit
+
+    :param n_rows: number of rows
+    :param row_bytes: memory taken by a single row of a chunk, including copies
+    :param memory_limit: memory limit of a chunk in bytes, CHUNK_MEMORY_LIMIT if None
+    :param min_rows: minimal number of rows in a chunk, a smaller last chunk is
+        merged into the previous one
+    :return: list of row slices
+    """
+    memory_limit = memory_limit or CHUNK_MEMORY_LIMIT
+    chunk_size = max(min_rows, memory_limit // max(row_bytes, 1))
+    bounds = list(range(0, n_rows, chunk_size)) + [n_rows]
+    if len(bounds) > 2 and bounds[-1] - bounds[-2] < min_rows:
+        del bounds[-2]
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+class PeakMemory:
+    """
+    Context manager sampling resident memory of the process in a background
+    thread to find its peak over the block.
+    """
+
+    def __init__(self, interval: float = 0.05) -> None:
+        """
+        :param interval: sampling interval in seconds
+        """
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self) -> PeakMemory:
+        self.start = self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    @property
+    def increase(self) -> int:
+        """
+        :return: peak memory over the memory at block entry in bytes
+        """
+        return self.peak - self.start
@@ -1,12 +1,23 @@
 from __future__ import annotations
 
+import csv
 import io
-from functools import reduce
-from typing import Protocol, Callable, Any
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol
 
 import numpy as np
 import pandas as pd
 
+from dashboard.data.memory import row_chunks
+
+# assay columns of the screening results -> name in the merged dataframe
+ASSAY_COLUMNS = {
+    "% ACTIVATION": "% ACTIVATION {}",
+    "% INHIBITION": "%INHIBITION {}",
+    "Z-SCORE": "Z-SCORE {}",
+}
+
 
 class Projector(Protocol):
     def fit_transform(self, X: np.ndarray) -> np.ndarray:
@@ -16,6 +27,32 @@ class Projector(Protocol):
         ...
 
 
+class IncrementalProjector(Projector, Protocol):
+    def partial_fit(self, X: np.ndarray) -> IncrementalProjector:
+        ...
+
+
+def _read_assay_means(
+    filename: str, filecontent: io.StringIO, id_column: str
+) -> pd.DataFrame:
+    """
+    Read assay columns of a screening results file and average them per compound
+
+    :param filename: name of the file, appended to the assay column names
+    :param filecontent: csv content
+    :param id_column: name of the ID column
+    :return: dataframe with mean assay values indexed by ID
+    """
+    header = next(csv.reader([filecontent.readline()]))
+    filecontent.seek(0)
+    usecols = [col for col in header if col == id_column or col in ASSAY_COLUMNS]
+    df = pd.read_csv(filecontent, usecols=usecols, engine="pyarrow")
+    processed_df = df.groupby(id_column).mean()
+    return processed_df.rename(
+        columns={col: name.format(filename) for col, name in ASSAY_COLUMNS.items()}
+    )
+
+
 class MergedAssaysPreprocessor:
     def __init__(
         self,
@@ -30,31 +67,24 @@ class MergedAssaysPreprocessor:
     def combine_assays_for_projections(
         self, projection_files: tuple[str, io.StringIO], id_column: str = "EOS"
     ) -> MergedAssaysPreprocessor:
-        processed_dfs = []
-        COLUMNS_TO_DROP = [
-            "Source Plate Barcode",
-            "Source Well",
-            "Destination Plate Barcode",
-            "Destination Well",
-            "Actual Volume",
-        ]
-
-        for filename, filecontent in projection_files:
-            df = pd.read_csv(filecontent, index_col=[0]).drop(columns=COLUMNS_TO_DROP)
-            processed_df = df.groupby(id_column).mean()
-            processed_df = processed_df.rename(
-                columns={
-                    "% ACTIVATION": f"% ACTIVATION {filename}",
-                    "% INHIBITION": f"%INHIBITION {filename}",
-                    "Z-SCORE": f"Z-SCORE {filename}",
-                }
-            )
-            processed_dfs.append(processed_df)
+        """
+        Read assay files concurrently and join their per-compound means.
+        Only the ID and assay columns are parsed, the means are aligned on the
+        ID in a single inner join.
 
-        self.compounds_df = reduce(
-            lambda left, right: pd.merge(left, right, on=id_column, how="inner"),
-            processed_dfs,
-        )
+        :param projection_files: tuple of filenames and contents of the assay csv files
+        :param id_column: name of the ID column
+        :return: preprocessor itself
+        """
+        n_workers = max(min(len(projection_files), os.cpu_count() or 1), 1)
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(_read_assay_means, filename, filecontent, id_column)
+                for filename, filecontent in projection_files
+            ]
+            processed_dfs = [future.result() for future in futures]
+
+        self.compounds_df = pd.concat(processed_dfs, axis=1, join="inner")
         return self
 
     def set_compounds_df(self, compounds_df: pd.DataFrame) -> MergedAssaysPreprocessor:
@@ -89,39 +119,92 @@ class MergedAssaysPreprocessor:
         self.columns_for_projection = columns_for_projection
         return self
 
-    def annotate_controls(
-        self, annotator: Callable[[Any], str]
+    def apply_projection(
+        self,
+        projector: Projector | IncrementalProjector,
+        projection_name: str,
+        memory_limit: int | None = None,
     ) -> MergedAssaysPreprocessor:
         """
-        Annotates the dataframe by a given annotator function
+        Apply a projection to the dataframe using a given projector.
+        Projectors with `partial_fit` (e.g. IncrementalPCA) are fitted and applied
+        in chunks of rows, so the projected columns are never copied at once.
 
-        :param annotator: function to annotate the dataframe
+        :param projector: Projector instance
+        :param projection_name: name of the projection, to be inserted in the projection columns names
+        :param memory_limit: memory limit of a chunk of rows in bytes
         :return: preprocessor itself
         """
-        self.controls_df.set_index("EOS", inplace=True)
-        self.controls_df["annotation"] = self.controls_df.index.map(annotator)
-        self.controls_df.reset_index(inplace=True)
+        X_projected, X_projected_controls = self._project(projector, memory_limit)
+        self._assign_projection(projection_name, X_projected, X_projected_controls)
         return self
 
-    def apply_projection(
+    def apply_projections(
         self,
-        projector: Projector,
-        projection_name: str,
+        projection_setup: list[tuple[Projector | IncrementalProjector, str]],
+        n_jobs: int = 1,
+        memory_limit: int | None = None,
     ) -> MergedAssaysPreprocessor:
         """
-        Apply a projection to the dataframe using a given projector
+        Apply multiple projections, fitted concurrently in threads. Projectors
+        must not be shared with other threads.
 
-        :param projector: Projector instance
-        :param projection_name: name of the projection, to be inserted in the projection columns names
+        :param projection_setup: list of projectors and names of the projections
+        :param n_jobs: number of threads
+        :param memory_limit: memory limit of a chunk of rows in bytes
         :return: preprocessor itself
         """
+        with ThreadPoolExecutor(max_workers=max(n_jobs, 1)) as executor:
+            futures = [
+                executor.submit(self._project, projector, memory_limit)
+                for projector, _ in projection_setup
+            ]
+            for future, (_, projection_name) in zip(futures, projection_setup):
+                self._assign_projection(projection_name, *future.result())
+        return self
 
-        X = self.compounds_df[self.columns_for_projection].to_numpy()
-        X_projected = projector.fit_transform(X)
+    def _project(
+        self,
+        projector: Projector | IncrementalProjector,
+        memory_limit: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Fit the projector on compounds and project compounds and controls
+
+        :param projector: Projector instance
+        :param memory_limit: memory limit of a chunk of rows in bytes
+        :return: projected compounds and controls
+        """
+        if hasattr(projector, "partial_fit"):
+            columns = self.compounds_df.columns.get_indexer(self.columns_for_projection)
+            row_bytes = len(columns) * np.dtype(np.float64).itemsize
+            min_rows = getattr(projector, "n_components", None) or 1
+            chunks = row_chunks(
+                len(self.compounds_df), row_bytes, memory_limit, min_rows
+            )
+            for rows in chunks:
+                projector.partial_fit(self.compounds_df.iloc[rows, columns].to_numpy())
+            X_projected = np.concatenate(
+                [
+                    projector.transform(
+                        self.compounds_df.iloc[rows, columns].to_numpy()
+                    )
+                    for rows in chunks
+                ]
+            )
+        else:
+            X = self.compounds_df[self.columns_for_projection].to_numpy()
+            X_projected = projector.fit_transform(X)
 
         X_controls = self.controls_df[self.columns_for_projection].to_numpy()
-        X_projected_controls = projector.transform(X_controls)
+        return X_projected, projector.transform(X_controls)
 
+    def _assign_projection(
+        self,
+        projection_name: str,
+        X_projected: np.ndarray,
+        X_projected_controls: np.ndarray,
+    ) -> None:
         suffixes = ["X", "Y", "Z"]
 
         if X_projected.shape[1] > len(suffixes):
@@ -132,7 +215,6 @@ class MergedAssaysPreprocessor:
             self.compounds_df[f"{projection_name}_{suffix}"] = col
         for suffix, col in zip(suffixes, X_projected_controls.T):
             self.controls_df[f"{projection_name}_{suffix}"] = col
-        return self
 
     def get_processed_compounds_df(self) -> pd.DataFrame:
         """
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import importlib.metadata
+import threading
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pandas as pd
+from sklearn.decomposition import PCA
+from umap import UMAP
+
+from dashboard.data.controls import generate_controls
+from dashboard.data.jobs import DONE, JobProgress, JobRunner, JobStatus
+from dashboard.data.preprocess import MergedAssaysPreprocessor, Projector
+from dashboard.data.spatial_index import GridIndex
+
+UMAP_PARAMS = {"n_neighbors": 10, "min_dist": 0.1}
+# 2D projections indexed for viewport queries of the projection table
+INDEXED_PROJECTIONS = ("PCA", "UMAP")
+# results kept in memory with their spatial indexes, per server process
+MAX_RESULTS = 8
+# bump when ProjectionResult changes, so that older persisted results are not loaded
+RESULT_VERSION = 2
+
+
+def projection_setup() -> list[tuple[Projector, str]]:
+    """
+    Create fresh projectors, never shared between jobs
+
+    :return: list of projectors and names of the projections
+    """
+    return [
+        (PCA(n_components=3), "PCA"),
+        (UMAP(n_components=2, **UMAP_PARAMS), "UMAP"),
+        (UMAP(n_components=3, **UMAP_PARAMS), "UMAP3D"),
+    ]
+
+
+def projection_version() -> str:
+    """
+    Describe everything besides the data that changes projections of merged
+    assays, so that jobs of other parameters or package versions are not reused
+
+    :return: parameters and package versions
+    """
+    packages = [
+        importlib.metadata.version(package)
+        for package in ("umap-learn", "scikit-learn")
+    ]
+    return repr((UMAP_PARAMS, RESULT_VERSION, packages))
+
+
+@dataclass
+class ProjectionResult:
+    """
+    Projections of the compounds and controls of merged assays, with spatial
+    indexes of the 2D projections of the compounds
+    """
+
+    projections_df: pd.DataFrame
+    controls_df: pd.DataFrame
+    projection_columns: list[str]
+    pca: PCA
+    spatial_indexes: dict[str, GridIndex] = field(default_factory=dict)
+
+
+def compute_projections(
+    merged_df: pd.DataFrame,
+    n_jobs: int = 3,
+    setup_fn: typing.Callable[[], list[tuple[Projector, str]]] = projection_setup,
+) -> ProjectionResult:
+    """
+    Project compounds and controls with fresh projectors, fitted concurrently
+
+    :param merged_df: dataframe with merged assays
+    :param n_jobs: number of threads
+    :param setup_fn: creates the projectors, the first one being PCA
+    :return: projections
+    """
+    # take only columns with projections i.e. having % in the name
+    projection_columns = [col for col in merged_df.columns if "%" in col]
+    setup = setup_fn()
+
+    assays_preprocessor = MergedAssaysPreprocessor()
+    assays_preprocessor.set_compounds_df(merged_df.copy()).set_controls_df(
+        generate_controls(projection_columns)
+    ).set_columns_for_projection(projection_columns)
+    assays_preprocessor.apply_projections(setup, n_jobs=n_jobs)
+    projections_df = assays_preprocessor.get_processed_compounds_df()
+
+    return ProjectionResult(
+        projections_df=projections_df,
+        controls_df=assays_preprocessor.get_processed_controls_df(),
+        projection_columns=projection_columns,
+        pca=setup[0][0],
+        spatial_indexes={
+            name: GridIndex(projections_df[f"{name}_X"], projections_df[f"{name}_Y"])
+            for name in INDEXED_PROJECTIONS
+            if f"{name}_X" in projections_df.columns
+        },
+    )
+
+
+def projection_job(
+    merged_df: pd.DataFrame,
+    progress: JobProgress,
+    setup_fn: typing.Callable[[], list[tuple[Projector, str]]] = projection_setup,
+    version: str | None = None,
+) -> ProjectionResult:
+    """
+    Background job of `compute_projections`
+
+    :param merged_df: dataframe with merged assays
+    :param progress: progress of the job
+    :param setup_fn: picklable function creating the projectors
+    :param version: see `projection_version`, only a part of the job key
+    :return: projections
+    """
+    progress.update(0.0, "Calculating projections")
+    return compute_projections(merged_df, setup_fn=setup_fn)
+
+
+class ProjectionJobs:
+    """
+    Runs projections of merged assays as background jobs. Jobs are keyed by the
+    hash of the data, so a job resubmitted for the same data (re-entered stage,
+    reloaded page, another session or server process) is not recomputed.
+    Persisted results expire with the job files, only the most recently used
+    ones are kept in memory with their spatial indexes.
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        max_results: int = MAX_RESULTS,
+        setup_fn: typing.Callable[[], list[tuple[Projector, str]]] = projection_setup,
+    ) -> None:
+        """
+        :param runner: job runner shared with other pages
+        :param max_results: number of results kept in memory
+        :param setup_fn: picklable function creating the projectors
+        """
+        self.runner = runner
+        self.max_results = max_results
+        self.setup_fn = setup_fn
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def submit(self, merged_df: pd.DataFrame) -> str:
+        """
+        Start projecting the data, unless it is already projected or running.
+        A failed job is started again.
+
+        :param merged_df: dataframe with merged assays
+        :return: key of the job
+        """
+        return self.runner.submit(
+            projection_job,
+            merged_df,
+            setup_fn=self.setup_fn,
+            version=projection_version(),
+        )
+
+    def status(self, key: str) -> JobStatus | None:
+        """
+        Get the status of a job
+
+        :param key: key of the job
+        :return: status, None for unknown or expired jobs
+        """
+        return self.runner.status(key)
+
+    def result(self, key: str) -> ProjectionResult | None:
+        """
+        Get the result of a finished job, loaded once per process
+
+        :param key: key of the job
+        :return: projections, None if the job is not done or has expired
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        status = self.runner.status(key)
+        if status is None or status.state != DONE:
+            return None
+        try:
+            result = self.runner.result(key)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
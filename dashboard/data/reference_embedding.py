@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import hashlib
+import importlib.metadata
+import os
+import pathlib
+import pickle
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+import hdbscan
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+from dashboard.data.fingerprint_store import FingerprintStore
+from dashboard.data.jobs import process_instance
+from dashboard.data.similarity_search import TanimotoSearch
+from dashboard.data.structural_similarity import (
+    ECFP_BITS,
+    FingerprintPCA,
+    ECFP_RADIUS,
+    UMAP_NEIGHBORS,
+    assign_projection,
+    calculate_knn_graph,
+    cluster_names,
+    compute_ecfp_descriptors,
+    fingerprints_to_csr,
+    fit_clusterer,
+    fit_umap,
+)
+
+# name of the projection -> number of components
+PROJECTION_COMPONENTS = {"UMAP": 2, "UMAP3D": 3, "PCA": 3}
+# private attributes of a fitted umap.UMAP holding its nearest neighbor index,
+# replaced by TanimotoKnnIndex; umap-learn is a part of the embedding version
+UMAP_KNN_ATTRIBUTES = ("_knn_search_index", "knn_search_index", "precomputed_knn")
+
+
+class TanimotoKnnIndex:
+    """
+    Exact jaccard nearest neighbor index over the reference fingerprints used by
+    `umap.UMAP.transform`. Replaces the pynndescent index, which can not be
+    restored from a pickle when fitted on sparse data.
+    """
+
+    _angular_trees = False
+
+    def __init__(self, packed: np.ndarray) -> None:
+        """
+        :param packed: uint8 array of bit-packed reference fingerprints
+        """
+        self.search = TanimotoSearch(packed)
+
+    def query(
+        self, X: np.ndarray | scipy.sparse.csr_matrix, k: int = 10, epsilon: float = 0.1
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find nearest reference fingerprints, same interface as `NNDescent.query`
+
+        :param X: dense or sparse query fingerprints
+        :param k: number of neighbors
+        :param epsilon: unused, the search is exact
+        :return: neighbor indices and jaccard distances
+        """
+        dense = X.toarray() if scipy.sparse.issparse(X) else np.asarray(X)
+        indices, similarities = self.search.search(
+            np.packbits(dense > 0, axis=1), k=k, n_jobs=os.cpu_count() or 1
+        )
+        return indices.astype(np.int32), (1 - similarities).astype(np.float32)
+
+
+def _replace_knn_index(model: Any, knn_index: TanimotoKnnIndex) -> None:
+    missing = [name for name in UMAP_KNN_ATTRIBUTES if not hasattr(model, name)]
+    if missing:
+        raise RuntimeError(
+            f"umap-learn {importlib.metadata.version('umap-learn')} has no "
+            f"{', '.join(missing)}, its nearest neighbor index can not be replaced"
+        )
+    model._knn_search_index = knn_index
+    model.knn_search_index = None
+    model.precomputed_knn = (None, None, None)
+
+
+@dataclass
+class ReferenceEmbedding:
+    """
+    Projections and clusterings fitted once on the reference library. New
+    compounds are placed with `transform` and `hdbscan.approximate_predict`.
+    """
+
+    version: str
+    eos: pd.Index
+    projections: dict[str, np.ndarray]
+    clusters: dict[str, list[str]]
+    models: dict[str, Any]
+    clusterers: dict[str, hdbscan.HDBSCAN]
+
+    @classmethod
+    def fit(
+        cls,
+        library_df: pd.DataFrame,
+        version: str,
+        store: FingerprintStore | None = None,
+    ) -> ReferenceEmbedding:
+        """
+        Fit projections and clusterings on the reference library
+
+        :param library_df: df with EOS and smiles of the reference compounds
+        :param version: version hash of the library and parameters
+        :param store: persistent fingerprint store to reuse fingerprints from
+        :return: fitted embedding
+        """
+        packed, keep_idx = compute_ecfp_descriptors(library_df["smiles"], store=store)
+        sparse_descriptors = fingerprints_to_csr(packed)
+        knn_graph, knn_index = None, TanimotoKnnIndex(packed)
+
+        models, projections = {}, {}
+        for name, n_components in PROJECTION_COMPONENTS.items():
+            if name == "PCA":
+                model = FingerprintPCA(n_components).fit(packed)
+                projections[name] = model.transform(packed)
+            else:
+                knn_graph = knn_graph or calculate_knn_graph(sparse_descriptors)
+                model = fit_umap(sparse_descriptors, n_components, knn_graph)
+                projections[name] = model.embedding_
+                _replace_knn_index(model, knn_index)
+            models[name] = model
+
+        clusterers = {
+            name: fit_clusterer(x_projection, prediction_data=True)
+            for name, x_projection in projections.items()
+        }
+        return cls(
+            version=version,
+            eos=pd.Index(library_df["EOS"].to_numpy()[keep_idx]),
+            projections=projections,
+            clusters={
+                name: cluster_names(clusterer.labels_)
+                for name, clusterer in clusterers.items()
+            },
+            models=models,
+            clusterers=clusterers,
+        )
+
+    def transform(self, packed: np.ndarray) -> dict[str, tuple[np.ndarray, list[str]]]:
+        """
+        Place new compounds in the fitted projections and clusterings
+
+        :param packed: uint8 array of bit-packed fingerprints
+        :return: projection and cluster names of the compounds per projection
+        """
+        placed = {}
+        for name, model in self.models.items():
+            if name == "PCA":
+                x_projection = model.transform(packed)
+            else:
+                x_projection = model.transform(fingerprints_to_csr(packed))
+            labels, _ = hdbscan.approximate_predict(self.clusterers[name], x_projection)
+            placed[name] = x_projection, cluster_names(labels)
+        return placed
+
+    def project(self, df: pd.DataFrame, packed: np.ndarray) -> pd.DataFrame:
+        """
+        Add projection and cluster columns. Reference compounds keep their fitted
+        coordinates, other compounds are transformed.
+
+        :param df: df with EOS of the compounds
+        :param packed: uint8 array of bit-packed fingerprints of the compounds
+        :return: df with everything calculated
+        """
+        positions = self.eos.get_indexer(df["EOS"])
+        is_new = positions == -1
+        placed = self.transform(packed[is_new]) if is_new.any() else {}
+
+        df = df.copy()
+        for name, n_components in PROJECTION_COMPONENTS.items():
+            x_projection = np.empty((len(df), n_components))
+            clusters = np.empty(len(df), dtype=object)
+            x_projection[~is_new] = self.projections[name][positions[~is_new]]
+            clusters[~is_new] = np.asarray(self.clusters[name])[positions[~is_new]]
+            if name in placed:
+                x_projection[is_new], clusters[is_new] = placed[name]
+            assign_projection(df, name, x_projection, list(clusters))
+        return df
+
+
+def embedding_version(library_path: pathlib.Path | str) -> str:
+    """
+    Hash the reference library with everything that changes the fitted embedding
+
+    :param library_path: path to the reference library parquet file
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(pathlib.Path(library_path).read_bytes())
+    params = (ECFP_RADIUS, ECFP_BITS, UMAP_NEIGHBORS, PROJECTION_COMPONENTS)
+    digest.update(repr(params).encode())
+    for package in ("umap-learn", "pynndescent", "hdbscan", "scikit-learn"):
+        digest.update(importlib.metadata.version(package).encode())
+    return digest.hexdigest()
+
+
+class ReferenceEmbeddingStore:
+    """
+    Fits the reference embedding on first use and persists it next to other
+    versions, so that every process and session places compounds in the same
+    embedding. A changed library or parameters result in a new version.
+    """
+
+    def __init__(
+        self, directory: pathlib.Path | str, library_path: pathlib.Path | str
+    ) -> None:
+        """
+        :param directory: directory of the persisted embeddings
+        :param library_path: path to the reference library parquet file
+        """
+        self.directory = pathlib.Path(directory)
+        self.library_path = pathlib.Path(library_path)
+        self._lock = threading.Lock()
+        self._embedding = None
+
+    def __reduce__(self) -> tuple:
+        # pickled as its location, the persisted embedding is loaded once per
+        # process and shared by its jobs
+        return (
+            process_instance,
+            (ReferenceEmbeddingStore, self.directory, self.library_path),
+        )
+
+    def get(self, store: FingerprintStore | None = None) -> ReferenceEmbedding:
+        """
+        Load the embedding of the current library version, fit it if missing
+
+        :param store: persistent fingerprint store to reuse fingerprints from
+        :return: reference embedding
+        """
+        version = embedding_version(self.library_path)
+        with self._lock:
+            if self._embedding is not None and self._embedding.version == version:
+                return self._embedding
+            path = self.directory / f"reference_{version}.pkl"
+            if path.exists():
+                with open(path, "rb") as file:
+                    self._embedding = pickle.load(file)
+            else:
+                library_df = pd.read_parquet(self.library_path)
+                self._embedding = ReferenceEmbedding.fit(library_df, version, store)
+                self._save(path, self._embedding)
+            return self._embedding
+
+    def _save(self, path: pathlib.Path, embedding: ReferenceEmbedding) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self.directory / f".{path.name}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(embedding, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
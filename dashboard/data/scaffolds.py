@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from rdkit import Chem
+from rdkit.Chem.Scaffolds import MurckoScaffold
+
+from dashboard.data.jobs import worker_context
+from dashboard.data.lru_cache import LRUCache
+
+# below this many SMILES the process pool startup costs more than it saves
+MIN_PARALLEL_SMILES = 5000
+SMILES_CHUNK_SIZE = 2000
+# smiles and aliases kept by a ScaffoldCache, a few hundred bytes of memory each
+MAX_CACHED_SCAFFOLDS = 200_000
+
+
+def _scaffold_chunk(smiles_chunk: list[str]) -> list[tuple[str, str] | None]:
+    """
+    Calculate Bemis-Murcko scaffolds of a chunk of smiles
+
+    :param smiles_chunk: list of smiles
+    :return: canonical smiles and scaffold per smiles, None for invalid ones
+    """
+    results = []
+    for smiles in smiles_chunk:
+        mol = Chem.MolFromSmiles(smiles) if isinstance(smiles, str) else None
+        if mol is None:
+            results.append(None)
+            continue
+        results.append(
+            (Chem.MolToSmiles(mol), MurckoScaffold.MurckoScaffoldSmiles(mol=mol))
+        )
+    return results
+
+
+class ScaffoldCache:
+    """
+    In-memory cache of Bemis-Murcko scaffolds keyed by canonical SMILES, shared
+    across sessions. Non-canonical input spellings are stored as aliases, so
+    repeated uploads are not parsed again. The least recently used smiles are
+    evicted above max_size entries.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_SCAFFOLDS) -> None:
+        """
+        :param max_size: maximum number of cached smiles and aliases
+        """
+        self._scaffolds = LRUCache(max_size)
+
+    def __len__(self) -> int:
+        return len(self._scaffolds)
+
+    def lookup(self, smiles: list[str]) -> dict[int, str]:
+        """
+        Find cached scaffolds of the given smiles
+
+        :param smiles: list of smiles
+        :return: position of found smiles -> scaffold
+        """
+        found = {}
+        for i, key in enumerate(smiles):
+            if not isinstance(key, str):
+                continue
+            scaffold = self._scaffolds.get(key)
+            if scaffold is not None:
+                found[i] = scaffold
+        return found
+
+    def add(self, smiles: list[str], scaffolds: list[str]) -> None:
+        """
+        Store scaffolds of the given smiles
+
+        :param smiles: canonical smiles and aliases
+        :param scaffolds: scaffold per smiles
+        """
+        for key, scaffold in zip(smiles, scaffolds):
+            self._scaffolds.put(key, scaffold)
+
+
+def compute_scaffolds(
+    smiles_list: list[str],
+    n_jobs: int | None = None,
+    cache: ScaffoldCache | None = None,
+) -> np.ndarray:
+    """
+    Calculate Bemis-Murcko scaffolds. Large inputs are processed in a process
+    pool. If a cache is given, only the smiles missing from it are processed.
+
+    :param smiles_list: list of smiles
+    :param n_jobs: number of worker processes, defaults to cpu count
+    :param cache: scaffold cache shared across calls
+    :return: object array of scaffold smiles, empty for acyclic molecules and
+        None for invalid smiles
+    """
+    smiles_list = list(smiles_list)
+    scaffolds = np.full(len(smiles_list), None, dtype=object)
+    found = cache.lookup(smiles_list) if cache is not None else {}
+    for i, scaffold in found.items():
+        scaffolds[i] = scaffold
+    missing_idx = [i for i in range(len(smiles_list)) if i not in found]
+    missing = [smiles_list[i] for i in missing_idx]
+
+    chunks = [
+        missing[start : start + SMILES_CHUNK_SIZE]
+        for start in range(0, len(missing), SMILES_CHUNK_SIZE)
+    ]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if len(missing) < MIN_PARALLEL_SMILES or n_jobs == 1:
+        results = [result for chunk in chunks for result in _scaffold_chunk(chunk)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, mp_context=worker_context()
+        ) as executor:
+            results = [
+                result
+                for chunk_results in executor.map(_scaffold_chunk, chunks)
+                for result in chunk_results
+            ]
+
+    keys, values = [], []
+    for i, smiles, result in zip(missing_idx, missing, results):
+        if result is None:
+            continue
+        canonical, scaffolds[i] = result
+        keys.extend([canonical, smiles])
+        values.extend([scaffolds[i], scaffolds[i]])
+    if cache is not None and keys:
+        cache.add(keys, values)
+    return scaffolds
+
+
+def scaffold_hit_statistics(
+    df: pd.DataFrame, scaffolds: np.ndarray, activity_columns: list[str] | None = None
+) -> pd.DataFrame:
+    """
+    Aggregate hit validation results per scaffold
+
+    :param df: df with activity_final of the compounds
+    :param scaffolds: scaffold per compound, compounds with None are skipped
+    :param activity_columns: numeric activity columns to average per scaffold
+    :return: df with scaffold, number of compounds, tested and active compounds,
+        hit rate and mean activities, sorted by number of active compounds
+    """
+    activity_columns = activity_columns or []
+    activity = df["activity_final"].to_numpy()
+    grouped = pd.DataFrame(
+        {
+            "scaffold": scaffolds,
+            "n_compounds": 1,
+            "n_tested": (activity != "not tested") & pd.notna(activity),
+            "n_active": activity == "active",
+        }
+    )
+    for column in activity_columns:
+        grouped[f"mean_{column}"] = pd.to_numeric(
+            df[column], errors="coerce"
+        ).to_numpy()
+    grouped = grouped[pd.notna(scaffolds)]
+
+    stats = grouped.groupby("scaffold", sort=False).agg(
+        {
+            "n_compounds": "sum",
+            "n_tested": "sum",
+            "n_active": "sum",
+            **{f"mean_{column}": "mean" for column in activity_columns},
+        }
+    )
+    tested = stats["n_tested"].to_numpy(dtype=float)
+    stats.insert(
+        3,
+        "hit_rate",
+        np.divide(
+            stats["n_active"].to_numpy(dtype=float),
+            tested,
+            out=np.full(len(stats), np.nan),
+            where=tested > 0,
+        ),
+    )
+    return stats.sort_values(["n_active", "n_compounds"], ascending=False).reset_index()
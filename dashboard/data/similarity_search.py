@@ -0,0 +1,355 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse
+
+# similarities are computed for blocks of QUERY x LIBRARY fingerprints at a time,
+# so that intermediate AND results stay in cache and the full matrix is never built
+QUERY_BLOCK_SIZE = 32
+LIBRARY_BLOCK_SIZE = 4096
+BUTINA_THRESHOLD = 0.6
+
+if hasattr(np, "bitwise_count"):
+
+    def _bit_count(words: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(words)
+
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+    def _bit_count(words: np.ndarray) -> np.ndarray:
+        counts = _POPCOUNT_TABLE[words.reshape(*words.shape, 1).view(np.uint8)]
+        return counts.sum(axis=-1, dtype=np.uint8)
+
+
+def as_words(packed: np.ndarray) -> np.ndarray:
+    """
+    View bit-packed fingerprints as 64-bit words
+
+    :param packed: uint8 array of bit-packed fingerprints, row length multiple of 8
+    :return: uint64 array of shape (n, n_bytes / 8)
+    """
+    packed = np.ascontiguousarray(packed, dtype=np.uint8)
+    if packed.shape[1] % 8:
+        raise ValueError("Fingerprint length must be a multiple of 64 bits")
+    return packed.view(np.uint64)
+
+
+def popcount_rows(words: np.ndarray) -> np.ndarray:
+    """
+    Count set bits of every fingerprint
+
+    :param words: uint64 fingerprint words, see `as_words`
+    :return: int32 array with number of set bits per row
+    """
+    return _bit_count(words).sum(axis=-1, dtype=np.int32)
+
+
+def tanimoto_block(
+    query_words: np.ndarray,
+    query_counts: np.ndarray,
+    library_columns: np.ndarray,
+    library_counts: np.ndarray,
+) -> np.ndarray:
+    """
+    Compute Tanimoto similarities between two blocks of fingerprints. The library
+    is given word-major, so every step ANDs one query word with one contiguous
+    row of library words.
+
+    :param query_words: uint64 words of the query fingerprints
+    :param query_counts: set bits of the query fingerprints
+    :param library_columns: uint64 words of the library fingerprints, transposed
+        to shape (n_words, n_library)
+    :param library_counts: set bits of the library fingerprints
+    :return: float32 similarity matrix of shape (n_queries, n_library)
+    """
+    shape = (len(query_words), library_columns.shape[1])
+    intersection = np.zeros(shape, dtype=np.int32)
+    words_and = np.empty(shape, dtype=np.uint64)
+    for word, library_word in enumerate(library_columns):
+        np.bitwise_and(query_words[:, word, None], library_word, out=words_and)
+        intersection += _bit_count(words_and)
+    union = query_counts[:, None] + library_counts[None, :] - intersection
+    return np.divide(
+        intersection,
+        union,
+        out=np.zeros(shape, dtype=np.float32),
+        where=union > 0,
+        dtype=np.float32,
+    )
+
+
+def _merge_top_k(
+    best_idx: np.ndarray,
+    best_scores: np.ndarray,
+    idx: np.ndarray,
+    scores: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    idx = np.concatenate([best_idx, idx], axis=1)
+    scores = np.concatenate([best_scores, scores], axis=1)
+    if scores.shape[1] > k:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        idx = np.take_along_axis(idx, top, axis=1)
+        scores = np.take_along_axis(scores, top, axis=1)
+    return idx, scores
+
+
+class TanimotoSearch:
+    """
+    Top-k Tanimoto nearest neighbor search over a library of bit-packed fingerprints.
+
+    Multi-core mode splits the library into shards searched by threads, NumPy
+    releases the GIL in the popcount kernels, so the library is not copied.
+    """
+
+    def __init__(self, library: np.ndarray) -> None:
+        """
+        :param library: uint8 array of bit-packed library fingerprints
+        """
+        self.words = as_words(library)
+        self.columns = np.ascontiguousarray(self.words.T)
+        self.counts = popcount_rows(self.words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _search_shard(
+        self, query_words: np.ndarray, query_counts: np.ndarray, k: int, shard: slice
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        n_queries = len(query_words)
+        best_idx = np.empty((n_queries, 0), dtype=np.int64)
+        best_scores = np.empty((n_queries, 0), dtype=np.float32)
+        for start in range(shard.start, shard.stop, LIBRARY_BLOCK_SIZE):
+            stop = min(start + LIBRARY_BLOCK_SIZE, shard.stop)
+            scores = np.concatenate(
+                [
+                    tanimoto_block(
+                        query_words[q : q + QUERY_BLOCK_SIZE],
+                        query_counts[q : q + QUERY_BLOCK_SIZE],
+                        self.columns[:, start:stop],
+                        self.counts[start:stop],
+                    )
+                    for q in range(0, n_queries, QUERY_BLOCK_SIZE)
+                ]
+            )
+            idx = np.broadcast_to(np.arange(start, stop), scores.shape)
+            best_idx, best_scores = _merge_top_k(best_idx, best_scores, idx, scores, k)
+        return best_idx, best_scores
+
+    def search(
+        self, queries: np.ndarray, k: int = 5, n_jobs: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find k most similar library fingerprints for every query
+
+        :param queries: uint8 array of bit-packed query fingerprints
+        :param k: number of neighbors
+        :param n_jobs: number of threads, the library is split between them
+        :return: library indices and similarities of shape (n_queries, min(k, n)),
+            sorted by descending similarity
+        """
+        query_words = as_words(queries)
+        query_counts = popcount_rows(query_words)
+        k = min(k, len(self))
+        n_jobs = max(1, min(n_jobs, len(self) // LIBRARY_BLOCK_SIZE or 1))
+        bounds = np.linspace(0, len(self), n_jobs + 1).astype(int)
+        shards = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        best_idx = np.empty((len(query_words), 0), dtype=np.int64)
+        best_scores = np.empty((len(query_words), 0), dtype=np.float32)
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            results = executor.map(
+                lambda shard: self._search_shard(query_words, query_counts, k, shard),
+                shards,
+            )
+            for idx, scores in results:
+                best_idx, best_scores = _merge_top_k(
+                    best_idx, best_scores, idx, scores, k
+                )
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(best_idx, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1),
+        )
+
+
+def _threshold_blocks(
+    words: np.ndarray,
+    columns: np.ndarray,
+    counts: np.ndarray,
+    threshold: float,
+    block_starts: List[int],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rows, cols, values = [], [], []
+    for start in block_starts:
+        stop = min(start + QUERY_BLOCK_SIZE, len(words))
+        # fingerprints are sorted by counts and similarity of counts a <= b is at
+        # most a / b, so later library blocks can not reach the threshold
+        max_count = counts[stop - 1] / threshold * (1 + 1e-9)
+        end = np.searchsorted(counts, max_count, side="right")
+        for library_start in range(start, end, LIBRARY_BLOCK_SIZE):
+            library_stop = min(library_start + LIBRARY_BLOCK_SIZE, end)
+            similarities = tanimoto_block(
+                words[start:stop],
+                counts[start:stop],
+                columns[:, library_start:library_stop],
+                counts[library_start:library_stop],
+            )
+            i, j = np.nonzero(similarities >= threshold)
+            upper = j + library_start > i + start
+            rows.append(i[upper] + start)
+            cols.append(j[upper] + library_start)
+            values.append(similarities[i[upper], j[upper]])
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+
+def similarity_graph(
+    packed: np.ndarray, threshold: float, n_jobs: int = 1
+) -> scipy.sparse.csr_matrix:
+    """
+    Find all pairs of fingerprints with Tanimoto similarity of at least the
+    threshold, without building the dense similarity matrix. Fingerprints are
+    compared in blocks, skipping blocks whose set bit counts rule the threshold out.
+
+    :param packed: uint8 array of bit-packed fingerprints
+    :param threshold: minimal similarity, in (0, 1]
+    :param n_jobs: number of threads
+    :return: symmetric sparse matrix of similarities, without the diagonal
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("Similarity threshold must be in (0, 1]")
+    words = as_words(packed)
+    order = np.argsort(popcount_rows(words), kind="stable")
+    words = words[order]
+    counts = popcount_rows(words)
+    columns = np.ascontiguousarray(words.T)
+
+    # blocks are interleaved between threads, as early blocks compare more pairs
+    block_starts = list(range(0, len(words), QUERY_BLOCK_SIZE))
+    n_jobs = max(1, min(n_jobs, len(block_starts)))
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        results = list(
+            executor.map(
+                lambda job: _threshold_blocks(
+                    words, columns, counts, threshold, block_starts[job::n_jobs]
+                ),
+                range(n_jobs),
+            )
+        )
+    rows = order[np.concatenate([result[0] for result in results])]
+    cols = order[np.concatenate([result[1] for result in results])]
+    values = np.concatenate([result[2] for result in results])
+    upper = scipy.sparse.coo_matrix(
+        (values, (rows, cols)), shape=(len(words), len(words))
+    ).tocsr()
+    return (upper + upper.T).tocsr()
+
+
+def butina_clusters(
+    packed: np.ndarray, threshold: float = BUTINA_THRESHOLD, n_jobs: int = 1
+) -> np.ndarray:
+    """
+    Cluster fingerprints with the Butina (sphere exclusion) algorithm. Compounds
+    with the most neighbors within the similarity threshold become centroids of
+    clusters made of their not yet assigned neighbors.
+
+    :param packed: uint8 array of bit-packed fingerprints
+    :param threshold: minimal Tanimoto similarity of a compound to the centroid
+    :param n_jobs: number of threads
+    :return: cluster labels, -1 for compounds without any cluster neighbors
+    """
+    graph = similarity_graph(packed, threshold, n_jobs)
+    n_neighbors = np.diff(graph.indptr)
+    labels = np.full(len(packed), -1)
+    assigned = np.zeros(len(packed), dtype=bool)
+    n_clusters = 0
+    for centroid in np.argsort(-n_neighbors, kind="stable"):
+        if not n_neighbors[centroid]:
+            break  # only singletons left
+        if assigned[centroid]:
+            continue
+        members = graph.indices[graph.indptr[centroid] : graph.indptr[centroid + 1]]
+        members = members[~assigned[members]]
+        assigned[centroid] = True
+        if not len(members):
+            continue
+        assigned[members] = True
+        labels[centroid] = labels[members] = n_clusters
+        n_clusters += 1
+    return labels
+
+
+class MaxMinPicker:
+    """
+    Lazy MaxMin diversity picker over bit-packed fingerprints. Every pick is the
+    candidate most distant from all compounds picked so far, so only the
+    similarities of each new pick to the candidates are ever computed.
+    Picking is incremental, further calls to `pick` extend the picked set.
+    """
+
+    def __init__(
+        self,
+        packed: np.ndarray,
+        seeds: Optional[np.ndarray] = None,
+        random_state: Optional[int] = None,
+    ) -> None:
+        """
+        :param packed: uint8 array of bit-packed candidate fingerprints
+        :param seeds: uint8 array of bit-packed fingerprints of already picked
+            compounds, new picks are chosen to be distant from them as well
+        :param random_state: seed of the random first pick, used if there are no seeds
+        """
+        self.words = as_words(packed)
+        self.columns = np.ascontiguousarray(self.words.T)
+        self.counts = popcount_rows(self.words)
+        self.min_distances = np.full(len(self.words), np.inf)
+        self.picked = []
+        self._rng = np.random.default_rng(random_state)
+        if seeds is not None and len(seeds):
+            seed_words = as_words(seeds)
+            seed_counts = popcount_rows(seed_words)
+            for start in range(0, len(seed_words), QUERY_BLOCK_SIZE):
+                stop = start + QUERY_BLOCK_SIZE
+                self._update(seed_words[start:stop], seed_counts[start:stop])
+
+    def _update(self, query_words: np.ndarray, query_counts: np.ndarray) -> None:
+        # keep intermediate arrays as large as a regular query x library block
+        block_size = QUERY_BLOCK_SIZE * LIBRARY_BLOCK_SIZE // len(query_words)
+        for start in range(0, len(self.words), block_size):
+            stop = start + block_size
+            similarities = tanimoto_block(
+                query_words,
+                query_counts,
+                self.columns[:, start:stop],
+                self.counts[start:stop],
+            )
+            np.minimum(
+                self.min_distances[start:stop],
+                1 - similarities.max(axis=0),
+                out=self.min_distances[start:stop],
+            )
+
+    def pick(self, n_picks: int) -> List[int]:
+        """
+        Pick further diverse candidates
+
+        :param n_picks: number of candidates to pick
+        :return: indices of the new picks in picking order
+        """
+        new_picks = []
+        n_picks = min(n_picks, len(self.words) - len(self.picked))
+        for _ in range(n_picks):
+            if np.isinf(self.min_distances).all():
+                index = int(self._rng.integers(len(self.words)))
+            else:
+                index = int(np.argmax(self.min_distances))
+            new_picks.append(index)
+            self.picked.append(index)
+            self.min_distances[index] = -np.inf
+            self._update(self.words[index : index + 1], self.counts[index : index + 1])
+        return new_picks
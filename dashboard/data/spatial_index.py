@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+POINTS_PER_CELL = 16
+
+
+class GridIndex:
+    """
+    Uniform grid over 2D points for rectangle queries. Points are sorted by cell,
+    row-major, so the cells of a grid row overlapping a rectangle are a single
+    contiguous slice and only those points are compared with the rectangle.
+    """
+
+    def __init__(
+        self, x: np.ndarray, y: np.ndarray, points_per_cell: int = POINTS_PER_CELL
+    ) -> None:
+        """
+        :param x: x coordinates of the points
+        :param y: y coordinates of the points
+        :param points_per_cell: average number of points per cell
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.n_points = len(x)
+        self.side = max(1, int(math.sqrt(self.n_points / points_per_cell)))
+        self.x_min, self.x_max = (x.min(), x.max()) if len(x) else (0.0, 0.0)
+        self.y_min, self.y_max = (y.min(), y.max()) if len(y) else (0.0, 0.0)
+        self.x_width = (self.x_max - self.x_min) / self.side or 1.0
+        self.y_width = (self.y_max - self.y_min) / self.side or 1.0
+
+        cell = self._cells(y, self.y_min, self.y_width) * self.side + self._cells(
+            x, self.x_min, self.x_width
+        )
+        self.order = np.argsort(cell, kind="stable").astype(np.int64)
+        self.starts = np.zeros(self.side * self.side + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(cell, minlength=self.side * self.side), out=self.starts[1:]
+        )
+        self.x = x[self.order]
+        self.y = y[self.order]
+
+    def _cells(self, values: np.ndarray, start: float, width: float) -> np.ndarray:
+        cells = np.floor((values - start) / width).astype(np.int64)
+        return np.clip(cells, 0, self.side - 1)
+
+    def _cell_range(
+        self, low: float, high: float, start: float, width: float, end: float
+    ) -> tuple[int, int, int, int]:
+        """
+        Find cells overlapping a range and cells fully inside it
+
+        :return: first and last overlapping cell, first and last inner cell
+        """
+        first = 0 if low <= start else self._cells(np.array([low]), start, width)[0]
+        last = (
+            self.side - 1
+            if high >= end
+            else self._cells(np.array([high]), start, width)[0]
+        )
+        # strict bounds, so that rounding never makes a cell with outside points inner
+        inner_first = 0 if low <= start else math.floor((low - start) / width) + 1
+        inner_last = (
+            self.side - 1
+            if high >= end
+            else min(math.floor((high - start) / width) - 1, self.side - 2)
+        )
+        return int(first), int(last), max(inner_first, first), min(inner_last, last)
+
+    def query(
+        self,
+        x_range: tuple[float, float] | None = None,
+        y_range: tuple[float, float] | None = None,
+        offset: int = 0,
+        limit: int | None = None,
+    ) -> tuple[int, np.ndarray]:
+        """
+        Find points inside a rectangle, bounds included. Points of cells fully
+        inside the rectangle are counted without comparing them.
+
+        :param x_range: minimal and maximal x, None for no bound
+        :param y_range: minimal and maximal y, None for no bound
+        :param offset: number of matching points to skip
+        :param limit: maximal number of returned points, None for all
+        :return: number of matching points and a page of their indices in grid order
+        """
+        x_low, x_high = x_range or (-np.inf, np.inf)
+        y_low, y_high = y_range or (-np.inf, np.inf)
+        if x_low > x_high or y_low > y_high or not self.n_points:
+            return 0, np.empty(0, dtype=np.int64)
+
+        (
+            first_column,
+            last_column,
+            inner_first_column,
+            inner_last_column,
+        ) = self._cell_range(x_low, x_high, self.x_min, self.x_width, self.x_max)
+        first_row, last_row, inner_first_row, inner_last_row = self._cell_range(
+            y_low, y_high, self.y_min, self.y_width, self.y_max
+        )
+        rows = np.arange(first_row, last_row + 1)
+        inner_row = (
+            (rows >= inner_first_row)
+            & (rows <= inner_last_row)
+            & (inner_first_column <= inner_last_column)
+        )
+        # every row is split into left, inner and right runs of cells, rows without
+        # inner cells are a single left run
+        column_bounds = np.stack(
+            [
+                np.full(len(rows), first_column),
+                np.where(inner_row, inner_first_column, last_column + 1),
+                np.where(inner_row, inner_last_column + 1, last_column + 1),
+                np.full(len(rows), last_column + 1),
+            ],
+            axis=1,
+        )
+        positions = self.starts[rows[:, None] * self.side + column_bounds]
+        run_starts = positions[:, :3].ravel()
+        run_stops = positions[:, 1:].ravel()
+        run_inner = np.zeros((len(rows), 3), dtype=bool)
+        run_inner[:, 1] = inner_row
+        run_inner = run_inner.ravel()
+
+        # compare only points of the outer runs with the rectangle
+        lengths = np.where(run_inner, 0, run_stops - run_starts)
+        outer_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        candidates = np.repeat(run_starts - outer_offsets[:-1], lengths)
+        candidates += np.arange(len(candidates))
+        x, y = self.x[candidates], self.y[candidates]
+        inside = (x >= x_low) & (x <= x_high) & (y >= y_low) & (y <= y_high)
+        inside_offsets = np.concatenate([[0], np.cumsum(inside)])
+
+        run_counts = np.where(
+            run_inner,
+            run_stops - run_starts,
+            inside_offsets[outer_offsets[1:]] - inside_offsets[outer_offsets[:-1]],
+        )
+        count_offsets = np.concatenate([[0], np.cumsum(run_counts)])
+        count = int(count_offsets[-1])
+        stop = count if limit is None else min(offset + limit, count)
+
+        page = [np.empty(0, dtype=np.int64)]
+        page_runs = np.flatnonzero(
+            (count_offsets[1:] > offset) & (count_offsets[:-1] < stop)
+        )
+        for run in page_runs:
+            if run_inner[run]:
+                page.append(self.order[run_starts[run] : run_stops[run]])
+            else:
+                run_slice = slice(outer_offsets[run], outer_offsets[run + 1])
+                page.append(self.order[candidates[run_slice][inside[run_slice]]])
+        page_start = offset - count_offsets[page_runs[0]] if len(page_runs) else 0
+        page = np.concatenate(page)[page_start : page_start + stop - offset]
+        return count, page
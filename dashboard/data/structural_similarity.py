@@ -1,44 +1,327 @@
-from typing import List, Optional, Tuple
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Tuple
 
 import hdbscan
 import numpy as np
 import pandas as pd
+import scipy.sparse
 import umap
+from pynndescent import NNDescent
 from rdkit import Chem
-from rdkit.Chem import AllChem
+from rdkit.Chem import rdFingerprintGenerator
 
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, TruncatedSVD
 
+from dashboard.data.fingerprint_store import FingerprintStore
+from dashboard.data.jobs import JobProgress, worker_context
+from dashboard.data.memory import PeakMemory, row_chunks
+from dashboard.data.similarity_search import (
+    TanimotoSearch,
+    butina_clusters,
+    similarity_graph,
+)
 
-def _compute_single_ecfp_descriptor(smiles: str) -> Optional[np.ndarray]:
+if TYPE_CHECKING:
+    from dashboard.data.reference_embedding import (
+        ReferenceEmbedding,
+        ReferenceEmbeddingStore,
+    )
+
+logger = logging.getLogger(__name__)
+
+
+ECFP_RADIUS = 2
+ECFP_BITS = 2048
+
+# below this many SMILES the process pool startup costs more than it saves
+MIN_PARALLEL_SMILES = 5000
+SMILES_CHUNK_SIZE = 2000
+UNPACK_CHUNK_SIZE = 10000
+UMAP_NEIGHBORS = 25
+ACTIVITY_CLIFF_THRESHOLD = 0.8
+# distance floor of the SALI score, so that identical fingerprints get a finite score
+MIN_CLIFF_DISTANCE = 0.01
+
+KnnGraph = Tuple[np.ndarray, np.ndarray, NNDescent]
+
+
+@functools.lru_cache(maxsize=None)
+def _morgan_generator(radius: int, n_bits: int):
+    return rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+
+
+def _compute_ecfp_chunk(
+    smiles_chunk: List[str], radius: int, n_bits: int, canonicalize: bool = False
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Calculate bit-packed ecfp descriptors for a chunk of smiles
+
+    :param smiles_chunk: list of smiles
+    :param radius: radius of the Morgan fingerprint
+    :param n_bits: length of the fingerprint in bits
+    :param canonicalize: whether to return canonical smiles of correct descriptors
+    :return: positions of correct descriptors within the chunk, the descriptors
+        and their canonical smiles (empty if not canonicalized)
+    """
+    generator = _morgan_generator(radius, n_bits)
+    positions, canonical = [], []
+    packed = np.empty((len(smiles_chunk), n_bits // 8), dtype=np.uint8)
+    for i, smiles in enumerate(smiles_chunk):
+        mol = Chem.MolFromSmiles(smiles) if isinstance(smiles, str) else None
+        if mol is None:
+            continue
+        packed[len(positions)] = np.packbits(generator.GetFingerprintAsNumPy(mol))
+        positions.append(i)
+        if canonicalize:
+            canonical.append(Chem.MolToSmiles(mol))
+    return np.array(positions, dtype=np.int64), packed[: len(positions)], canonical
+
+
+def _compute_ecfp(
+    smiles_list: List[str],
+    radius: int,
+    n_bits: int,
+    n_jobs: Optional[int],
+    canonicalize: bool = False,
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    chunks = [
+        smiles_list[start : start + SMILES_CHUNK_SIZE]
+        for start in range(0, len(smiles_list), SMILES_CHUNK_SIZE)
+    ]
+    compute_chunk = functools.partial(
+        _compute_ecfp_chunk, radius=radius, n_bits=n_bits, canonicalize=canonicalize
+    )
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if len(smiles_list) < MIN_PARALLEL_SMILES or n_jobs == 1:
+        results = map(compute_chunk, chunks)
+        return _collect_ecfp_chunks(results, len(smiles_list), n_bits)
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, mp_context=worker_context()
+    ) as executor:
+        results = executor.map(compute_chunk, chunks)
+        return _collect_ecfp_chunks(results, len(smiles_list), n_bits)
+
+
+def _collect_ecfp_chunks(
+    results: Iterable[Tuple[np.ndarray, np.ndarray, List[str]]], size: int, n_bits: int
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    descriptors = np.empty((size, n_bits // 8), dtype=np.uint8)
+    keep_idx = np.empty(size, dtype=np.int64)
+    canonical = []
+    n_valid, offset = 0, 0
+    for positions, packed, chunk_canonical in results:
+        descriptors[n_valid : n_valid + len(positions)] = packed
+        keep_idx[n_valid : n_valid + len(positions)] = positions + offset
+        canonical.extend(chunk_canonical)
+        n_valid += len(positions)
+        offset += SMILES_CHUNK_SIZE
+    return descriptors[:n_valid], keep_idx[:n_valid], canonical
+
+
+def compute_ecfp_descriptors(
+    smiles_list: List[str],
+    radius: int = ECFP_RADIUS,
+    n_bits: int = ECFP_BITS,
+    n_jobs: Optional[int] = None,
+    store: Optional[FingerprintStore] = None,
+) -> Tuple[np.ndarray, List[int]]:
     """
-    Calculate ecfp descriptor for single smiles
+    Calculate bit-packed ecfp descriptors for list of smiles. Large inputs are
+    fingerprinted in a process pool. If a store is given, only the smiles missing
+    from it are fingerprinted and then appended to it.
 
-    :param smiles: smiles
-    :return: ecfp descriptor
+    :param smiles_list: list of smiles
+    :param radius: radius of the Morgan fingerprint
+    :param n_bits: length of the fingerprint in bits, multiple of 8
+    :param n_jobs: number of worker processes, defaults to cpu count
+    :param store: persistent fingerprint store with matching radius and n_bits
+    :return: uint8 array of shape (n, n_bits / 8) and indices of correct descriptors
     """
-    mol = Chem.MolFromSmiles(smiles)
-    if mol:
-        fp = AllChem.GetMorganFingerprintAsBitVect(mol, radius=2, nBits=2048)
-        return np.array(fp)
-    return None
+    if n_bits % 8:
+        raise ValueError("Number of fingerprint bits must be a multiple of 8")
+    smiles_list = list(smiles_list)
+    if store is None:
+        descriptors, keep_idx, _ = _compute_ecfp(smiles_list, radius, n_bits, n_jobs)
+        return descriptors, keep_idx.tolist()
+    if (store.radius, store.n_bits) != (radius, n_bits):
+        raise ValueError("Fingerprint store parameters do not match")
+
+    hit_idx, hit_descriptors = store.lookup(smiles_list)
+    miss_idx = np.setdiff1d(np.arange(len(smiles_list)), hit_idx)
+    miss_smiles = [smiles_list[i] for i in miss_idx]
+    miss_descriptors, computed_idx, canonical = _compute_ecfp(
+        miss_smiles, radius, n_bits, n_jobs, canonicalize=True
+    )
+    store.add(canonical, miss_descriptors, [miss_smiles[i] for i in computed_idx])
 
+    descriptors = np.empty((len(smiles_list), n_bits // 8), dtype=np.uint8)
+    valid = np.zeros(len(smiles_list), dtype=bool)
+    descriptors[hit_idx] = hit_descriptors
+    descriptors[miss_idx[computed_idx]] = miss_descriptors
+    valid[hit_idx] = True
+    valid[miss_idx[computed_idx]] = True
+    return descriptors[valid], np.flatnonzero(valid).tolist()
 
-def compute_ecfp_descriptors(smiles_list: List[str]) -> Tuple[np.ndarray, int]:
+
+def iter_unpacked_fingerprints(
+    packed: np.ndarray,
+    n_bits: int = ECFP_BITS,
+    chunk_size: int = UNPACK_CHUNK_SIZE,
+    dtype: np.dtype = np.bool_,
+) -> Iterator[np.ndarray]:
+    """
+    Unpack bit-packed fingerprints chunk by chunk, so that only one dense chunk
+    is held in memory at a time
+
+    :param packed: uint8 array of bit-packed fingerprints
+    :param n_bits: length of the fingerprint in bits
+    :param chunk_size: number of fingerprints per chunk
+    :param dtype: dtype of the dense chunks
+    :return: iterator of dense arrays of shape (chunk_size, n_bits)
     """
-    Calculate ecfp descriptor for list of smiles
+    for start in range(0, len(packed), chunk_size):
+        chunk = np.unpackbits(packed[start : start + chunk_size], axis=1, count=n_bits)
+        yield chunk.astype(dtype, copy=False)
+
 
-    :param smiles: list of smiles
-    :return: ecfp descriptors and indices of correct descriptors
+def unpack_fingerprints(
+    packed: np.ndarray, n_bits: int = ECFP_BITS, dtype: np.dtype = np.bool_
+) -> np.ndarray:
     """
-    keep_idx = []
-    descriptors = []
-    for i, smiles in enumerate(smiles_list):
-        ecfp = _compute_single_ecfp_descriptor(smiles)
-        if ecfp is not None:
-            keep_idx.append(i)
-            descriptors.append(ecfp)
-    return np.vstack(descriptors), keep_idx
+    Unpack bit-packed fingerprints into a dense array
+
+    :param packed: uint8 array of bit-packed fingerprints
+    :param n_bits: length of the fingerprint in bits
+    :param dtype: dtype of the dense array
+    :return: dense array of shape (n, n_bits)
+    """
+    dense = np.empty((len(packed), n_bits), dtype=dtype)
+    offset = 0
+    for chunk in iter_unpacked_fingerprints(packed, n_bits, dtype=dtype):
+        dense[offset : offset + len(chunk)] = chunk
+        offset += len(chunk)
+    return dense
+
+
+def fingerprints_to_csr(
+    packed: np.ndarray, n_bits: int = ECFP_BITS
+) -> scipy.sparse.csr_matrix:
+    """
+    Convert bit-packed fingerprints into a sparse matrix of set bits, built chunk
+    by chunk so that the dense fingerprints are never materialized at once
+
+    :param packed: uint8 array of bit-packed fingerprints
+    :param n_bits: length of the fingerprint in bits
+    :return: float32 csr matrix of shape (n, n_bits)
+    """
+    indices, indptr = [], [np.zeros(1, dtype=np.int64)]
+    for chunk in iter_unpacked_fingerprints(packed, n_bits):
+        rows, columns = np.nonzero(chunk)
+        indices.append(columns.astype(np.int32))
+        counts = np.bincount(rows, minlength=len(chunk))
+        indptr.append(indptr[-1][-1] + np.cumsum(counts))
+    indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.int32)
+    data = np.ones(len(indices), dtype=np.float32)
+    return scipy.sparse.csr_matrix(
+        (data, indices, np.concatenate(indptr)), shape=(len(packed), n_bits)
+    )
+
+
+def find_nearest_neighbors(
+    query_df: pd.DataFrame,
+    library_df: pd.DataFrame,
+    k: int = 5,
+    store: Optional[FingerprintStore] = None,
+    n_jobs: int = 1,
+) -> pd.DataFrame:
+    """
+    Find the most similar library compounds for every query compound
+
+    :param query_df: df with EOS and smiles of the query compounds
+    :param library_df: df with EOS and smiles of the library compounds,
+        other columns are copied to the result with "neighbor_" prefix
+    :param k: number of neighbors per query
+    :param store: persistent fingerprint store to reuse fingerprints from
+    :param n_jobs: number of threads
+    :return: df with EOS, rank, neighbor columns and similarity
+    """
+    query_fps, query_idx = compute_ecfp_descriptors(query_df["smiles"], store=store)
+    library_fps, library_idx = compute_ecfp_descriptors(
+        library_df["smiles"], store=store
+    )
+    if not len(query_fps) or not len(library_fps):
+        return pd.DataFrame(columns=["EOS", "rank", "neighbor_EOS", "similarity"])
+
+    neighbors, similarities = TanimotoSearch(library_fps).search(
+        query_fps, k=k, n_jobs=n_jobs
+    )
+    n_neighbors = neighbors.shape[1]
+    library = library_df.iloc[library_idx].reset_index(drop=True)
+    result = library.iloc[neighbors.ravel()].add_prefix("neighbor_")
+    result = result.drop(columns=["neighbor_smiles"], errors="ignore")
+    result.insert(
+        0, "EOS", np.repeat(query_df["EOS"].to_numpy()[query_idx], n_neighbors)
+    )
+    result.insert(1, "rank", np.tile(np.arange(1, n_neighbors + 1), len(query_idx)))
+    result["similarity"] = similarities.ravel()
+    return result.reset_index(drop=True)
+
+
+def find_activity_cliffs(
+    df: pd.DataFrame,
+    packed: np.ndarray,
+    activity_column: str = "activity_final",
+    threshold: float = ACTIVITY_CLIFF_THRESHOLD,
+    n_jobs: int = 1,
+) -> pd.DataFrame:
+    """
+    Find pairs of structurally similar compounds with different activity. Only
+    pairs above the similarity threshold are kept, so no dense similarity matrix
+    is built. Numeric activities are scored with the structure-activity landscape
+    index |difference| / (1 - similarity), categorical ones (activity_final) keep
+    the pairs of different tested classes, scored with similarity.
+
+    :param df: df with EOS and activity of the compounds
+    :param packed: uint8 array of bit-packed fingerprints of the compounds
+    :param activity_column: column with the activity
+    :param threshold: minimal Tanimoto similarity of a pair
+    :param n_jobs: number of threads
+    :return: df with EOS and activity of both compounds, similarity and score,
+        sorted by descending score
+    """
+    graph = scipy.sparse.triu(
+        similarity_graph(packed, threshold, n_jobs=n_jobs), format="coo"
+    )
+    first, second, similarity = graph.row, graph.col, graph.data
+    values = df[activity_column]
+    numeric = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    if np.isfinite(numeric).any():
+        difference = np.abs(numeric[first] - numeric[second])
+        keep = difference > 0
+        score = difference / np.maximum(1 - similarity, MIN_CLIFF_DISTANCE)
+        activity = numeric
+    else:
+        activity = values.to_numpy(dtype=object)
+        tested = values.notna().to_numpy() & (activity != "not tested")
+        keep = tested[first] & tested[second] & (activity[first] != activity[second])
+        score = similarity
+
+    eos = df["EOS"].to_numpy()
+    first, second = first[keep], second[keep]
+    cliffs = pd.DataFrame(
+        {
+            "EOS_1": eos[first],
+            "EOS_2": eos[second],
+            f"{activity_column}_1": activity[first],
+            f"{activity_column}_2": activity[second],
+            "similarity": similarity[keep],
+            "score": score[keep],
+        }
+    )
+    return cliffs.sort_values("score", ascending=False, ignore_index=True)
 
 
 def merge_active_new(
@@ -60,80 +343,372 @@ def merge_active_new(
     return merged
 
 
-def calculate_umap(descriptors: np.ndarray, n_components: int = 2) -> np.ndarray:
+def calculate_knn_graph(
+    descriptors: np.ndarray | scipy.sparse.csr_matrix,
+    n_neighbors: int = UMAP_NEIGHBORS,
+    n_jobs: int = -1,
+) -> KnnGraph:
     """
-    Calculate UMAP projection
+    Calculate approximate jaccard nearest neighbor graph, to be shared by UMAPs
+
+    :param descriptors: dense or sparse descriptors
+    :param n_neighbors: number of neighbors
+    :param n_jobs: number of threads, -1 for all cores
+    :return: neighbor indices, neighbor distances and the search index
+    """
+    index = NNDescent(
+        descriptors, metric="jaccard", n_neighbors=n_neighbors, n_jobs=n_jobs
+    )
+    indices, distances = index.neighbor_graph
+    return indices, distances, index
+
+
+def fit_umap(
+    descriptors: np.ndarray | scipy.sparse.csr_matrix,
+    n_components: int = 2,
+    knn_graph: Optional[KnnGraph] = None,
+) -> umap.UMAP:
+    """
+    Fit UMAP model
 
-    :param descriptors: descriptors
+    :param descriptors: dense or sparse descriptors
     :param n_components: number of components to project to
-    :return: array with projection
+    :param knn_graph: precomputed neighbor graph, see `calculate_knn_graph`
+    :return: fitted model
     """
     umap_model = umap.UMAP(
         metric="jaccard",
-        n_neighbors=25,
+        n_neighbors=UMAP_NEIGHBORS,
         n_components=n_components,
         low_memory=False,
         min_dist=0.001,
+        precomputed_knn=knn_graph or (None, None, None),
+        # otherwise the precomputed graph is ignored for less than 4096 compounds
+        force_approximation_algorithm=knn_graph is not None,
     )
-    X_umap = umap_model.fit_transform(descriptors)
-    return X_umap
+    return umap_model.fit(descriptors)
+
+
+def calculate_umap(
+    descriptors: np.ndarray | scipy.sparse.csr_matrix,
+    n_components: int = 2,
+    knn_graph: Optional[KnnGraph] = None,
+) -> np.ndarray:
+    """
+    Calculate UMAP projection
+
+    :param descriptors: dense or sparse descriptors
+    :param n_components: number of components to project to
+    :param knn_graph: precomputed neighbor graph, see `calculate_knn_graph`
+    :return: array with projection
+    """
+    return fit_umap(descriptors, n_components, knn_graph).embedding_
 
 
-def calculate_pca(descriptors: np.ndarray, n_components: int = 2) -> np.ndarray:
+def calculate_pca(
+    descriptors: np.ndarray | scipy.sparse.csr_matrix, n_components: int = 2
+) -> np.ndarray:
     """
-    Calculate PCA projection
+    Calculate PCA projection, sparse descriptors are projected with truncated SVD
+    so that they are never densified
 
-    :param descriptors: descriptors
+    :param descriptors: dense or sparse descriptors
     :param n_components: number of components to project to
     :return: array with projection
     """
+    if scipy.sparse.issparse(descriptors):
+        return TruncatedSVD(n_components=n_components).fit_transform(descriptors)
     pca_model = PCA(n_components=n_components)
     X_pca = pca_model.fit_transform(descriptors)
     return X_pca
 
 
-def calculate_clusters(x_projection: np.ndarray) -> np.ndarray:
+class FingerprintPCA:
+    """
+    Exact PCA of bit-packed fingerprints fitted out of core. The Gram matrix of
+    the fingerprints is accumulated from sparse chunks, so memory is bounded by
+    the chunk size and n_bits^2 regardless of the number of fingerprints.
+    Exposes the same fitted attributes as sklearn PCA.
+    """
+
+    def __init__(
+        self,
+        n_components: int = 2,
+        n_bits: int = ECFP_BITS,
+        memory_limit: Optional[int] = None,
+    ) -> None:
+        """
+        :param n_components: number of components to project to
+        :param n_bits: length of the fingerprint in bits
+        :param memory_limit: memory limit of an unpacked chunk in bytes
+        """
+        self.n_components = n_components
+        self.n_components_ = n_components
+        self.n_bits = n_bits
+        self.memory_limit = memory_limit
+        self.n_samples_seen_ = 0
+        self._bit_counts = np.zeros(n_bits)
+        self._gram = np.zeros((n_bits, n_bits))
+
+    def _sparse_chunks(self, packed: np.ndarray) -> Iterator[scipy.sparse.csr_matrix]:
+        for rows in row_chunks(len(packed), self.n_bits, self.memory_limit):
+            yield fingerprints_to_csr(packed[rows], self.n_bits)
+
+    def partial_fit(self, packed: np.ndarray) -> "FingerprintPCA":
+        """
+        Accumulate statistics of the fingerprints and update the components
+
+        :param packed: uint8 array of bit-packed fingerprints
+        :return: model itself
+        """
+        for chunk in self._sparse_chunks(packed):
+            self.n_samples_seen_ += chunk.shape[0]
+            self._bit_counts += np.asarray(chunk.sum(axis=0)).ravel()
+            self._gram += (chunk.T @ chunk).toarray()
+
+        n_samples = self.n_samples_seen_
+        self.mean_ = self._bit_counts / n_samples
+        covariance = self._gram - n_samples * np.outer(self.mean_, self.mean_)
+        covariance /= max(n_samples - 1, 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        top = np.argsort(eigenvalues)[::-1][: self.n_components]
+        components = eigenvectors[:, top].T
+        # same sign convention as sklearn PCA
+        signs = np.sign(components[np.arange(len(top)), np.abs(components).argmax(1)])
+        self.components_ = components * signs[:, None]
+        self.explained_variance_ = np.clip(eigenvalues[top], 0, None)
+        self.explained_variance_ratio_ = self.explained_variance_ / max(
+            np.trace(covariance), np.finfo(float).tiny
+        )
+        return self
+
+    def fit(self, packed: np.ndarray) -> "FingerprintPCA":
+        """
+        Fit the model on bit-packed fingerprints
+
+        :param packed: uint8 array of bit-packed fingerprints
+        :return: model itself
+        """
+        self.n_samples_seen_ = 0
+        self._bit_counts[:] = 0
+        self._gram[:] = 0
+        return self.partial_fit(packed)
+
+    def transform(self, packed: np.ndarray) -> np.ndarray:
+        """
+        Project bit-packed fingerprints
+
+        :param packed: uint8 array of bit-packed fingerprints
+        :return: array with projection
+        """
+        offset = self.mean_ @ self.components_.T
+        X_pca = np.empty((len(packed), self.n_components_))
+        start = 0
+        for chunk in self._sparse_chunks(packed):
+            X_pca[start : start + chunk.shape[0]] = chunk @ self.components_.T - offset
+            start += chunk.shape[0]
+        return X_pca
+
+    def fit_transform(self, packed: np.ndarray) -> np.ndarray:
+        """
+        Fit the model and project bit-packed fingerprints
+
+        :param packed: uint8 array of bit-packed fingerprints
+        :return: array with projection
+        """
+        return self.fit(packed).transform(packed)
+
+
+def calculate_packed_pca(
+    packed: np.ndarray,
+    n_components: int = 2,
+    n_bits: int = ECFP_BITS,
+    memory_limit: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Calculate PCA projection of bit-packed fingerprints with bounded memory
+
+    :param packed: uint8 array of bit-packed fingerprints
+    :param n_components: number of components to project to
+    :param n_bits: length of the fingerprint in bits
+    :param memory_limit: memory limit of an unpacked chunk in bytes
+    :return: array with projection
+    """
+    return FingerprintPCA(n_components, n_bits, memory_limit).fit_transform(packed)
+
+
+def fit_clusterer(
+    x_projection: np.ndarray, prediction_data: bool = False
+) -> hdbscan.HDBSCAN:
+    """
+    Fit hdbscan model
+
+    :param x_projection: array with projected data
+    :param prediction_data: whether to keep data for `hdbscan.approximate_predict`
+    :return: fitted model
+    """
+    hdbscan_model = hdbscan.HDBSCAN(
+        min_cluster_size=20,
+        min_samples=20,
+        cluster_selection_method="eom",
+        prediction_data=prediction_data,
+    )
+    return hdbscan_model.fit(x_projection)
+
+
+def cluster_names(labels: np.ndarray) -> List[str]:
+    """
+    Name hdbscan clusters
+
+    :param labels: hdbscan cluster labels
+    :return: list with cluster names, noise points named "outlier"
+    """
+    return [f"c{x}" if x != -1 else "outlier" for x in labels]
+
+
+def calculate_clusters(x_projection: np.ndarray) -> List[str]:
     """
     Calculate hdbscan clusters
 
     :param x_projection: array with projected data
     :return: array with clusters
     """
-    hdbscan_model = hdbscan.HDBSCAN(
-        min_cluster_size=20, min_samples=20, cluster_selection_method="eom"
+    return cluster_names(fit_clusterer(x_projection).labels_)
+
+
+def assign_projection(
+    df: pd.DataFrame, name: str, x_projection: np.ndarray, clusters: List[str]
+) -> None:
+    """
+    Add projection and cluster columns (e.g. PCA_X, PCA_Y, PCA_Z, cluster_PCA)
+
+    :param df: df to add the columns to, in place
+    :param name: name of the projection
+    :param x_projection: array with projected data, up to 3 components
+    :param clusters: cluster names
+    """
+    for axis, values in zip("XYZ", x_projection.T):
+        df[f"{name}_{axis}"] = values
+    df[f"cluster_{name}"] = clusters
+
+
+def _project_and_cluster(
+    project: Callable[..., np.ndarray], *args, **kwargs
+) -> Tuple[np.ndarray, List[str]]:
+    x_projection = project(*args, **kwargs)
+    return x_projection, calculate_clusters(x_projection)
+
+
+def _fit_projections(df: pd.DataFrame, packed_descriptors: np.ndarray) -> pd.DataFrame:
+    with PeakMemory() as memory:
+        sparse_descriptors = fingerprints_to_csr(packed_descriptors)
+        knn_graph = calculate_knn_graph(sparse_descriptors)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            umap_2d = executor.submit(
+                _project_and_cluster, calculate_umap, sparse_descriptors, 2, knn_graph
+            )
+            umap_3d = executor.submit(
+                _project_and_cluster, calculate_umap, sparse_descriptors, 3, knn_graph
+            )
+            pca = executor.submit(
+                _project_and_cluster, calculate_packed_pca, packed_descriptors, 3
+            )
+            X_umap, clusters_umap = umap_2d.result()
+            X_umap_3d, clusters_umap_3d = umap_3d.result()
+            X_pca, clusters_pca = pca.result()
+    logger.info(
+        f"Projected {len(df)} compounds, peak memory {memory.peak / 2**20:.0f} MiB "
+        f"(+{memory.increase / 2**20:.0f} MiB)"
     )
-    preds = hdbscan_model.fit_predict(x_projection)
-    clusters = [f"c{x}" if x != -1 else "outlier" for x in preds]
-    return clusters
+
+    assign_projection(df, "UMAP", X_umap, clusters_umap)
+    assign_projection(df, "UMAP3D", X_umap_3d, clusters_umap_3d)
+    assign_projection(df, "PCA", X_pca, clusters_pca)
+    return df
 
 
 def prepare_cluster_viz(
-    activity: pd.DataFrame, smiles_active: pd.DataFrame, smiles_new: pd.DataFrame
+    activity: pd.DataFrame,
+    smiles_active: pd.DataFrame,
+    smiles_new: pd.DataFrame,
+    store: Optional[FingerprintStore] = None,
+    reference: Optional["ReferenceEmbedding"] = None,
 ) -> pd.DataFrame:
     """
-    Merge dataframes, calculate projections and clusters
+    Merge dataframes, calculate projections and clusters. The jaccard neighbor
+    graph is calculated once for both UMAPs, then projections and their
+    clusterings run concurrently. If a reference embedding is given, nothing is
+    fitted and the compounds are placed in it instead. Butina clusters are not
+    calculated here, see `butina_cluster_names`.
 
     :param activity: df with activity calculated
     :param smiles_active: df with smiles of active compounds
     :param smiles_new: new smiles to cluster
+    :param store: persistent fingerprint store to reuse fingerprints from
+    :param reference: embedding fitted on the reference library
     :return: df with everything calculated
     """
     df = merge_active_new(activity, smiles_active, smiles_new)
-    ecfp_descriptors, keep_idx = compute_ecfp_descriptors(df["smiles"])
+    packed_descriptors, keep_idx = compute_ecfp_descriptors(df["smiles"], store=store)
     df = df.iloc[keep_idx]
-    X_umap = calculate_umap(ecfp_descriptors)
-    df["UMAP_X"], df["UMAP_Y"] = X_umap[:, 0], X_umap[:, 1]
-    df["cluster_UMAP"] = calculate_clusters(X_umap)
-
-    X_umap_3d = calculate_umap(ecfp_descriptors, n_components=3)
-    df["UMAP3D_X"], df["UMAP3D_Y"], df["UMAP3D_Z"] = (
-        X_umap_3d[:, 0],
-        X_umap_3d[:, 1],
-        X_umap_3d[:, 2],
+    if reference is not None:
+        df = reference.project(df, packed_descriptors)
+    else:
+        df = _fit_projections(df, packed_descriptors)
+    return df
+
+
+def butina_cluster_names(
+    smiles: pd.Series, store: Optional[FingerprintStore] = None
+) -> List[str]:
+    """
+    Cluster compounds with Butina on their fingerprints. It builds the full
+    similarity graph, so it is calculated only when the clustering is shown.
+
+    :param smiles: smiles of the compounds
+    :param store: persistent fingerprint store to reuse fingerprints from
+    :return: list with cluster names, compounds without any cluster neighbors and
+        invalid smiles named "outlier"
+    """
+    packed_descriptors, keep_idx = compute_ecfp_descriptors(smiles, store=store)
+    names = np.full(len(smiles), "outlier", dtype=object)
+    names[keep_idx] = cluster_names(
+        butina_clusters(packed_descriptors, n_jobs=os.cpu_count() or 1)
     )
-    df["cluster_UMAP3D"] = calculate_clusters(X_umap_3d)
+    return names.tolist()
 
-    X_pca = calculate_pca(ecfp_descriptors, 3)
-    df["PCA_X"], df["PCA_Y"], df["PCA_Z"] = X_pca[:, 0], X_pca[:, 1], X_pca[:, 2]
-    df["cluster_PCA"] = calculate_clusters(X_pca)
-    return df
+
+def cluster_smiles_job(
+    activity: pd.DataFrame,
+    library_path: str,
+    smiles_new: pd.DataFrame,
+    progress: JobProgress,
+    store: Optional[FingerprintStore] = None,
+    embedding_store: Optional["ReferenceEmbeddingStore"] = None,
+    library_version: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Background job of `prepare_cluster_viz`, the stores are pickled as their
+    directories and shared by the jobs of a worker process
+
+    :param activity: df with activity calculated
+    :param library_path: path to the parquet file with smiles of active compounds
+    :param smiles_new: new smiles to cluster
+    :param progress: progress of the job
+    :param store: persistent fingerprint store to reuse fingerprints from
+    :param embedding_store: store of the embedding fitted on the reference library,
+        if not given projections are fitted on the uploaded compounds
+    :param library_version: modification time of the library, only a part of the
+        job key
+    :return: df with everything calculated
+    """
+    smiles_active = pd.read_parquet(library_path)
+    reference = None
+    if embedding_store is not None:
+        progress.update(0.0, "Loading the reference embedding")
+        reference = embedding_store.get(store)
+    progress.update(0.2, "Calculating fingerprints, projections and clusters")
+    return prepare_cluster_viz(
+        activity, smiles_active, smiles_new, store=store, reference=reference
+    )
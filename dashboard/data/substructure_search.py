@@ -0,0 +1,164 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+from rdkit import Chem, DataStructs, rdBase
+
+from dashboard.data.jobs import worker_context
+from dashboard.data.similarity_search import as_words
+
+PATTERN_BITS = 2048
+
+# below this many molecules the process pool startup costs more than it saves
+MIN_PARALLEL_MOLECULES = 5000
+MOLECULE_CHUNK_SIZE = 2000
+
+
+def parse_query(query: str) -> Chem.Mol:
+    """
+    Parse a substructure query, SMILES or SMARTS. Valid SMILES are parsed as
+    SMILES, so that Kekulé rings are aromatized and match aromatic molecules.
+
+    :param query: SMILES or SMARTS of the substructure
+    :return: query molecule
+    """
+    if not query:
+        raise ValueError(f"Invalid substructure query: {query!r}")
+    with rdBase.BlockLogs():
+        # SMARTS queries are mostly invalid SMILES, the parse errors are expected
+        mol = Chem.MolFromSmiles(query)
+    if mol is None:
+        mol = Chem.MolFromSmarts(query)
+    if mol is None:
+        raise ValueError(f"Invalid substructure query: {query!r}")
+    return mol
+
+
+def pattern_fingerprint(mol: Chem.Mol, n_bits: int = PATTERN_BITS) -> np.ndarray:
+    """
+    Calculate bit-packed RDKit pattern fingerprint. Every bit set for a
+    substructure is also set for the molecules containing it.
+
+    :param mol: molecule or query molecule
+    :param n_bits: length of the fingerprint in bits, multiple of 64
+    :return: uint8 array of shape (n_bits / 8,)
+    """
+    dense = np.zeros(n_bits, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(Chem.PatternFingerprint(mol, fpSize=n_bits), dense)
+    return np.packbits(dense)
+
+
+def _pattern_fingerprint_chunk(
+    smiles_chunk: List[str], n_bits: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    positions = []
+    packed = np.empty((len(smiles_chunk), n_bits // 8), dtype=np.uint8)
+    for i, smiles in enumerate(smiles_chunk):
+        mol = Chem.MolFromSmiles(smiles) if isinstance(smiles, str) else None
+        if mol is None:
+            continue
+        packed[len(positions)] = pattern_fingerprint(mol, n_bits)
+        positions.append(i)
+    return np.array(positions, dtype=np.int64), packed[: len(positions)]
+
+
+def _match_chunk(smiles_chunk: List[str], query: str) -> np.ndarray:
+    query_mol = parse_query(query)
+    return np.array(
+        [
+            Chem.MolFromSmiles(smiles).HasSubstructMatch(query_mol)
+            for smiles in smiles_chunk
+        ],
+        dtype=bool,
+    )
+
+
+def _map_chunks(function, items: list, n_jobs: Optional[int]) -> list:
+    chunks = [
+        items[start : start + MOLECULE_CHUNK_SIZE]
+        for start in range(0, len(items), MOLECULE_CHUNK_SIZE)
+    ]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if len(items) < MIN_PARALLEL_MOLECULES or n_jobs == 1:
+        return list(map(function, chunks))
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, mp_context=worker_context()
+    ) as executor:
+        return list(executor.map(function, chunks))
+
+
+class SubstructureSearch:
+    """
+    Substructure search over a fixed set of molecules. Pattern fingerprints are
+    calculated once, every query first screens out the molecules missing any
+    of its pattern bits and runs the exact RDKit match only on the rest.
+    """
+
+    def __init__(
+        self,
+        smiles: List[str],
+        n_bits: int = PATTERN_BITS,
+        n_jobs: Optional[int] = None,
+    ) -> None:
+        """
+        :param smiles: list of smiles, invalid ones never match
+        :param n_bits: length of the pattern fingerprint in bits, multiple of 64
+        :param n_jobs: number of worker processes, defaults to cpu count
+        """
+        self.smiles = list(smiles)
+        self.n_bits = n_bits
+        results = _map_chunks(
+            functools.partial(_pattern_fingerprint_chunk, n_bits=n_bits),
+            self.smiles,
+            n_jobs,
+        )
+        offsets = range(0, len(self.smiles), MOLECULE_CHUNK_SIZE)
+        self.valid_idx = np.concatenate(
+            [np.empty(0, dtype=np.int64)]
+            + [positions + offset for (positions, _), offset in zip(results, offsets)]
+        )
+        packed = np.concatenate(
+            [np.empty((0, n_bits // 8), dtype=np.uint8)]
+            + [packed for _, packed in results]
+        )
+        # word-major, so that the screen reads one contiguous row per query word
+        self.columns = np.ascontiguousarray(as_words(packed).T)
+
+    def __len__(self) -> int:
+        return len(self.smiles)
+
+    def screen(self, query: str) -> np.ndarray:
+        """
+        Find molecules which may contain the substructure
+
+        :param query: SMARTS or SMILES of the substructure
+        :return: indices of the candidate molecules
+        """
+        query_fp = pattern_fingerprint(parse_query(query), self.n_bits)
+        query_words = as_words(query_fp[None])[0]
+        candidates = np.ones(self.columns.shape[1], dtype=bool)
+        buffer = np.empty_like(candidates, dtype=np.uint64)
+        for word in np.flatnonzero(query_words):
+            np.bitwise_and(self.columns[word], query_words[word], out=buffer)
+            candidates &= buffer == query_words[word]
+        return self.valid_idx[candidates]
+
+    def search(self, query: str, n_jobs: Optional[int] = None) -> np.ndarray:
+        """
+        Find molecules containing the substructure
+
+        :param query: SMARTS or SMILES of the substructure
+        :param n_jobs: number of worker processes, defaults to cpu count
+        :return: indices of the matching molecules
+        """
+        candidates = self.screen(query)
+        matches = _map_chunks(
+            functools.partial(_match_chunk, query=query),
+            [self.smiles[i] for i in candidates],
+            n_jobs,
+        )
+        if not matches:
+            return candidates
+        return candidates[np.concatenate(matches)]
@@ -6,6 +6,8 @@ import uuid
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 
+from dashboard.data.jobs import QUEUED, JobStatus
+
 
 # Extra elements that are not part of the main layout
 # Invisible or detached from the main layout
@@ -325,3 +327,29 @@ def make_new_upload_view(
             ],
         ),
     ]
+
+
+def make_job_progress(status: JobStatus, children: list | None = None) -> html.Div:
+    """
+    Progress bar of a background job with its current step
+
+    :param status: status of the job
+    :param children: partial result of the job shown below the bar
+    :return: html.Div with the progress
+    """
+    if status.message:
+        message = status.message
+    elif status.state == QUEUED:
+        message = "Waiting for a free worker..."
+    else:
+        message = "Starting..."
+    return html.Div(
+        className="mt-3",
+        children=[
+            html.Div(message, className="mb-1"),
+            dbc.Progress(
+                value=round(status.progress * 100), striped=True, animated=True
+            ),
+            *(children or []),
+        ],
+    )
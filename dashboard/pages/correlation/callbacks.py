@@ -7,7 +7,6 @@ from datetime import datetime
 from typing import Tuple
 
 import pandas as pd
-import pyarrow as pa
 from dash import Input, Output, State, callback, dcc, html, no_update
 from plotly import graph_objects as go
 
@@ -113,12 +112,8 @@ def on_both_files_uploaded(
     saved_name_2 = f"{stored_uuid}_{SUFFIX_CORR_FILE2}.pq"
 
     try:
-        corr_df_1 = pd.read_parquet(
-            pa.BufferReader(file_storage.read_file(saved_name_1))
-        )
-        corr_df_2 = pd.read_parquet(
-            pa.BufferReader(file_storage.read_file(saved_name_2))
-        )
+        corr_df_1 = file_storage.read_parquet(saved_name_1)
+        corr_df_2 = file_storage.read_parquet(saved_name_2)
         validation.validate_correlation_dfs_compatible(corr_df_1, corr_df_2)
     except Exception as e:
         return ICON_ERROR, True
@@ -182,10 +177,8 @@ def on_visualization_stage_entry(
     saved_name_1 = f"{stored_uuid}_{SUFFIX_CORR_FILE1}.pq"
     saved_name_2 = f"{stored_uuid}_{SUFFIX_CORR_FILE2}.pq"
 
-    df_primary = pd.read_parquet(pa.BufferReader(file_storage.read_file(saved_name_1)))
-    df_secondary = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(saved_name_2))
-    )
+    df_primary = file_storage.read_parquet(saved_name_1)
+    df_secondary = file_storage.read_parquet(saved_name_2)
     df_merged = pd.merge(
         df_primary, df_secondary, on="EOS", how="inner", suffixes=["_0", "_1"]
     )
@@ -230,7 +223,7 @@ def on_threshold_change(
     :return: figures
     """
     saved_name = f"{stored_uuid}_correlation_df.pq"
-    df = pd.read_parquet(pa.BufferReader(file_storage.read_file(saved_name)))
+    df = file_storage.read_parquet(saved_name)
     feature = "% ACTIVATION" if "% ACTIVATION_0" in df.columns else "% INHIBITION"
 
     new_fig = concentration_plot(
@@ -260,7 +253,7 @@ def on_save_filtering_clicked(
     :return: None
     """
     saved_name = f"{stored_uuid}_correlation_df.pq"
-    df = pd.read_parquet(pa.BufferReader(file_storage.read_file(saved_name)))
+    df = file_storage.read_parquet(saved_name)
     feature = "% ACTIVATION" if "% ACTIVATION_0" in df.columns else "% INHIBITION"
 
     filename = f"correlation_threshold_{datetime.now().strftime('%Y-%m-%d')}.csv"
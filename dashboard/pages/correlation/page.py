@@ -4,7 +4,7 @@ from dashboard.pages.builders import ProcessPageBuilder
 from dashboard.pages.correlation.stages import STAGES
 
 from dashboard.pages.correlation.callbacks import register_callbacks
-from dashboard.storage.local import LocalFileStorage
+from dashboard.storage.caching import shared_storage
 
 
 NAME = "Correlation Analysis"
@@ -19,6 +19,6 @@ STAGE_NAMES = [
 pb.add_stages(STAGES, STAGE_NAMES)
 layout = pb.build()
 
-file_storage = LocalFileStorage()
+file_storage = shared_storage()
 
 register_callbacks(pb.elements, file_storage)
@@ -7,39 +7,26 @@ from typing import List, Tuple
 
 import pandas as pd
 import plotly.graph_objects as go
-import pyarrow as pa
 from dash import Input, Output, State, callback, dcc, html, no_update
-from sklearn.decomposition import PCA
-from umap import UMAP
 
-from dashboard.data.controls import controls_index_annotator, generate_controls
 from dashboard.data.preprocess import MergedAssaysPreprocessor
+from dashboard.data.projection_jobs import ProjectionJobs, ProjectionResult
+from dashboard.data.spatial_index import GridIndex
 from dashboard.data.utils import eos_to_ecbd_link
-from dashboard.pages.components import make_file_list_component
+from dashboard.pages.components import make_file_list_component, make_job_progress
 from dashboard.storage import FileStorage
-from dashboard.visualization.plots import make_projection_plot, plot_projection_2d
+from dashboard.visualization.plots import (
+    MAX_PLOT_POINTS,
+    make_projection_plot,
+    plot_projection_2d,
+    selected_rows,
+    viewport_ranges,
+)
 from dashboard.visualization.text_tables import pca_summary, table_from_df
 from dashboard.pages.components import make_new_upload_view
 
-PROJECTION_SETUP = [
-    (PCA(n_components=3), "PCA"),
-    (
-        UMAP(
-            n_components=2,
-            n_neighbors=10,
-            min_dist=0.1,
-        ),
-        "UMAP",
-    ),
-    (
-        UMAP(
-            n_components=3,
-            n_neighbors=10,
-            min_dist=0.1,
-        ),
-        "UMAP3D",
-    ),
-]
+# compounds sent to the projection table at once, the rest is only counted
+MAX_VIEWPORT_ROWS = 1000
 
 # === STAGE 1 ===
 
@@ -119,47 +106,68 @@ def on_projections_visualization_entry(
     current_stage: int,
     stored_uuid: str,
     file_storage: FileStorage,
-) -> Tuple[go.Figure, html.Div, html.Div, html.Div, html.Div, html.Div]:
+    projection_jobs: ProjectionJobs,
+) -> Tuple[html.Div, str, bool]:
     """
     Callback for projections visualization stage entry.
-    It loads the data from the storage, computes and visualizes the projections.
+    It loads the data from the storage and starts the projection job of the session.
 
     :param current_stage: index of the current stage
     :param stored_uuid: session uuid
     :param file_storage: file storage
-    :return: figure with projections, table with projections, dropdown with projection attributes,
-    dropdown with projection methods, projection info, checkbox for controls
+    :param projection_jobs: background projection jobs
+    :return: projection info with job status, job key, job polling interval
+        disabled status
     """
     if current_stage != 1:
         return no_update
 
     load_name = f"{stored_uuid}_assays_merged.pq"
-    merged_df = pd.read_parquet(pa.BufferReader(file_storage.read_file(load_name)))
+    merged_df = file_storage.read_parquet(load_name)
+    job_key = projection_jobs.submit(merged_df)
 
-    # take only columns with projections i.e. having % in the name
-    projection_columns = [col for col in merged_df.columns if "%" in col]
-    controls_df = generate_controls(projection_columns)
+    return html.Span("Calculating projections..."), job_key, False
 
-    assays_preprocessor = MergedAssaysPreprocessor()
-    assays_preprocessor.set_compounds_df(merged_df).set_controls_df(
-        controls_df
-    ).set_columns_for_projection(projection_columns)
 
-    for projector, name in PROJECTION_SETUP:
-        assays_preprocessor.apply_projection(projector, name)
+def on_projection_job_poll(
+    n_intervals: int,
+    job_key: str,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    projection_jobs: ProjectionJobs,
+) -> Tuple[go.Figure, html.Div, str, html.Div, html.Div, bool, bool]:
+    """
+    Callback for polling the projection job of the session. Once the job is done,
+    it saves and visualizes the projections.
 
-    projections_df = assays_preprocessor.get_processed_compounds_df()
+    :param n_intervals: number of polls
+    :param job_key: key of the projection job
+    :param stored_uuid: session uuid
+    :param file_storage: file storage
+    :param projection_jobs: background projection jobs
+    :return: figure with projections, table with the first page of projections, number of
+    compounds, dropdown with projection attributes, projection info, next stage button disabled
+    status, job polling interval disabled status
+    """
+    result = projection_jobs.result(job_key)
+    if result is None:
+        status = projection_jobs.status(job_key)
+        if status is None or status.finished:
+            error = (status and status.error) or "the job was lost"
+            message = html.Span(f"Projection failed: {error}", className="text-danger")
+            return no_update, no_update, no_update, no_update, message, no_update, True
+        progress = make_job_progress(status)
+        return no_update, no_update, no_update, no_update, progress, no_update, False
+
+    projections_df = result.projections_df
+    projection_columns = result.projection_columns
     file_storage.save_file(
         f"{stored_uuid}_assays_projection.pq",
         projections_df.reset_index(drop=True).to_parquet(),
     )
-
-    projection_controls_df = assays_preprocessor.annotate_controls(
-        controls_index_annotator
-    ).get_processed_controls_df()
     file_storage.save_file(
         f"{stored_uuid}_controls_projection.pq",
-        projection_controls_df.reset_index(drop=True).to_parquet(),
+        result.controls_df.reset_index(drop=True).to_parquet(),
     )
 
     dropdown_options = []
@@ -168,8 +176,10 @@ def on_projections_visualization_entry(
         dropdown_options.append(option)
 
     fig = plot_projection_2d(projections_df, projection_columns[0], "PCA")
-    projections_df = eos_to_ecbd_link(projections_df)
-    table = table_from_df(projections_df, "projection-table")
+    count, rows = result.spatial_indexes["PCA"].query(limit=MAX_VIEWPORT_ROWS)
+    table = table_from_df(
+        eos_to_ecbd_link(projections_df.iloc[rows]), "projection-table"
+    )
 
     attribute_options = html.Div(
         children=[
@@ -184,10 +194,17 @@ def on_projections_visualization_entry(
         ]
     )
 
-    pca = PROJECTION_SETUP[0][0]
-    projection_info = pca_summary(pca, projection_columns)
+    projection_info = pca_summary(result.pca, projection_columns)
 
-    return fig, table, attribute_options, projection_info, False
+    return (
+        fig,
+        table,
+        _viewport_count_text(count, len(rows)),
+        attribute_options,
+        projection_info,
+        False,
+        True,
+    )
 
 
 def on_checkbox_change(
@@ -209,12 +226,8 @@ def on_checkbox_change(
     :param file_storage: file storage
     :return: figure with projections
     """
-    compounds_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_assays_projection.pq"))
-    )
-    controls_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_controls_projection.pq"))
-    )
+    compounds_df = file_storage.read_parquet(f"{stored_uuid}_assays_projection.pq")
+    controls_df = file_storage.read_parquet(f"{stored_uuid}_controls_projection.pq")
 
     return make_projection_plot(
         compounds_df,
@@ -226,34 +239,131 @@ def on_checkbox_change(
     )
 
 
+def _session_projections(
+    job_key: str | None,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    projection_jobs: ProjectionJobs,
+) -> ProjectionResult | None:
+    """
+    Get projections of the session, from its job or, when the job results are gone
+    e.g. after they expired or the page was reloaded, from the storage without
+    spatial indexes
+
+    :param job_key: key of the projection job of the session
+    :param stored_uuid: session uuid
+    :param file_storage: file storage
+    :param projection_jobs: background projection jobs
+    :return: projections, None if there are none
+    """
+    result = projection_jobs.result(job_key) if job_key else None
+    if result is not None:
+        return result
+    try:
+        projections_df, controls_df = (
+            file_storage.read_parquet(f"{stored_uuid}_{name}.pq")
+            for name in ("assays_projection", "controls_projection")
+        )
+    except FileNotFoundError:
+        return None
+    projection_columns = [col for col in projections_df.columns if "%" in col]
+    return ProjectionResult(projections_df, controls_df, projection_columns, None)
+
+
 def on_plot_zommed_in(
     relayout_data: dict,
     stored_uuid: str,
     projection_type: str,
+    job_key: str | None,
+    file_storage: FileStorage,
+    projection_jobs: ProjectionJobs,
+) -> Tuple[list[dict], str]:
+    """
+    Callback for zooming in or panning the projection plot. It queries the spatial
+    index of the projection and shows the first page of compounds in view.
+
+    :param relayout_data: relayout data of the plot
+    :param stored_uuid: session uuid
+    :param projection_type: projection method
+    :param job_key: key of the projection job of the session
+    :param file_storage: file storage
+    :param projection_jobs: background projection jobs, holding the spatial indexes
+    :return: table rows of compounds in view, number of compounds in view
+    """
+    ranges = viewport_ranges(relayout_data)
+    if ranges is None:
+        return no_update, no_update
+
+    result = _session_projections(job_key, stored_uuid, file_storage, projection_jobs)
+    if result is None:
+        return no_update, no_update
+    df = result.projections_df
+    index = result.spatial_indexes.get(projection_type)
+    if index is None:
+        index = GridIndex(df[f"{projection_type}_X"], df[f"{projection_type}_Y"])
+
+    count, rows = index.query(*ranges, limit=MAX_VIEWPORT_ROWS)
+    page = eos_to_ecbd_link(df.iloc[rows]).to_dict("records")
+    return page, _viewport_count_text(count, len(rows))
+
+
+def on_projection_plot_relayout(
+    relayout_data: dict,
+    projection_type: str,
+    attribute: str,
+    controls: List[str],
+    plot_3d: List[str],
+    stored_uuid: str,
+    job_key: str | None,
     file_storage: FileStorage,
-) -> None:
-    if not relayout_data:
+    projection_jobs: ProjectionJobs,
+) -> go.Figure:
+    """
+    Callback for zooming in or panning the projection plot. Plots with more points
+    than are drawn are binned, so they are redrawn for the viewport, showing points
+    once few enough are in view.
+
+    :param relayout_data: relayout data of the plot
+    :param projection_type: projection method
+    :param attribute: projection attribute
+    :param controls: controls checkbox
+    :param plot_3d: 3d checkbox
+    :param stored_uuid: session uuid
+    :param job_key: key of the projection job of the session
+    :param file_storage: file storage
+    :param projection_jobs: background projection jobs
+    :return: figure with projections in view
+    """
+    ranges = viewport_ranges(relayout_data)
+    if ranges is None or plot_3d:
         return no_update
 
-    try:
-        df = pd.read_parquet(
-            pa.BufferReader(
-                file_storage.read_file(f"{stored_uuid}_assays_projection.pq")
-            ),
-        )
-    except FileNotFoundError:
+    result = _session_projections(job_key, stored_uuid, file_storage, projection_jobs)
+    if result is None or len(result.projections_df) <= MAX_PLOT_POINTS:
         return no_update
 
-    if "xaxis.range[0]" in relayout_data:
-        x_min = relayout_data["xaxis.range[0]"]
-        x_max = relayout_data["xaxis.range[1]"]
-        df = df[df[f"{projection_type}_X"].between(x_min, x_max)]
-    if "yaxis.range[0]" in relayout_data:
-        y_min = relayout_data["yaxis.range[0]"]
-        y_max = relayout_data["yaxis.range[1]"]
-        df = df[df[f"{projection_type}_Y"].between(y_min, y_max)]
+    return make_projection_plot(
+        result.projections_df,
+        result.controls_df,
+        attribute,
+        projection_type,
+        bool(controls),
+        x_range=ranges[0],
+        y_range=ranges[1],
+    )
+
+
+def _viewport_count_text(count: int, shown: int) -> str:
+    """
+    Describe the number of compounds in view of the projection plot
 
-    return eos_to_ecbd_link(df).to_dict("records")
+    :param count: number of compounds in view
+    :param shown: number of compounds shown in the table
+    :return: text above the projection table
+    """
+    if shown < count:
+        return f"{count:,} compounds in view, showing first {shown:,}"
+    return f"{count:,} compounds in view"
 
 
 def on_projection_download_selection_button_click(
@@ -273,11 +383,9 @@ def on_projection_download_selection_button_click(
     if not selection:
         return no_update
 
-    datapoints = [point["pointIndex"] for point in selection["points"]]
+    datapoints = selected_rows(selection)
 
-    df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_assays_projection.pq")),
-    )
+    df = file_storage.read_parquet(f"{stored_uuid}_assays_projection.pq")
     selected_subset_df = df.iloc[datapoints]
     filename = f"projection_data_{datetime.now().strftime('%Y-%m-%d')}-selection-{selected_subset_df.shape[0]}.csv"
     return dcc.send_data_frame(selected_subset_df.to_csv, filename)
@@ -319,14 +427,16 @@ def on_save_projections_click(
 
     filename = f"projection_data_{datetime.now().strftime('%Y-%m-%d')}.csv"
 
-    projections_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_assays_projection.pq")),
-    )
+    projections_df = file_storage.read_parquet(f"{stored_uuid}_assays_projection.pq")
 
     return dcc.send_data_frame(projections_df.to_csv, filename)
 
 
-def register_callbacks(elements, file_storage: FileStorage):
+def register_callbacks(
+    elements,
+    file_storage: FileStorage,
+    projection_jobs: ProjectionJobs,
+):
     callback(
         Output("projections-file-message", "children"),
         Output("upload-projection-data", "children"),
@@ -339,16 +449,39 @@ def register_callbacks(elements, file_storage: FileStorage):
         State("user-uuid", "data"),
         prevent_initial_call=True,
     )(functools.partial(on_projection_files_upload, file_storage=file_storage))
+    callback(
+        Output("pca-info", "children", allow_duplicate=True),
+        Output("projection-job-key", "data"),
+        Output("projection-job-interval", "disabled", allow_duplicate=True),
+        Input(elements["STAGES_STORE"], "data"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_projections_visualization_entry,
+            file_storage=file_storage,
+            projection_jobs=projection_jobs,
+        )
+    )
     callback(
         Output("projection-plot", "figure", allow_duplicate=True),
         Output("projection-table", "children"),
+        Output("projection-table-count", "children", allow_duplicate=True),
         Output("projection-attribute-selection-box", "children"),
-        Output("pca-info", "children"),
+        Output("pca-info", "children", allow_duplicate=True),
         Output({"type": elements["BLOCKER"], "index": 1}, "data"),
-        Input(elements["STAGES_STORE"], "data"),
+        Output("projection-job-interval", "disabled", allow_duplicate=True),
+        Input("projection-job-interval", "n_intervals"),
+        State("projection-job-key", "data"),
         State("user-uuid", "data"),
         prevent_initial_call=True,
-    )(functools.partial(on_projections_visualization_entry, file_storage=file_storage))
+    )(
+        functools.partial(
+            on_projection_job_poll,
+            file_storage=file_storage,
+            projection_jobs=projection_jobs,
+        )
+    )
     callback(
         Output("projection-plot", "figure", allow_duplicate=True),
         Input("projection-method-selection-box", "value"),
@@ -383,10 +516,35 @@ def register_callbacks(elements, file_storage: FileStorage):
         State("user-uuid", "data"),
         prevent_initial_call=True,
     )(functools.partial(on_save_projections_click, file_storage=file_storage))
+    callback(
+        Output("projection-plot", "figure", allow_duplicate=True),
+        Input("projection-plot", "relayoutData"),
+        State("projection-method-selection-box", "value"),
+        State("projection-attribute-selection-box", "value"),
+        State("control-checkbox", "value"),
+        State("3d-checkbox", "value"),
+        State("user-uuid", "data"),
+        State("projection-job-key", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_projection_plot_relayout,
+            file_storage=file_storage,
+            projection_jobs=projection_jobs,
+        )
+    )
     callback(
         Output("projection-table", "data"),
+        Output("projection-table-count", "children"),
         Input("projection-plot", "relayoutData"),
         State("user-uuid", "data"),
         State("projection-method-selection-box", "value"),
+        State("projection-job-key", "data"),
         prevent_initial_call=True,
-    )(functools.partial(on_plot_zommed_in, file_storage=file_storage))
+    )(
+        functools.partial(
+            on_plot_zommed_in,
+            file_storage=file_storage,
+            projection_jobs=projection_jobs,
+        )
+    )
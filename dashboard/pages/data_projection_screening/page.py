@@ -1,8 +1,11 @@
 from dash import register_page, html, dcc
 
+from dashboard.data.jobs import shared_runner
+from dashboard.data.projection_jobs import ProjectionJobs
 from dashboard.pages.builders import ProcessPageBuilder
 from dashboard.pages.data_projection_screening.stages import STAGES
 from dashboard.pages.data_projection_screening.callbacks import register_callbacks
+from dashboard.storage.caching import shared_storage
 from dashboard.storage.local import LocalFileStorage
 
 
@@ -20,6 +23,7 @@ pb.add_stages(STAGES, STAGE_NAMES)
 
 layout = pb.build()
 
-file_storage = LocalFileStorage()
+file_storage = shared_storage()
+projection_jobs = ProjectionJobs(shared_runner(LocalFileStorage.data_folder))
 
-register_callbacks(pb.elements, file_storage)
+register_callbacks(pb.elements, file_storage, projection_jobs)
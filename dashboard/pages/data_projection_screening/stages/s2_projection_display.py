@@ -15,6 +15,8 @@ box or lasso selection to a csv file containing projection values and compound d
 
 PROJECTION_DISPLAY_STAGE = html.Div(
     [
+        dcc.Store(id="projection-job-key"),
+        dcc.Interval(id="projection-job-interval", interval=500, disabled=True),
         html.Div(
             className="row",
             children=[
@@ -81,6 +83,7 @@ PROJECTION_DISPLAY_STAGE = html.Div(
             children=[
                 html.Div(
                     children=[
+                        html.Div(id="projection-table-count", className="mb-2"),
                         dcc.Loading(
                             children=[html.Div(id="projection-table", children=[])],
                             type="circle",
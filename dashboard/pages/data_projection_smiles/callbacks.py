@@ -1,24 +1,90 @@
 import base64
 import functools
 import io
+import os
 import uuid
 from datetime import datetime
 from typing import List, Tuple
 
 import pandas as pd
 import plotly.graph_objects as go
-import pyarrow as pa
 from dash import Input, Output, State, callback, dcc, html, no_update
 
-from dashboard.data.structural_similarity import prepare_cluster_viz
-from dashboard.data.utils import eos_to_ecbd_link
-from dashboard.pages.components import make_file_list_component
+from dashboard.data.fingerprint_store import FingerprintStore
+from dashboard.data.jobs import DONE, FAILED, JobRunner, JobStatus
+from dashboard.data.reference_embedding import ReferenceEmbeddingStore
+from dashboard.data.scaffolds import (
+    ScaffoldCache,
+    compute_scaffolds,
+    scaffold_hit_statistics,
+)
+from dashboard.data.similarity_search import MaxMinPicker
+from dashboard.data.structural_similarity import (
+    butina_cluster_names,
+    cluster_smiles_job,
+    compute_ecfp_descriptors,
+    find_activity_cliffs,
+    find_nearest_neighbors,
+)
+from dashboard.data.substructure_search import SubstructureSearch
+from dashboard.data.utils import eos_to_ecbd_link, get_chemical_columns
+from dashboard.pages.components import make_file_list_component, make_job_progress
 from dashboard.storage import FileStorage
-from dashboard.visualization.plots import plot_clustered_smiles
+from dashboard.visualization.plots import (
+    MAX_PLOT_POINTS,
+    plot_clustered_smiles,
+    selected_rows,
+    viewport_ranges,
+)
 
 from dashboard.visualization.text_tables import table_from_df
 from dashboard.pages.components import make_new_upload_view
 
+# activity columns of the hit validation output besides the chemical results
+ACTIVITY_COLUMNS = ["activity_final", "ic50", "modulation_ic50", "max_value"]
+MAX_CLIFF_ROWS = 1000
+LIBRARY_PATH = "dashboard/assets/ml/predictions.pq"
+
+
+@functools.lru_cache(maxsize=1)
+def _library_substructure_search(
+    path: str, modified: int
+) -> Tuple[pd.DataFrame, SubstructureSearch]:
+    # keyed by modification time, so that a replaced library is indexed again
+    library_df = pd.read_parquet(path)
+    return library_df, SubstructureSearch(library_df["smiles"])
+
+
+def _read_smiles_merged(
+    stored_uuid: str,
+    file_storage: FileStorage,
+    clustering: str | None = None,
+    fingerprint_store: FingerprintStore | None = None,
+) -> pd.DataFrame:
+    """
+    Read the compounds of the session. Butina clusters are calculated the first
+    time the clustering is shown and saved with the compounds, a new upload
+    replaces them together.
+
+    :param stored_uuid: session uuid
+    :param file_storage: file storage
+    :param clustering: name of the shown clustering
+    :param fingerprint_store: persistent fingerprint store shared across sessions
+    :return: df with the compounds
+    """
+    name = f"{stored_uuid}_smiles_merged.pq"
+    version = file_storage.file_version(name)
+    df = file_storage.read_parquet(name)
+    if clustering != "Butina" or "cluster_Butina" in df:
+        return df
+
+    df["cluster_Butina"] = butina_cluster_names(df["smiles"], store=fingerprint_store)
+    with file_storage.session_lock(stored_uuid):
+        # compounds uploaded in the meantime are not overwritten
+        if file_storage.file_version(name) == version:
+            file_storage.save_file(name, df.to_parquet())
+    return df
+
 
 def on_3d_checkbox_change(plot_3d: List[str]) -> bool:
     """
@@ -67,9 +133,13 @@ def on_smiles_files_upload(
     smiles_filename: str,
     stored_uuid: str | None,
     file_storage: FileStorage,
+    job_runner: JobRunner,
+    fingerprint_store: FingerprintStore | None = None,
+    embedding_store: ReferenceEmbeddingStore | None = None,
 ) -> Tuple[html.Div, str]:
     """
-    Callback for file upload.
+    Callback for file upload. It starts the job merging, projecting and
+    clustering the compounds.
 
     :param content: base64 encoded file content
     :param filename: file name
@@ -77,8 +147,13 @@ def on_smiles_files_upload(
     :param smiles_content: base64 encoded smiles content
     :param stored_uuid: session uuid
     :param file_storage: file storage
-    :return: list of loaded and not loaded files
+    :param job_runner: background job runner
+    :param fingerprint_store: persistent fingerprint store shared across sessions
+    :param embedding_store: store of the embedding fitted on the reference library,
+        if not given projections are fitted on the uploaded compounds
+    :return: job progress
     :return: next stage button disabled status
+    :return: job key, job polling interval disabled status
     """
     if not stored_uuid:
         stored_uuid = str(uuid.uuid4())
@@ -88,18 +163,68 @@ def on_smiles_files_upload(
     if not file_storage.file_exists(activity_path) or not smiles_content:
         return no_update
 
-    activity_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(activity_path))
-    )
+    activity_df = file_storage.read_parquet(activity_path)
 
     smiles_decoded = base64.b64decode(smiles_content.split(",")[1]).decode("utf-8")
     smiles_new = pd.read_csv(io.StringIO(smiles_decoded), dtype="str")
-    smiles_active = pd.read_parquet("dashboard/assets/ml/predictions.pq")
 
-    df_merged = prepare_cluster_viz(activity_df, smiles_active, smiles_new)
+    job_key = job_runner.submit(
+        cluster_smiles_job,
+        activity_df,
+        LIBRARY_PATH,
+        smiles_new,
+        store=fingerprint_store,
+        embedding_store=embedding_store,
+        library_version=os.stat(LIBRARY_PATH).st_mtime_ns,
+    )
+
+    return (
+        make_job_progress(JobStatus()),
+        make_new_upload_view("File uploaded", "new SMILES file (.csv)"),
+        True,  # next stage button disabled status
+        stored_uuid,
+        None,  # dummy smiles upload return
+        job_key,
+        False,
+    )
+
+
+def on_smiles_job_poll(
+    n_intervals: int,
+    job_key: str,
+    filename: str,
+    smiles_filename: str,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    job_runner: JobRunner,
+) -> Tuple[html.Div, bool, bool]:
+    """
+    Callback for polling the clustering job. Once it is done, it saves the
+    merged compounds.
 
+    :param n_intervals: number of polls
+    :param job_key: key of the clustering job
+    :param filename: activity file name
+    :param smiles_filename: smiles file name
+    :param stored_uuid: session uuid
+    :param file_storage: file storage
+    :param job_runner: background job runner
+    :return: list of loaded files or job progress
+    :return: next stage button disabled status
+    :return: job polling interval disabled status
+    """
+    status = job_runner.status(job_key)
+    if status is None or status.state == FAILED:
+        error = status.error if status is not None else "the job was lost"
+        message = html.Span(f"Clustering failed: {error}", className="text-danger")
+        return message, True, True
+    if status.state != DONE:
+        return make_job_progress(status), no_update, False
+
+    df_merged = job_runner.result(job_key)
     saved_name = f"{stored_uuid}_smiles_merged.pq"
-    file_storage.save_file(saved_name, df_merged.reset_index().to_parquet())
+    with file_storage.session_lock(stored_uuid):
+        file_storage.save_file(saved_name, df_merged.reset_index().to_parquet())
 
     return (
         html.Div(
@@ -107,10 +232,8 @@ def on_smiles_files_upload(
                 make_file_list_component([filename, smiles_filename], [], 1),
             ],
         ),
-        make_new_upload_view("File uploaded", "new SMILES file (.csv)"),
         False,  # next stage button disabled status
-        stored_uuid,
-        None,  # dummy smiles upload return
+        True,
     )
 
 
@@ -121,7 +244,7 @@ def on_plot_smiles(
     current_stage: int,
     stored_uuid: str,
     file_storage: FileStorage,
-) -> Tuple[go.Figure, html.Div, html.Div, html.Div, html.Div, html.Div]:
+) -> Tuple[go.Figure, html.Div, List[str]]:
     """
     Callback for projections visualization stage entry.
     It loads the data from the storage, computes and visualizes the projections.
@@ -129,44 +252,102 @@ def on_plot_smiles(
     :param current_stage: index of the current stage
     :param stored_uuid: session uuid
     :param file_storage: file storage
-    :return: figure with projections, table with projections, dropdown with projection methods
+    :return: figure with projections, table with projections, activity columns
+        for the activity cliffs
     """
     if current_stage != 1:
         return no_update
 
-    df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_smiles_merged.pq")),
-    )
+    df = file_storage.read_parquet(f"{stored_uuid}_smiles_merged.pq")
 
     fig = plot_clustered_smiles(df)
+    cluster_columns = [
+        "cluster_PCA",
+        "cluster_UMAP",
+        "cluster_UMAP3D",
+        "cluster_Butina",
+    ]
     projections_df = eos_to_ecbd_link(df)[
-        ["EOS", "activity_final", "cluster_PCA", "cluster_UMAP", "cluster_UMAP3D"]
+        ["EOS", "activity_final"] + [col for col in cluster_columns if col in df]
     ]
     table = table_from_df(projections_df, "projection-table")
+    activity_columns = [
+        column
+        for column in ACTIVITY_COLUMNS + get_chemical_columns(df.columns.tolist())
+        if column in df
+    ]
 
-    return fig, table
+    return fig, table, activity_columns
 
 
 def on_smiles_dropdown_checkbox_change(
     projection_type: str,
+    clustering_type: str,
     plot_3d_checkbox: List[str],
     stored_uuid: str,
     file_storage: FileStorage,
+    fingerprint_store: FingerprintStore | None = None,
 ) -> go.Figure:
     """
     Callback for dropdown change. It loads the data from the storage and visualizes the projections.
 
     :param projection_type: projection method
+    :param clustering_type: "projection" for clusters of the projection or name of clustering
     :param plot_3d_checkbox: 3d checkbox selection
     :param stored_uuid: session uuid
     :param file_storage: file storage
+    :param fingerprint_store: persistent fingerprint store shared across sessions
     :return: figure with projections"""
 
-    df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_smiles_merged.pq")),
+    df = _read_smiles_merged(
+        stored_uuid, file_storage, clustering_type, fingerprint_store
+    )
+    return plot_clustered_smiles(
+        df,
+        projection=projection_type,
+        plot_3d=bool(plot_3d_checkbox),
+        clustering=None if clustering_type == "projection" else clustering_type,
+    )
+
+
+def on_smiles_plot_relayout(
+    relayout_data: dict,
+    projection_type: str,
+    clustering_type: str,
+    plot_3d_checkbox: List[str],
+    stored_uuid: str,
+    file_storage: FileStorage,
+    fingerprint_store: FingerprintStore | None = None,
+) -> go.Figure:
+    """
+    Callback for zooming in or panning the SMILES projection plot. Plots with more
+    points than are drawn are binned, so they are redrawn for the viewport, showing
+    points once few enough are in view.
+
+    :param relayout_data: relayout data of the plot
+    :param projection_type: projection method
+    :param clustering_type: "projection" for clusters of the projection or name of clustering
+    :param plot_3d_checkbox: 3d checkbox selection
+    :param stored_uuid: session uuid
+    :param file_storage: file storage
+    :param fingerprint_store: persistent fingerprint store shared across sessions
+    :return: figure with projections in view
+    """
+    ranges = viewport_ranges(relayout_data)
+    if ranges is None or plot_3d_checkbox:
+        return no_update
+
+    df = _read_smiles_merged(
+        stored_uuid, file_storage, clustering_type, fingerprint_store
     )
+    if len(df) <= MAX_PLOT_POINTS:
+        return no_update
     return plot_clustered_smiles(
-        df, projection=projection_type, plot_3d=bool(plot_3d_checkbox)
+        df,
+        projection=projection_type,
+        clustering=None if clustering_type == "projection" else clustering_type,
+        x_range=ranges[0],
+        y_range=ranges[1],
     )
 
 
@@ -187,17 +368,216 @@ def on_smiles_download_selection_button_click(
     if not selection:
         return no_update
 
-    datapoints = [point["pointIndex"] for point in selection["points"]]
+    datapoints = selected_rows(selection)
 
-    df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_smiles_merged.pq")),
-    )
+    df = file_storage.read_parquet(f"{stored_uuid}_smiles_merged.pq")
     selected_subset_df = df.iloc[datapoints]
     filename = f"smiles_data_{datetime.now().strftime('%Y-%m-%d')}-selection-{selected_subset_df.shape[0]}.csv"
     return dcc.send_data_frame(selected_subset_df.to_csv, filename)
 
 
-def register_callbacks(elements, file_storage: FileStorage):
+def on_find_neighbors_button_click(
+    n_clicks: int,
+    library: str,
+    k: int | None,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    fingerprint_store: FingerprintStore | None = None,
+) -> html.Div:
+    """
+    Callback for the find neighbors button click. Finds the most similar compounds
+    of the chosen library for every newly uploaded compound.
+
+    :param n_clicks: number of clicks
+    :param library: "library" for the reference library, "session" for the tested
+        compounds of the session
+    :param k: number of neighbors per compound
+    :param stored_uuid: session uuid
+    :param file_storage: storage object
+    :param fingerprint_store: persistent fingerprint store shared across sessions
+    :return: table with the neighbors
+    """
+    if not n_clicks or not stored_uuid:
+        return no_update
+
+    df = file_storage.read_parquet(f"{stored_uuid}_smiles_merged.pq")
+    is_new = df["activity_final"] == "not tested"
+    if library == "session":
+        library_df = df.loc[~is_new, ["EOS", "smiles", "activity_final"]]
+    else:
+        library_df = pd.read_parquet(LIBRARY_PATH)
+
+    neighbors_df = find_nearest_neighbors(
+        df.loc[is_new, ["EOS", "smiles"]],
+        library_df,
+        k=int(k or 5),
+        store=fingerprint_store,
+        n_jobs=os.cpu_count() or 1,
+    )
+    return table_from_df(eos_to_ecbd_link(neighbors_df), "neighbors-table")
+
+
+def on_diverse_picks_button_click(
+    n_clicks: int,
+    n_picks: int,
+    selection: dict,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    fingerprint_store: FingerprintStore | None = None,
+) -> dict:
+    """
+    Callback for the diverse picks button click. Picks a diverse subset of the
+    active compounds with MaxMin, lasso/box selected datapoints are treated as
+    already picked. Downloads the picks to a csv file.
+
+    :param n_clicks: number of clicks
+    :param n_picks: number of compounds to pick
+    :param selection: selected datapoints of the plot
+    :param stored_uuid: session uuid
+    :param file_storage: storage object
+    :param fingerprint_store: persistent fingerprint store shared across sessions
+    :return: csv file with the picks
+    """
+    if not n_clicks or not stored_uuid:
+        return no_update
+
+    df = file_storage.read_parquet(f"{stored_uuid}_smiles_merged.pq")
+    is_seed = pd.Series(False, index=df.index)
+    if selection:
+        is_seed.iloc[selected_rows(selection)] = True
+    candidates_df = df[(df["activity_final"] == "active") & ~is_seed]
+    candidates, keep_idx = compute_ecfp_descriptors(
+        candidates_df["smiles"], store=fingerprint_store
+    )
+    seeds, _ = compute_ecfp_descriptors(
+        df.loc[is_seed, "smiles"], store=fingerprint_store
+    )
+
+    picks = MaxMinPicker(candidates, seeds=seeds, random_state=0).pick(
+        int(n_picks or 96)
+    )
+    picked_df = candidates_df.iloc[keep_idx].iloc[picks]
+    picked_df.insert(0, "pick_order", range(1, len(picked_df) + 1))
+    filename = f"smiles_diverse_picks_{datetime.now().strftime('%Y-%m-%d')}-{picked_df.shape[0]}.csv"
+    return dcc.send_data_frame(picked_df.to_csv, filename)
+
+
+def on_find_cliffs_button_click(
+    n_clicks: int,
+    activity_column: str,
+    threshold: float,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    fingerprint_store: FingerprintStore | None = None,
+) -> html.Div:
+    """
+    Callback for the find cliffs button click. Finds pairs of similar compounds
+    with different activity among the tested compounds of the session.
+
+    :param n_clicks: number of clicks
+    :param activity_column: column with the activity
+    :param threshold: minimal Tanimoto similarity of a pair
+    :param stored_uuid: session uuid
+    :param file_storage: storage object
+    :param fingerprint_store: persistent fingerprint store shared across sessions
+    :return: table with the highest scored pairs
+    """
+    if not n_clicks or not stored_uuid:
+        return no_update
+
+    df = file_storage.read_parquet(f"{stored_uuid}_smiles_merged.pq")
+    df = df[df["activity_final"] != "not tested"]
+    packed, keep_idx = compute_ecfp_descriptors(df["smiles"], store=fingerprint_store)
+    cliffs_df = find_activity_cliffs(
+        df.iloc[keep_idx],
+        packed,
+        activity_column=activity_column or "activity_final",
+        threshold=float(threshold or 0.8),
+        n_jobs=os.cpu_count() or 1,
+    )
+    cliffs_df = cliffs_df.head(MAX_CLIFF_ROWS).rename(columns={"EOS_1": "EOS"})
+    return table_from_df(eos_to_ecbd_link(cliffs_df), "cliffs-table")
+
+
+def on_substructure_search_button_click(
+    n_clicks: int,
+    query: str,
+    library: str,
+    stored_uuid: str,
+    file_storage: FileStorage,
+) -> html.Div:
+    """
+    Callback for the substructure search button click. Finds compounds containing
+    the queried substructure.
+
+    :param n_clicks: number of clicks
+    :param query: SMARTS or SMILES of the substructure
+    :param library: "library" for the reference library, "session" for all
+        compounds of the session
+    :param stored_uuid: session uuid
+    :param file_storage: storage object
+    :return: table with the matching compounds
+    """
+    if not n_clicks or not stored_uuid or not query:
+        return no_update
+
+    if library == "session":
+        library_df = file_storage.read_table(
+            f"{stored_uuid}_smiles_merged.pq",
+            columns=["EOS", "smiles", "activity_final"],
+        )
+        search = SubstructureSearch(library_df["smiles"])
+    else:
+        library_df, search = _library_substructure_search(
+            LIBRARY_PATH, os.stat(LIBRARY_PATH).st_mtime_ns
+        )
+
+    try:
+        matches = search.search(query)
+    except ValueError as error:
+        return html.Div(str(error), className="text-danger")
+    matches_df = library_df.iloc[matches].reset_index(drop=True)
+    return table_from_df(eos_to_ecbd_link(matches_df), "substructure-table")
+
+
+def on_scaffolds_button_click(
+    n_clicks: int,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    scaffold_cache: ScaffoldCache | None = None,
+) -> html.Div:
+    """
+    Callback for the group by scaffold button click. Groups compounds of the
+    session by Bemis-Murcko scaffold with hit statistics per scaffold.
+
+    :param n_clicks: number of clicks
+    :param stored_uuid: session uuid
+    :param file_storage: storage object
+    :param scaffold_cache: scaffold cache shared across sessions
+    :return: table with the scaffolds
+    """
+    if not n_clicks or not stored_uuid:
+        return no_update
+
+    df = file_storage.read_parquet(f"{stored_uuid}_smiles_merged.pq")
+    scaffolds = compute_scaffolds(df["smiles"], cache=scaffold_cache)
+    activity_columns = [
+        column
+        for column in ACTIVITY_COLUMNS[1:] + get_chemical_columns(df.columns.tolist())
+        if column in df
+    ]
+    stats_df = scaffold_hit_statistics(df, scaffolds, activity_columns)
+    return table_from_df(stats_df, "scaffolds-table")
+
+
+def register_callbacks(
+    elements,
+    file_storage: FileStorage,
+    job_runner: JobRunner,
+    fingerprint_store: FingerprintStore | None = None,
+    embedding_store: ReferenceEmbeddingStore | None = None,
+    scaffold_cache: ScaffoldCache | None = None,
+):
     callback(
         Output("upload-activity-data", "children"),
         Output("user-uuid", "data", allow_duplicate=True),
@@ -212,16 +592,42 @@ def register_callbacks(elements, file_storage: FileStorage):
         Output({"type": elements["BLOCKER"], "index": 0}, "data"),
         Output("user-uuid", "data", allow_duplicate=True),
         Output("dummy-upload-smiles-data", "children"),
+        Output("smiles-job-key", "data"),
+        Output("smiles-job-interval", "disabled"),
         Input("dummy-upload-activity-data", "children"),
         Input("upload-activity-data", "filename"),
         Input("upload-smiles-data", "contents"),
         Input("upload-smiles-data", "filename"),
         State("user-uuid", "data"),
         prevent_initial_call=True,
-    )(functools.partial(on_smiles_files_upload, file_storage=file_storage))
+    )(
+        functools.partial(
+            on_smiles_files_upload,
+            file_storage=file_storage,
+            job_runner=job_runner,
+            fingerprint_store=fingerprint_store,
+            embedding_store=embedding_store,
+        )
+    )
+    callback(
+        Output("smiles-file-message", "children", allow_duplicate=True),
+        Output({"type": elements["BLOCKER"], "index": 0}, "data", allow_duplicate=True),
+        Output("smiles-job-interval", "disabled", allow_duplicate=True),
+        Input("smiles-job-interval", "n_intervals"),
+        State("smiles-job-key", "data"),
+        State("upload-activity-data", "filename"),
+        State("upload-smiles-data", "filename"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_smiles_job_poll, file_storage=file_storage, job_runner=job_runner
+        )
+    )
     callback(
         Output("smiles-projection-plot", "figure", allow_duplicate=True),
         Output("smiles-projection-table", "children"),
+        Output("smiles-cliffs-activity-selection-box", "options"),
         Input(elements["STAGES_STORE"], "data"),
         State("user-uuid", "data"),
         prevent_initial_call=True,
@@ -229,10 +635,32 @@ def register_callbacks(elements, file_storage: FileStorage):
     callback(
         Output("smiles-projection-plot", "figure", allow_duplicate=True),
         Input("smiles-projection-method-selection-box", "value"),
+        Input("smiles-clustering-method-selection-box", "value"),
         Input("3d-checkbox-smiles", "value"),
         State("user-uuid", "data"),
         prevent_initial_call=True,
-    )(functools.partial(on_smiles_dropdown_checkbox_change, file_storage=file_storage))
+    )(
+        functools.partial(
+            on_smiles_dropdown_checkbox_change,
+            file_storage=file_storage,
+            fingerprint_store=fingerprint_store,
+        )
+    )
+    callback(
+        Output("smiles-projection-plot", "figure", allow_duplicate=True),
+        Input("smiles-projection-plot", "relayoutData"),
+        State("smiles-projection-method-selection-box", "value"),
+        State("smiles-clustering-method-selection-box", "value"),
+        State("3d-checkbox-smiles", "value"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_smiles_plot_relayout,
+            file_storage=file_storage,
+            fingerprint_store=fingerprint_store,
+        )
+    )
     callback(
         Output("smiles-download-selection-csv", "data"),
         Input("smiles-download-selection-button", "n_clicks"),
@@ -244,6 +672,68 @@ def register_callbacks(elements, file_storage: FileStorage):
             on_smiles_download_selection_button_click, file_storage=file_storage
         )
     )
+    callback(
+        Output("smiles-neighbors-table", "children"),
+        Input("smiles-neighbors-button", "n_clicks"),
+        State("smiles-neighbors-library-selection-box", "value"),
+        State("smiles-neighbors-k-input", "value"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_find_neighbors_button_click,
+            file_storage=file_storage,
+            fingerprint_store=fingerprint_store,
+        )
+    )
+    callback(
+        Output("smiles-diverse-picks-csv", "data"),
+        Input("smiles-diverse-picks-button", "n_clicks"),
+        State("smiles-diverse-picks-input", "value"),
+        State("smiles-projection-plot", "selectedData"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_diverse_picks_button_click,
+            file_storage=file_storage,
+            fingerprint_store=fingerprint_store,
+        )
+    )
+    callback(
+        Output("smiles-cliffs-table", "children"),
+        Input("smiles-cliffs-button", "n_clicks"),
+        State("smiles-cliffs-activity-selection-box", "value"),
+        State("smiles-cliffs-threshold-input", "value"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_find_cliffs_button_click,
+            file_storage=file_storage,
+            fingerprint_store=fingerprint_store,
+        )
+    )
+    callback(
+        Output("smiles-substructure-table", "children"),
+        Input("smiles-substructure-button", "n_clicks"),
+        State("smiles-substructure-input", "value"),
+        State("smiles-substructure-library-selection-box", "value"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(functools.partial(on_substructure_search_button_click, file_storage=file_storage))
+    callback(
+        Output("smiles-scaffolds-table", "children"),
+        Input("smiles-scaffolds-button", "n_clicks"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_scaffolds_button_click,
+            file_storage=file_storage,
+            scaffold_cache=scaffold_cache,
+        )
+    )
     callback(
         Output("smiles-download-selection-button", "disabled"),
         Input("3d-checkbox-smiles", "value"),
@@ -1,8 +1,13 @@
 from dash import register_page, html, dcc
 
+from dashboard.data.fingerprint_store import FingerprintStore
+from dashboard.data.jobs import shared_runner
+from dashboard.data.reference_embedding import ReferenceEmbeddingStore
+from dashboard.data.scaffolds import ScaffoldCache
 from dashboard.pages.builders import ProcessPageBuilder
 from dashboard.pages.data_projection_smiles.stages import STAGES
 from dashboard.pages.data_projection_smiles.callbacks import register_callbacks
+from dashboard.storage.caching import shared_storage
 from dashboard.storage.local import LocalFileStorage
 
 
@@ -19,6 +24,19 @@ pb.add_stages(STAGES, STAGE_NAMES)
 
 layout = pb.build()
 
-file_storage = LocalFileStorage()
-
-register_callbacks(pb.elements, file_storage)
+file_storage = shared_storage()
+fingerprint_store = FingerprintStore(LocalFileStorage.data_folder / "fingerprints")
+embedding_store = ReferenceEmbeddingStore(
+    LocalFileStorage.data_folder / "embeddings", "dashboard/assets/ml/predictions.pq"
+)
+scaffold_cache = ScaffoldCache()
+job_runner = shared_runner(LocalFileStorage.data_folder)
+
+register_callbacks(
+    pb.elements,
+    file_storage,
+    job_runner,
+    fingerprint_store,
+    embedding_store,
+    scaffold_cache,
+)
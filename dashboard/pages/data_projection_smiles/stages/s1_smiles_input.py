@@ -80,6 +80,8 @@ SMILES_INPUT_STAGE = html.Div(
     className="container",
     children=[
         FILE_INPUT_CONTAINER,
+        dcc.Store(id="smiles-job-key"),
+        dcc.Interval(id="smiles-job-interval", interval=500, disabled=True),
         html.Div(
             id="smiles-file-message",
         ),
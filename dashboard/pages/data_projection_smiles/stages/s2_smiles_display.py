@@ -11,6 +11,9 @@ Fingerprints were calculated using RDKit method """,
             href="https://www.herongyang.com/Cheminformatics/Fingerprint-RDKit-Morgan-GetMorganFingerprintAsBitVect.html",
             target="_blank",
         ),
+        """. Projection clusters are found by HDBSCAN in the projected space, Butina
+clusters directly on the fingerprints, grouping compounds with Tanimoto similarity
+of at least 0.6 to the cluster centroid.""",
     ]
 )
 
@@ -20,6 +23,39 @@ Download the data of the compounds that are currently selected on the plot using
 box or lasso selection to a csv file containing projection values and compound data.
 """
 
+NEAREST_NEIGHBORS_DESC = """
+Find the most similar compounds (Tanimoto similarity of ECFP fingerprints) for every
+newly uploaded SMILES, either in the reference library of known actives or among
+the tested compounds of the current session.
+"""
+
+DIVERSE_PICKS_DESC = """
+Download a diverse subset of the active compounds for confirmation, picked with
+the MaxMin algorithm on Tanimoto distance of ECFP fingerprints. Compounds currently
+selected on the plot are treated as already picked, so the new picks are distant
+from them as well.
+"""
+
+ACTIVITY_CLIFFS_DESC = """
+Find pairs of compounds with similar structure (Tanimoto similarity of ECFP
+fingerprints above the threshold) but different activity. Numeric activities are
+scored with the structure-activity landscape index, the activity difference
+divided by the Tanimoto distance.
+"""
+
+SUBSTRUCTURE_SEARCH_DESC = """
+Find compounds containing a substructure given as SMARTS or SMILES, either in
+the reference library of known actives or among all compounds of the current
+session. Compounds are first screened with pattern fingerprints, only the
+remaining ones are matched exactly.
+"""
+
+SCAFFOLDS_DESC = """
+Group all compounds of the session by their Bemis-Murcko scaffold (ring systems
+with the linkers between them) with the number of tested and active compounds
+and mean activity per scaffold. Acyclic compounds have an empty scaffold.
+"""
+
 CONTROLS = (
     html.Div(
         className="d-flex flex-row gap-3 align-items-center w-100",
@@ -53,6 +89,23 @@ CONTROLS = (
                 clearable=False,
                 disabled=False,
             ),
+            dcc.Dropdown(
+                className="min-w-150px",
+                id="smiles-clustering-method-selection-box",
+                options=[
+                    {
+                        "label": "Projection clusters",
+                        "value": "projection",
+                    },
+                    {
+                        "label": "Butina clusters",
+                        "value": "Butina",
+                    },
+                ],
+                value="projection",
+                searchable=False,
+                clearable=False,
+            ),
             dcc.Checklist(
                 options=[
                     {
@@ -111,6 +164,236 @@ SMILES_PROJECTION_DISPLAY_STAGE = html.Div(
                 ),
             ],
         ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                html.Div(
+                    [
+                        annotate_with_tooltip(
+                            html.H5("Nearest Neighbors"), NEAREST_NEIGHBORS_DESC
+                        )
+                    ],
+                    className="col-md-6",
+                ),
+                html.Div(
+                    className="col-md-6 d-flex flex-row gap-3 align-items-center",
+                    children=[
+                        dcc.Dropdown(
+                            className="min-w-150px flex-grow-1",
+                            id="smiles-neighbors-library-selection-box",
+                            options=[
+                                {
+                                    "label": "Reference library",
+                                    "value": "library",
+                                },
+                                {
+                                    "label": "Session compounds",
+                                    "value": "session",
+                                },
+                            ],
+                            value="library",
+                            searchable=False,
+                            clearable=False,
+                        ),
+                        dcc.Input(
+                            id="smiles-neighbors-k-input",
+                            type="number",
+                            value=5,
+                            min=1,
+                            max=50,
+                            step=1,
+                            className="form-control w-auto",
+                        ),
+                        html.Button(
+                            "Find Neighbors",
+                            id="smiles-neighbors-button",
+                            className="btn btn-primary",
+                        ),
+                    ],
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                dcc.Loading(
+                    id="loading-neighbors-table",
+                    children=[html.Div(id="smiles-neighbors-table", children=[])],
+                    type="circle",
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                html.Div(
+                    [
+                        annotate_with_tooltip(
+                            html.H5("Diverse Picks"), DIVERSE_PICKS_DESC
+                        )
+                    ],
+                    className="col-md-6",
+                ),
+                html.Div(
+                    className="col-md-6 d-flex flex-row gap-3 align-items-center",
+                    children=[
+                        dcc.Input(
+                            id="smiles-diverse-picks-input",
+                            type="number",
+                            value=96,
+                            min=1,
+                            step=1,
+                            className="form-control w-auto",
+                        ),
+                        html.Button(
+                            children=[
+                                "Download Diverse Picks",
+                                dcc.Download(id="smiles-diverse-picks-csv"),
+                            ],
+                            id="smiles-diverse-picks-button",
+                            className="btn btn-primary",
+                        ),
+                    ],
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                html.Div(
+                    [
+                        annotate_with_tooltip(
+                            html.H5("Substructure Search"), SUBSTRUCTURE_SEARCH_DESC
+                        )
+                    ],
+                    className="col-md-6",
+                ),
+                html.Div(
+                    className="col-md-6 d-flex flex-row gap-3 align-items-center",
+                    children=[
+                        dcc.Input(
+                            id="smiles-substructure-input",
+                            type="text",
+                            placeholder="SMARTS or SMILES, e.g. c1ccncc1",
+                            className="form-control flex-grow-1",
+                        ),
+                        dcc.Dropdown(
+                            className="min-w-150px",
+                            id="smiles-substructure-library-selection-box",
+                            options=[
+                                {
+                                    "label": "Reference library",
+                                    "value": "library",
+                                },
+                                {
+                                    "label": "Session compounds",
+                                    "value": "session",
+                                },
+                            ],
+                            value="session",
+                            searchable=False,
+                            clearable=False,
+                        ),
+                        html.Button(
+                            "Search",
+                            id="smiles-substructure-button",
+                            className="btn btn-primary",
+                        ),
+                    ],
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                dcc.Loading(
+                    id="loading-substructure-table",
+                    children=[html.Div(id="smiles-substructure-table", children=[])],
+                    type="circle",
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                html.Div(
+                    [annotate_with_tooltip(html.H5("Scaffolds"), SCAFFOLDS_DESC)],
+                    className="col-md-6",
+                ),
+                html.Div(
+                    className="col-md-6 d-flex flex-row gap-3 align-items-center",
+                    children=[
+                        html.Button(
+                            "Group by Scaffold",
+                            id="smiles-scaffolds-button",
+                            className="btn btn-primary",
+                        ),
+                    ],
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                dcc.Loading(
+                    id="loading-scaffolds-table",
+                    children=[html.Div(id="smiles-scaffolds-table", children=[])],
+                    type="circle",
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                html.Div(
+                    [
+                        annotate_with_tooltip(
+                            html.H5("Activity Cliffs"), ACTIVITY_CLIFFS_DESC
+                        )
+                    ],
+                    className="col-md-6",
+                ),
+                html.Div(
+                    className="col-md-6 d-flex flex-row gap-3 align-items-center",
+                    children=[
+                        dcc.Dropdown(
+                            className="min-w-150px flex-grow-1",
+                            id="smiles-cliffs-activity-selection-box",
+                            options=[
+                                {"label": "activity_final", "value": "activity_final"}
+                            ],
+                            value="activity_final",
+                            searchable=False,
+                            clearable=False,
+                        ),
+                        dcc.Input(
+                            id="smiles-cliffs-threshold-input",
+                            type="number",
+                            value=0.8,
+                            min=0.05,
+                            max=1,
+                            step=0.05,
+                            className="form-control w-auto",
+                        ),
+                        html.Button(
+                            "Find Cliffs",
+                            id="smiles-cliffs-button",
+                            className="btn btn-primary",
+                        ),
+                    ],
+                ),
+            ],
+        ),
+        html.Div(
+            className="row mt-3",
+            children=[
+                dcc.Loading(
+                    id="loading-cliffs-table",
+                    children=[html.Div(id="smiles-cliffs-table", children=[])],
+                    type="circle",
+                ),
+            ],
+        ),
         html.Div(
             className="row",
             children=[
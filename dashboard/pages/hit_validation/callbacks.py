@@ -6,9 +6,7 @@ import uuid
 from datetime import datetime
 
 import dash_dangerously_set_inner_html as dhtml
-import numpy as np
 import pandas as pd
-import pyarrow as pa
 from dash import (
     ALL,
     Input,
@@ -24,21 +22,29 @@ from dash import (
 from dashboard.data.determination import (
     find_argument_four_param_logistic,
     four_param_logistic,
-    perform_hit_determination,
+    hit_determination_job,
 )
+from dashboard.data.jobs import DONE, FAILED, JobRunner, JobStatus
 from dashboard.data.json_reader import load_data_from_json
 from dashboard.pages.hit_validation.report.generate_report import (
-    generate_hit_valildation_report,
+    format_hit_statistics,
+    generate_eos_reports_zip,
     generate_jinja_report,
+    hit_validation_report_job,
 )
 from dashboard.storage import FileStorage
-from dashboard.visualization.plots import plot_ic50, plot_smiles
-from dashboard.pages.components import make_new_upload_view
+from dashboard.visualization.figure_cache import (
+    SessionFigureCaches,
+    neighbour_compounds,
+)
+from dashboard.pages.components import make_job_progress, make_new_upload_view
 from dashboard.data.json_reader import load_data_from_json
 
 SCREENING_FILENAME = "{0}_screening_df.pq"
 HIT_FILENAME = "{0}_hit_df.pq"
 
+FIGURE_CACHES = SessionFigureCaches()
+
 
 # === STAGE 1 ===
 def on_file_upload(
@@ -49,10 +55,11 @@ def on_file_upload(
     top_lower_bound: float,
     top_upper_bound: float,
     file_storage: FileStorage,
+    job_runner: JobRunner,
 ) -> tuple[html.Div, str]:
     """
-    Callback for file upload. It saves the file to the storage and returns an icon
-    indicating the status of the upload.
+    Callback for file upload. It saves the file to the storage and starts the hit
+    determination job, or returns an icon indicating the failed upload.
 
     :param content: base64 encoded file content
     :param stored_uuid: session uuid
@@ -61,12 +68,16 @@ def on_file_upload(
     :param top_lower_bound: top lower bound
     :param top_upper_bound: top upper bound
     :param file_storage: file storage
-    :return: icon indicating the status of the upload
+    :param job_runner: background job runner
+    :return: icon indicating the status of the upload or job progress
     :return: dummy upload element for loading component
+    :return: upload view
     :return: session uuid
+    :return: stage blocker
+    :return: job key, job polling interval disabled status
     """
     if content is None:
-        return no_update, no_update, no_update, no_update, no_update
+        return (no_update,) * 7
     if stored_uuid is None:
         stored_uuid = str(uuid.uuid4())
 
@@ -117,26 +128,91 @@ def on_file_upload(
             ),
             stored_uuid,
             no_update,
+            no_update,
+            no_update,
         )
 
     # screening df needs to be safed for plots
     file_storage.save_file(
         SCREENING_FILENAME.format(stored_uuid), screen_df.to_parquet(index=False)
     )
-    compounds_count = len(screen_df["EOS"].unique())
-    saved_name = HIT_FILENAME.format(stored_uuid)
-
-    # Placeholder for hit determination
-    hit_determination_df = perform_hit_determination(
+    job_key = job_runner.submit(
+        hit_determination_job,
         screen_df,
         concentration_lower_bound,
         concentration_upper_bound,
         top_lower_bound,
         top_upper_bound,
     )
+    return (
+        make_job_progress(JobStatus()),
+        None,
+        make_new_upload_view(
+            "File uploaded successfully", "new Hit Validation input file (.csv)"
+        ),
+        stored_uuid,
+        True,
+        job_key,
+        False,
+    )
+
+
+def on_hit_determination_job_poll(
+    n_intervals: int,
+    job_key: str,
+    stored_uuid: str,
+    file_storage: FileStorage,
+    job_runner: JobRunner,
+) -> tuple[html.Div, bool, bool]:
+    """
+    Callback for polling the hit determination job. While it runs, it shows the
+    progress and the compounds failing the curve fit so far. Once it is done, it
+    saves the hit determination data.
+
+    :param n_intervals: number of polls
+    :param job_key: key of the hit determination job
+    :param stored_uuid: session uuid
+    :param file_storage: file storage
+    :param job_runner: background job runner
+    :return: icon indicating the status of the upload or job progress
+    :return: stage blocker
+    :return: job polling interval disabled status
+    """
+    status = job_runner.status(job_key)
+    if status is None or status.state == FAILED:
+        error = status.error if status is not None else "the job was lost"
+        return (
+            html.Div(
+                children=[
+                    html.I(className="fas fa-times-circle text-danger me-2"),
+                    html.Span(f"Hit determination failed: {error}"),
+                ],
+                className="text-danger",
+            ),
+            True,
+            True,
+        )
+    if status.state != DONE:
+        unfit = status.partial or []
+        partial = [
+            html.Div(
+                f"Failed curve fit so far: {', '.join(unfit)}",
+                className="text-warning",
+            )
+        ]
+        return make_job_progress(status, partial if unfit else None), no_update, False
+
+    hit_determination_df = job_runner.result(job_key)
     unfit = hit_determination_df.EOS[hit_determination_df.ic50.isna()].tolist()
+    screen_df = file_storage.read_table(
+        SCREENING_FILENAME.format(stored_uuid), columns=["EOS"]
+    )
+    compounds_count = screen_df["EOS"].nunique()
 
-    file_storage.save_file(saved_name, hit_determination_df.to_parquet())
+    file_storage.save_file(
+        HIT_FILENAME.format(stored_uuid), hit_determination_df.to_parquet()
+    )
+    FIGURE_CACHES.invalidate(stored_uuid)
 
     result_msg = html.Div(
         children=[
@@ -169,15 +245,7 @@ def on_file_upload(
             ),
         ],
     )
-    return (
-        result_msg,
-        None,
-        make_new_upload_view(
-            "File uploaded successfully", "new Hit Validation input file (.csv)"
-        ),
-        stored_uuid,
-        False,
-    )
+    return result_msg, False, True
 
 
 FAIL_BOUNDS_ELEMENT = html.Div(
@@ -292,9 +360,7 @@ def on_hit_browser_stage_entry(
     if current_stage != 1:
         return no_update
 
-    hit_determination_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(HIT_FILENAME.format(stored_uuid)))
-    )
+    hit_determination_df = file_storage.read_parquet(HIT_FILENAME.format(stored_uuid))
 
     compounds_list = sorted(hit_determination_df["EOS"].unique().tolist())
     return compounds_list, compounds_list[0], False
@@ -315,81 +381,79 @@ def on_selected_compound_changed(
     apply_n_clicks: int,
     top_override: float | None,
     bottom_override: float | None,
+    compounds: list[str] | None,
     stored_uuid: str,
     file_storage: FileStorage,
 ) -> html.Div:
     """
     Callback for selected compound change. It loads the data from the storage and
-    returns the data for the compound.
+    returns the data for the compound. Figures are served from the session cache
+    and the neighbouring compounds are rendered in the background.
 
     :param selected_compound: selected compound
     :param unstack_n_clicks: number of clicks on the unstack button
     :param apply_n_clicks: number of clicks on the apply button
     :param top_override: top override
     :param bottom_override: bottom override
+    :param compounds: compounds in dropdown order
     :param stored_uuid: session uuid
     :param file_storage: file storage
     :return: data for the compound
     """
-    # if unstack clicked, reset overrides
-    hit_load_name = HIT_FILENAME.format(stored_uuid)
-    hit_determination_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(hit_load_name))
-    )
     screening_load_name = SCREENING_FILENAME.format(stored_uuid)
-    screening_data = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(screening_load_name))
-    ).loc[lambda df: df["EOS"] == selected_compound]
+    screening_df = file_storage.read_parquet(screening_load_name)
+    screening_data = screening_df.loc[lambda df: df["EOS"] == selected_compound]
     concentrations = screening_data["CONCENTRATION"].to_numpy()
     values = screening_data["VALUE"].to_numpy()
 
-    entry = (
-        hit_determination_df[hit_determination_df["EOS"] == selected_compound]
-        .iloc[0]
-        .to_dict()
-    )
-    index = hit_determination_df.index[
-        hit_determination_df["EOS"] == selected_compound
-    ][0]
     trigger = callback_context.triggered[0]["prop_id"]
     unstack_clicked = trigger == "hit-browser-unstack-button.n_clicks"
     apply_clicked = trigger == "hit-browser-apply-button.n_clicks"
-    if unstack_clicked:
-        top_override = entry["upper_limit"]
-        bottom_override = entry["lower_limit"]
-    if unstack_clicked or apply_clicked:
-        hit_determination_df.loc[index, "TOP"] = top_override
-        hit_determination_df.loc[index, "BOTTOM"] = bottom_override
-        entry["TOP"] = top_override
-        entry["BOTTOM"] = bottom_override
-
-    if unstack_clicked or apply_clicked:
-        file_storage.save_file(hit_load_name, hit_determination_df.to_parquet())
-
-    graph = plot_ic50(entry, concentrations, values)
-
-    smiles_row = pd.read_parquet("dashboard/assets/ml/predictions.pq").loc[
-        lambda df: df["EOS"] == selected_compound
-    ]
+    hit_load_name = HIT_FILENAME.format(stored_uuid)
+    # overrides of other compounds may be saved by other workers in the meantime
+    with file_storage.session_lock(stored_uuid):
+        hit_determination_df = file_storage.read_parquet(hit_load_name)
+        entry = (
+            hit_determination_df[hit_determination_df["EOS"] == selected_compound]
+            .iloc[0]
+            .to_dict()
+        )
+        index = hit_determination_df.index[
+            hit_determination_df["EOS"] == selected_compound
+        ][0]
+        # if unstack clicked, reset overrides
+        if unstack_clicked:
+            top_override = entry["upper_limit"]
+            bottom_override = entry["lower_limit"]
+        if unstack_clicked or apply_clicked:
+            hit_determination_df.loc[index, "TOP"] = top_override
+            hit_determination_df.loc[index, "BOTTOM"] = bottom_override
+            entry["TOP"] = top_override
+            entry["BOTTOM"] = bottom_override
+            file_storage.save_file(hit_load_name, hit_determination_df.to_parquet())
+
+    figure_cache = FIGURE_CACHES.get(stored_uuid)
+    graph = figure_cache.ic50_figure(entry, concentrations, values)
+
+    smiles_df = pd.read_parquet("dashboard/assets/ml/predictions.pq")
+    smiles_row = smiles_df.loc[lambda df: df["EOS"] == selected_compound]
     smiles, toxicity = (
         smiles_row["smiles"].to_numpy()[0],
         smiles_row["toxicity"].to_numpy()[0],
     )
-    smiles_graph = plot_smiles(smiles)
-    smiles_html = dhtml.DangerouslySetInnerHTML(smiles_graph)
+    smiles_graph = figure_cache.smiles_svg(smiles)
 
-    text_concentration_50 = "NaN"
-    if entry["concentration_50"] != np.nan:
-        text_concentration_50 = f"{entry['concentration_50']:,.5f}"
+    FIGURE_CACHES.prefetch(
+        stored_uuid,
+        neighbour_compounds(compounds, selected_compound),
+        hit_determination_df,
+        screening_df,
+        smiles_df,
+    )
+    smiles_html = dhtml.DangerouslySetInnerHTML(smiles_graph)
 
     result = {
-        "min_modulation": f"{entry['min_value']:,.5f}",
-        "max_modulation": f"{entry['max_value']:,.5f}",
-        "ic50": f"{entry['ic50']:,.5f}",
-        "modulation_ic50": f"{entry['modulation_ic50']:,.5f}",
-        "concentration_50": text_concentration_50,
-        "curve_slope": f"{entry['slope']:,.5f}",
-        "r2": f"{entry['r2'] * 100:,.5f}",
+        **format_hit_statistics(entry),
         "is_active": html.Span(
             children=[
                 activity_icons[entry["activity_final"]],
@@ -467,45 +531,105 @@ def on_download_summary_csv_button_click(
     :return: hit determination data in csv format
     """
     filename = f"hit_validation_summary_{datetime.now().strftime('%Y-%m-%d')}.csv"
-    hit_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(HIT_FILENAME.format(stored_uuid)))
-    )
+    hit_df = file_storage.read_parquet(HIT_FILENAME.format(stored_uuid))
 
     return dcc.send_data_frame(hit_df.to_csv, filename)
 
 
 def on_download_report_button_click(
-    n_clicks, stored_uuid: str, file_storage: FileStorage
-) -> dict:
+    n_clicks, stored_uuid: str, file_storage: FileStorage, job_runner: JobRunner
+) -> tuple[html.Div, str, bool]:
     """
     Callback for download report button click. It loads the data from the storage
-    and returns the data for the compound.
+    and starts the job generating the report.
 
     :param n_clicks: number of clicks
     :param stored_uuid: session uuid
     :param file_storage: file storage
-    :return: hit determination data in xlsx format
+    :param job_runner: background job runner
+    :return: job progress, job key, job polling interval disabled status
     """
 
     screening_load_name = SCREENING_FILENAME.format(stored_uuid)
-    screening_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(screening_load_name))
-    )
+    screening_df = file_storage.read_parquet(screening_load_name)
 
     hit_load_name = HIT_FILENAME.format(stored_uuid)
-    hit_df = pd.read_parquet(pa.BufferReader(file_storage.read_file(hit_load_name)))
+    hit_df = file_storage.read_parquet(hit_load_name)
+
+    job_key = job_runner.submit(hit_validation_report_job, screening_df, hit_df)
+    return make_job_progress(JobStatus()), job_key, False
+
+
+def on_report_job_poll(
+    n_intervals: int, job_key: str, job_runner: JobRunner
+) -> tuple[dict, html.Div, bool]:
+    """
+    Callback for polling the report job. Once it is done, it sends the report.
+
+    :param n_intervals: number of polls
+    :param job_key: key of the report job
+    :param job_runner: background job runner
+    :return: hit determination data in xlsx format, job progress, job polling
+        interval disabled status
+    """
+    status = job_runner.status(job_key)
+    if status is None or status.state == FAILED:
+        error = status.error if status is not None else "the job was lost"
+        message = html.Span(
+            f"Report generation failed: {error}", className="text-danger"
+        )
+        return no_update, message, True
+    if status.state != DONE:
+        return no_update, make_job_progress(status), False
+
     filename = f"hit_validation_report_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
+    return dcc.send_bytes(job_runner.result(job_key), filename), None, True
+
+
+def on_download_html_reports_button_click(
+    n_clicks: int,
+    activity_filter: list[str] | None,
+    stored_uuid: str,
+    file_storage: FileStorage,
+) -> dict:
+    """
+    Callback for download html reports button click. It generates the individual
+    EOS reports of the compounds with selected activity and returns them as a zip.
+
+    :param n_clicks: number of clicks
+    :param activity_filter: selected final activity values
+    :param stored_uuid: session uuid
+    :param file_storage: file storage
+    :return: zip archive with html reports
+    """
+    if not activity_filter:
+        return no_update
 
-    return generate_hit_valildation_report(filename, screening_df, hit_df)
+    hit_df = file_storage.read_parquet(HIT_FILENAME.format(stored_uuid))
+    compounds = hit_df.loc[
+        hit_df["activity_final"].isin(activity_filter), "EOS"
+    ].tolist()
+    if not compounds:
+        return no_update
 
+    screening_df = file_storage.read_parquet(SCREENING_FILENAME.format(stored_uuid))
+    smiles_df = pd.read_parquet("dashboard/assets/ml/predictions.pq")
+    filename = f"hit_validation_html_reports_{datetime.now().strftime('%Y-%m-%d')}.zip"
 
-def register_callbacks(elements, file_storage: FileStorage):
+    return generate_eos_reports_zip(
+        filename, screening_df, hit_df, smiles_df, compounds
+    )
+
+
+def register_callbacks(elements, file_storage: FileStorage, job_runner: JobRunner):
     callback(
         Output("screening-file-message", "children"),
         Output("dummy-upload-screening-data", "children"),
         Output("upload-screening-data", "children"),
         Output("user-uuid", "data", allow_duplicate=True),
         Output({"type": elements["BLOCKER"], "index": 0}, "data"),
+        Output("hit-determination-job-key", "data"),
+        Output("hit-determination-job-interval", "disabled"),
         Input("upload-screening-data", "contents"),
         State("user-uuid", "data"),
         State("concentration-lower-bound-store", "data"),
@@ -513,7 +637,27 @@ def register_callbacks(elements, file_storage: FileStorage):
         State("top-lower-bound-store", "data"),
         State("top-upper-bound-store", "data"),
         prevent_initial_call="initial_duplicate",
-    )(functools.partial(on_file_upload, file_storage=file_storage))
+    )(
+        functools.partial(
+            on_file_upload, file_storage=file_storage, job_runner=job_runner
+        )
+    )
+
+    callback(
+        Output("screening-file-message", "children", allow_duplicate=True),
+        Output({"type": elements["BLOCKER"], "index": 0}, "data", allow_duplicate=True),
+        Output("hit-determination-job-interval", "disabled", allow_duplicate=True),
+        Input("hit-determination-job-interval", "n_intervals"),
+        State("hit-determination-job-key", "data"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_hit_determination_job_poll,
+            file_storage=file_storage,
+            job_runner=job_runner,
+        )
+    )
 
     callback(
         Output("concentration-lower-bound-input", "value"),
@@ -578,6 +722,7 @@ def register_callbacks(elements, file_storage: FileStorage):
         Input("hit-browser-apply-button", "n_clicks"),
         State("hit-browser-top", "value"),
         State("hit-browser-bottom", "value"),
+        State("hit-browser-compound-dropdown", "options"),
         State("user-uuid", "data"),
     )(functools.partial(on_selected_compound_changed, file_storage=file_storage))
 
@@ -611,8 +756,37 @@ def register_callbacks(elements, file_storage: FileStorage):
     )
 
     callback(
-        Output("download-report-hit-validation", "data"),
+        Output("report-job-progress", "children"),
+        Output("report-job-key", "data"),
+        Output("report-job-interval", "disabled"),
         Input("download-report-hit-validation-button", "n_clicks"),
         State("user-uuid", "data"),
         prevent_initial_call=True,
-    )(functools.partial(on_download_report_button_click, file_storage=file_storage))
+    )(
+        functools.partial(
+            on_download_report_button_click,
+            file_storage=file_storage,
+            job_runner=job_runner,
+        )
+    )
+
+    callback(
+        Output("download-report-hit-validation", "data"),
+        Output("report-job-progress", "children", allow_duplicate=True),
+        Output("report-job-interval", "disabled", allow_duplicate=True),
+        Input("report-job-interval", "n_intervals"),
+        State("report-job-key", "data"),
+        prevent_initial_call=True,
+    )(functools.partial(on_report_job_poll, job_runner=job_runner))
+
+    callback(
+        Output("download-html-reports-hit-validation", "data"),
+        Input("download-html-reports-hit-validation-button", "n_clicks"),
+        State("html-reports-activity-filter", "value"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_download_html_reports_button_click, file_storage=file_storage
+        )
+    )
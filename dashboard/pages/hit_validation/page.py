@@ -1,8 +1,10 @@
 from dash import register_page, html, dcc
 
+from dashboard.data.jobs import shared_runner
 from dashboard.pages.builders import ProcessPageBuilder
 from dashboard.pages.hit_validation.stages import STAGES
 from dashboard.pages.hit_validation.callbacks import register_callbacks
+from dashboard.storage.caching import shared_storage
 from dashboard.storage.local import LocalFileStorage
 
 
@@ -31,6 +33,7 @@ pb.extend_layout(
 )
 layout = pb.build()
 
-file_storage = LocalFileStorage()
+file_storage = shared_storage()
+job_runner = shared_runner(LocalFileStorage.data_folder)
 
-register_callbacks(pb.elements, file_storage)
+register_callbacks(pb.elements, file_storage, job_runner)
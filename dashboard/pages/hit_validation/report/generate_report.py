@@ -1,105 +1,247 @@
+import functools
 import io
 import os
+import pathlib
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Iterator
 
 import jinja2
+import numpy as np
 import pandas as pd
 import xlsxwriter
 from dash import dcc
-from PIL import Image
+from plotly.offline import get_plotlyjs
 
-from dashboard.visualization.plots import plot_ic50
+from dashboard.data.jobs import JobProgress, worker_context
+from dashboard.visualization.ic50_images import (
+    group_screening_points,
+    render_ic50_images,
+)
+from dashboard.visualization.plots import plot_ic50, plot_smiles
+
+PLOTLYJS_FILENAME = "plotly.min.js"
+MIN_PARALLEL_REPORTS = 16
+REPORTS_CHUNK_SIZE = 8
+
+
+@functools.lru_cache(maxsize=None)
+def get_report_template() -> jinja2.Template:
+    """
+    Load and compile the EOS report template once per process
+
+    :return: compiled report template
+    """
+    template_loader = jinja2.FileSystemLoader(pathlib.Path(__file__).parent)
+    template_env = jinja2.Environment(loader=template_loader, auto_reload=False)
+    return template_env.get_template("report.html")
 
 
 def generate_jinja_report(content: dict):
     now = datetime.now()
     content["current_day"] = now.strftime("%d-%m-%y")
     content["current_time"] = now.strftime("%H:%M:%S")
-    template_loader = jinja2.FileSystemLoader("dashboard/pages/hit_validation/report")
-    template_env = jinja2.Environment(loader=template_loader)
-    template = template_env.get_template("report.html")
-    return template.render(content)
+    return get_report_template().render(content)
 
 
-def get_eos_img(eos: str, screening_df: pd.DataFrame, hit_df: pd.DataFrame) -> Image:
+def format_hit_statistics(entry: dict) -> dict:
     """
-    Returns the image of the IC50 plot for a given EOS
+    Formats the curve fit statistics of a single EOS for display
 
-    :param eos: EOS to get the image for
-    :param screening_df: Screening dataframe
-    :param hit_df: Hit dataframe
-    :return: Image of the IC50 plot
-    """
-    # NOTE: some of the values are hardcoded as there's a discrepancy in the Image and xlsxwritter scale
-    IMG_WIDTH = 285
-    IMG_HEIGHT = 145
-
-    screening_data = screening_df.loc[lambda df: df["EOS"] == eos]
-    concentrations = screening_data["CONCENTRATION"].to_numpy()
-    values = screening_data["VALUE"].to_numpy()
-    entry = hit_df[hit_df["EOS"] == eos].iloc[0].to_dict()
-    fig = plot_ic50(entry, concentrations, values, showlegend=False)
-
-    fig.update_layout(
-        width=IMG_WIDTH,
-        height=IMG_HEIGHT,
-        margin=dict(l=1, r=1, t=1, b=1),
-        xaxis=dict(tickfont=dict(size=8)),
-        yaxis=dict(tickfont=dict(size=8)),
-        xaxis_title_font=dict(size=10),
-        yaxis_title_font=dict(size=10),
+    :param entry: hit determination row as a dict
+    :return: dictionary with formatted statistics
+    """
+    text_concentration_50 = "NaN"
+    if entry["concentration_50"] != np.nan:
+        text_concentration_50 = f"{entry['concentration_50']:,.5f}"
+
+    return {
+        "min_modulation": f"{entry['min_value']:,.5f}",
+        "max_modulation": f"{entry['max_value']:,.5f}",
+        "ic50": f"{entry['ic50']:,.5f}",
+        "modulation_ic50": f"{entry['modulation_ic50']:,.5f}",
+        "concentration_50": text_concentration_50,
+        "curve_slope": f"{entry['slope']:,.5f}",
+        "r2": f"{entry['r2'] * 100:,.5f}",
+    }
+
+
+def make_eos_report(
+    entry: dict,
+    concentrations: np.ndarray,
+    values: np.ndarray,
+    smiles: str | None,
+    toxicity: float | None,
+) -> str:
+    """
+    Renders the HTML report of a single EOS, the plotly.js bundle is expected
+    to be next to the report (see PLOTLYJS_FILENAME)
+
+    :param entry: hit determination row as a dict
+    :param concentrations: measured concentrations
+    :param values: measured values
+    :param smiles: smiles of the compound, None if unknown
+    :param toxicity: predicted toxicity of the compound, None if unknown
+    :return: rendered html report
+    """
+    graph = plot_ic50(entry, concentrations, values)
+    content = format_hit_statistics(entry)
+    content.update(
+        {
+            "id": entry["EOS"],
+            "html_graph": graph.to_html(full_html=False, include_plotlyjs="directory"),
+            "html_smiles_graph": plot_smiles(smiles) if smiles else "",
+            "is_active_html": entry["activity_final"],
+            "is_partially_active_html": entry["is_partially_active"],
+            "top": round(entry["TOP"], 5),
+            "bottom": round(entry["BOTTOM"], 5),
+            "toxicity": "-" if toxicity is None else f"{float(toxicity):,.5f}",
+        }
     )
+    return generate_jinja_report(content)
+
+
+def _render_eos_reports(tasks: list[tuple]) -> list[tuple[str, str]]:
+    return [(task[0]["EOS"], make_eos_report(*task)) for task in tasks]
 
-    image_bytes = fig.to_image(format="png")
-    img_resized = Image.open(io.BytesIO(image_bytes)).resize((IMG_WIDTH, IMG_HEIGHT))
-    return img_resized
 
+def iter_eos_reports(
+    tasks: list[tuple], max_workers: int | None = None
+) -> Iterator[tuple[str, str]]:
+    """
+    Renders EOS reports in a process pool, yielding them in order. Only a bounded
+    number of chunks is in flight, so the rendered reports are never all held in memory.
+
+    :param tasks: arguments of `make_eos_report` per EOS
+    :param max_workers: number of worker processes, defaults to cpu count
+    :return: iterator of EOS and rendered html report pairs
+    """
+    if len(tasks) < MIN_PARALLEL_REPORTS:
+        for task in tasks:
+            yield from _render_eos_reports([task])
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=worker_context()
+    ) as executor:
+        pending = deque()
+        for start in range(0, len(tasks), REPORTS_CHUNK_SIZE):
+            chunk = tasks[start : start + REPORTS_CHUNK_SIZE]
+            pending.append(executor.submit(_render_eos_reports, chunk))
+            if len(pending) >= 2 * max_workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_eos_reports_zip(
+    stream: io.BytesIO, tasks: list[tuple], max_workers: int | None = None
+) -> None:
+    """
+    Writes the EOS reports with a single shared plotly.js bundle into a zip archive
 
-def generate_hit_valildation_report(
-    filename: str, screening_df: pd.DataFrame, hit_df: pd.DataFrame
+    :param stream: binary stream to write the archive to
+    :param tasks: arguments of `make_eos_report` per EOS
+    :param max_workers: number of worker processes, defaults to cpu count
+    """
+    date = datetime.now().strftime("%Y-%m-%d")
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(PLOTLYJS_FILENAME, get_plotlyjs())
+        for eos, report in iter_eos_reports(tasks, max_workers):
+            archive.writestr(f"{eos}_report_{date}.html", report)
+
+
+def generate_eos_reports_zip(
+    filename: str,
+    screening_df: pd.DataFrame,
+    hit_df: pd.DataFrame,
+    smiles_df: pd.DataFrame,
+    compounds: list[str],
 ) -> dict:
     """
-    Generates the hit validation report in the xlsx format (with images)
+    Generates the HTML reports of the selected compounds as a zip archive
 
-    :param filename: Name of the file to save the report as
+    :param filename: Name of the file to save the archive as
     :param screening_df: Screening dataframe
     :param hit_df: Hit dataframe
-    :return: Download link to the report
+    :param smiles_df: dataframe with EOS, smiles and toxicity columns
+    :param compounds: EOS of the compounds to generate the reports for
+    :return: Download link to the archive
     """
-    columns = [col for col in hit_df.columns if col != "EOS"]
-    hit_df["Image"] = None
-    columns_ordered = ["EOS", "Image"] + columns
-    hit_df = hit_df[columns_ordered]
+    points = group_screening_points(screening_df[screening_df["EOS"].isin(compounds)])
+    smiles_by_eos = smiles_df.drop_duplicates(subset=["EOS"]).set_index("EOS")
+    tasks = []
+    for entry in hit_df[hit_df["EOS"].isin(compounds)].to_dict("records"):
+        if entry["EOS"] not in points:
+            continue
+        smiles, toxicity = None, None
+        if entry["EOS"] in smiles_by_eos.index:
+            smiles = smiles_by_eos.at[entry["EOS"], "smiles"]
+            toxicity = smiles_by_eos.at[entry["EOS"], "toxicity"]
+        tasks.append((entry, *points[entry["EOS"]], smiles, toxicity))
+
+    return dcc.send_bytes(
+        functools.partial(write_eos_reports_zip, tasks=tasks), filename
+    )
+
 
-    excel_data = io.BytesIO()
-    workbook = xlsxwriter.Workbook(excel_data, {"nan_inf_to_errors": True})
+def write_hit_validation_workbook(
+    stream: io.BytesIO, hit_df: pd.DataFrame, images: list[bytes | None]
+) -> None:
+    """
+    Writes the hit validation workbook to the stream, column by column
+
+    :param stream: binary stream to write the workbook to
+    :param hit_df: Hit dataframe with an Image placeholder column
+    :param images: png images of the IC50 plots aligned with the hit dataframe rows
+    """
+    workbook = xlsxwriter.Workbook(stream, {"nan_inf_to_errors": True})
     worksheet = workbook.add_worksheet("hit_validation")
     worksheet.set_column("B:B", 40)
+    worksheet.write_row(0, 0, hit_df.columns.tolist())
 
     for idx, col in enumerate(hit_df.columns):
-        worksheet.write(0, idx, col)  # Write column headers
-        for row_idx, value in enumerate(hit_df[col]):
-            if col == "Image":
-                eos = hit_df["EOS"][row_idx]
-                eos_img = get_eos_img(eos, screening_df, hit_df)
-
-                img_stream = io.BytesIO()
-                eos_img.save(img_stream, format="PNG")
-                img_stream.seek(0)
-
-                worksheet.set_row(row_idx + 1, 110)
-                worksheet.insert_image(
-                    f"B{row_idx + 2}", "plot.png", {"image_data": img_stream}
-                )
-            else:
-                worksheet.write(row_idx + 1, idx, value)
+        if col == "Image":
+            continue
+        worksheet.write_column(1, idx, hit_df[col].tolist())
+
+    image_col = hit_df.columns.get_loc("Image")
+    for row_idx, image in enumerate(images):
+        if image is None:
+            continue
+        worksheet.set_row(row_idx + 1, 110)
+        worksheet.insert_image(
+            row_idx + 1, image_col, "plot.png", {"image_data": io.BytesIO(image)}
+        )
 
     workbook.close()
-    temp_file_path = "temp_report.xlsx"
-    with open(temp_file_path, "wb") as temp_file:
-        temp_file.write(excel_data.getvalue())
 
-    download_link = dcc.send_file(temp_file_path, filename=filename)
-    os.remove(temp_file_path)
 
-    return download_link
+def hit_validation_report_job(
+    screening_df: pd.DataFrame, hit_df: pd.DataFrame, progress: JobProgress
+) -> bytes:
+    """
+    Background job generating the hit validation report in the xlsx format
+    (with images)
+
+    :param screening_df: Screening dataframe
+    :param hit_df: Hit dataframe
+    :param progress: progress of the job
+    :return: content of the workbook
+    """
+    columns = [col for col in hit_df.columns if col != "EOS"]
+    hit_df = hit_df.reset_index(drop=True)
+    hit_df["Image"] = None
+    hit_df = hit_df[["EOS", "Image"] + columns]
+
+    progress.update(0.0, "Rendering IC50 plots")
+    images = render_ic50_images(
+        hit_df.to_dict("records"), group_screening_points(screening_df)
+    )
+    progress.update(0.8, "Writing the workbook")
+    stream = io.BytesIO()
+    write_hit_validation_workbook(stream, hit_df, images)
+    return stream.getvalue()
@@ -213,6 +213,8 @@ SCREENING_INPUT_STAGE = html.Div(
         ),
         html.Hr(),
         FILE_INPUT_CONTAINER,
+        dcc.Store(id="hit-determination-job-key"),
+        dcc.Interval(id="hit-determination-job-interval", interval=500, disabled=True),
         html.Div(
             id="screening-file-message",
             className="d-flex flex-row align-items-center justify-content-center",
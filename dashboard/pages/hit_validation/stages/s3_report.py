@@ -16,26 +16,25 @@ REPORT_STAGE = html.Div(
                         html.Div(
                             className="d-flex justify-content-center",
                             children=[
-                                dcc.Loading(
-                                    children=[
-                                        annotate_with_tooltip(
-                                            html.Button(
-                                                make_download_button_text(
-                                                    "Download Report XLSX"
-                                                ),
-                                                className="btn btn-primary btn-lg btn-block btn-report",
-                                                id="download-report-hit-validation-button",
-                                            ),
-                                            "Exports the hit validation results together with the plots - may take a while to generate.",
+                                annotate_with_tooltip(
+                                    html.Button(
+                                        make_download_button_text(
+                                            "Download Report XLSX"
                                         ),
-                                        dcc.Download(
-                                            id="download-report-hit-validation"
-                                        ),
-                                    ],
-                                    type="circle",
-                                )
+                                        className="btn btn-primary btn-lg btn-block btn-report",
+                                        id="download-report-hit-validation-button",
+                                    ),
+                                    "Exports the hit validation results together with the plots - may take a while to generate.",
+                                ),
+                                dcc.Download(id="download-report-hit-validation"),
                             ],
                         ),
+                        # the report is generated by a background job, polled here
+                        dcc.Store(id="report-job-key"),
+                        dcc.Interval(
+                            id="report-job-interval", interval=500, disabled=True
+                        ),
+                        html.Div(id="report-job-progress"),
                     ],
                 ),
             ],
@@ -61,6 +60,55 @@ REPORT_STAGE = html.Div(
                 ),
             ],
         ),
+        html.Div(
+            className="row mt-2",
+            children=[
+                html.Div(
+                    className="col",
+                    children=[
+                        html.Div(
+                            className="d-flex justify-content-center align-items-center gap-3",
+                            children=[
+                                dcc.Dropdown(
+                                    id="html-reports-activity-filter",
+                                    options=[
+                                        {"label": "Active", "value": "active"},
+                                        {"label": "Inactive", "value": "inactive"},
+                                        {
+                                            "label": "Inconclusive",
+                                            "value": "inconclusive",
+                                        },
+                                    ],
+                                    value=["active"],
+                                    multi=True,
+                                    clearable=False,
+                                    searchable=False,
+                                    className="min-w-200px",
+                                ),
+                                dcc.Loading(
+                                    children=[
+                                        annotate_with_tooltip(
+                                            html.Button(
+                                                make_download_button_text(
+                                                    "Download HTML Reports ZIP"
+                                                ),
+                                                className="btn btn-primary btn-lg btn-block btn-report",
+                                                id="download-html-reports-hit-validation-button",
+                                            ),
+                                            "Exports individual HTML reports of all compounds with the selected activity as a zip archive.",
+                                        ),
+                                        dcc.Download(
+                                            id="download-html-reports-hit-validation"
+                                        ),
+                                    ],
+                                    type="circle",
+                                ),
+                            ],
+                        ),
+                    ],
+                ),
+            ],
+        ),
         html.Div(
             className="row mt-2",
             children=[
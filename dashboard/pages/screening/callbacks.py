@@ -8,7 +8,6 @@ from datetime import datetime
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import pyarrow as pa
 from dash import (
     Input,
     Output,
@@ -21,7 +20,7 @@ from dash import (
     no_update,
 )
 
-from dashboard.data.bmg_plate import filter_low_quality_plates, parse_bmg_files
+from dashboard.data.bmg_plate import filter_low_quality_plates, parse_bmg_job
 from dashboard.data.json_reader import load_data_from_json
 from dashboard.data.combine import (
     aggregate_well_plate_stats,
@@ -29,8 +28,9 @@ from dashboard.data.combine import (
     split_compounds_controls,
 )
 from dashboard.data.file_preprocessing.echo_files_parser import EchoFilesParser
+from dashboard.data.jobs import DONE, FAILED, JobRunner, JobStatus
 from dashboard.data.utils import eos_to_ecbd_link
-from dashboard.pages.components import make_file_list_component
+from dashboard.pages.components import make_file_list_component, make_job_progress
 from dashboard.pages.screening.report.generate_jinja_report import generate_jinja_report
 from dashboard.pages.screening.report.generate_json_data import read_stages_stats
 from dashboard.storage import FileStorage
@@ -55,28 +55,72 @@ def on_next_button_click(n_clicks):
 # === STAGE 1 ===
 
 
-def upload_bmg_data(contents, names, last_modified, stored_uuid, file_storage):
+def upload_bmg_data(contents, names, last_modified, stored_uuid, job_runner):
     if contents is None:
-        return no_update, no_update, no_update, no_update, no_update
+        return no_update, no_update, no_update, no_update, no_update, no_update
 
     if not stored_uuid:
         stored_uuid = str(uuid.uuid4())
 
     bmg_files = []
-    callback_context.response
-
     for content, filename in zip(contents, names):
         name, extension = filename.split(".")
         if extension == "txt":
             _, content_string = content.split(",")
             decoded = base64.b64decode(content_string)
-            bmg_files.append((filename, io.StringIO(decoded.decode("utf-8"))))
+            bmg_files.append((filename, decoded.decode("utf-8")))
 
     if not bmg_files:
-        return no_update, no_update, no_update, no_update
+        return no_update, no_update, no_update, no_update, no_update, no_update
 
-    bmg_df, val, failed_files = parse_bmg_files(tuple(bmg_files))
-    ok_names = [name for name, _ in bmg_files if name not in failed_files]
+    job_key = job_runner.submit(parse_bmg_job, tuple(bmg_files))
+    return (
+        make_job_progress(JobStatus()),
+        make_new_upload_view("Files uploaded", "new BMG files (.txt)"),
+        stored_uuid,
+        True,
+        job_key,
+        False,
+    )
+
+
+def on_bmg_job_poll(n_intervals, job_key, names, stored_uuid, file_storage, job_runner):
+    """
+    Callback for polling the BMG parsing job. While it runs, it shows the progress
+    and the files failed so far. Once it is done, it saves the parsed plates.
+
+    :param n_intervals: number of polls
+    :param job_key: key of the parsing job
+    :param names: names of the uploaded files
+    :param stored_uuid: uuid of the stored data
+    :param file_storage: storage object
+    :param job_runner: background job runner
+    :return: file list or job progress, stage blocker, job polling interval
+        disabled status
+    """
+    status = job_runner.status(job_key)
+    if status is None or status.state == FAILED:
+        error = status.error if status is not None else "the job was lost"
+        return (
+            html.Span(f"Parsing BMG files failed: {error}", className="text-danger"),
+            True,
+            True,
+        )
+    if status.state != DONE:
+        failed_entries = [f"{name}: {e}" for name, e in (status.partial or {}).items()]
+        failed_list = [html.Ul([html.Li(entry) for entry in failed_entries])]
+        return (
+            make_job_progress(status, failed_list if failed_entries else None),
+            no_update,
+            False,
+        )
+
+    bmg_df, val, failed_files = job_runner.result(job_key)
+    ok_names = [
+        name
+        for name in names
+        if name.split(".")[-1] == "txt" and name not in failed_files
+    ]
     nok_entries = [f"{name}: {error}" for name, error in failed_files.items()]
 
     stream = io.BytesIO()
@@ -85,16 +129,7 @@ def upload_bmg_data(contents, names, last_modified, stored_uuid, file_storage):
     file_storage.save_file(f"{stored_uuid}_bmg_val.npz", stream.read())
     file_storage.save_file(f"{stored_uuid}_bmg_df.pq", bmg_df.to_parquet())
 
-    return (
-        make_file_list_component(ok_names, nok_entries, 2),
-        no_update,
-        make_new_upload_view(
-            f"Files uploaded. Success: {len(ok_names)}. Skipped {len(nok_entries)}",
-            "new BMG files (.txt)",
-        ),
-        stored_uuid,
-        False,
-    )
+    return make_file_list_component(ok_names, nok_entries, 2), False, True
 
 
 def upload_settings_data(content: str | None, name: str | None):
@@ -199,10 +234,8 @@ def on_outlier_purge_stage_entry(
     if current_stage != 1:
         return no_update
 
-    raw_bmg = file_storage.read_file(f"{stored_uuid}_bmg_df.pq")
-    bmg_df = pd.read_parquet(pa.BufferReader(raw_bmg))
-    raw_vals = file_storage.read_file(f"{stored_uuid}_bmg_val.npz")
-    bmg_vals = np.load(io.BytesIO(raw_vals))["arr_0"]
+    bmg_df = file_storage.read_parquet(f"{stored_uuid}_bmg_df.pq")
+    bmg_vals = file_storage.read_npz(f"{stored_uuid}_bmg_val.npz")["arr_0"]
 
     plates_count = bmg_vals.shape[0]
     compounds_count = plates_count * bmg_vals.shape[2] * (bmg_vals.shape[3] - 2)
@@ -275,12 +308,8 @@ def on_export_plots_button_click(
     if n_clicks is None:
         return no_update
 
-    bmg_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_bmg_df.pq"))
-    )
-    bmg_vals = np.load(
-        io.BytesIO(file_storage.read_file(f"{stored_uuid}_bmg_val.npz"))
-    )["arr_0"]
+    bmg_df = file_storage.read_parquet(f"{stored_uuid}_bmg_df.pq")
+    bmg_vals = file_storage.read_npz(f"{stored_uuid}_bmg_val.npz")["arr_0"]
     n_rows, remainder = divmod(bmg_vals.shape[0], N_COLS)
     n_rows += bool(remainder)
 
@@ -322,10 +351,8 @@ def on_plates_stats_stage_entry(
     """
     if current_stage != 2:
         return no_update
-    raw_bmg = file_storage.read_file(f"{stored_uuid}_bmg_df.pq")
-    bmg_df = pd.read_parquet(pa.BufferReader(raw_bmg))
-    raw_vals = file_storage.read_file(f"{stored_uuid}_bmg_val.npz")
-    bmg_vals = np.load(io.BytesIO(raw_vals))["arr_0"]
+    bmg_df = file_storage.read_parquet(f"{stored_uuid}_bmg_df.pq")
+    bmg_vals = file_storage.read_npz(f"{stored_uuid}_bmg_val.npz")["arr_0"]
 
     filtered_df, low_quality_df, filtered_vals = filter_low_quality_plates(
         bmg_df, bmg_vals, value
@@ -410,10 +437,11 @@ def on_upload_echo_data(contents, names, last_modified, stored_uuid, file_storag
         echo_parser.retain_key_columns(eos=False, exceptions=True)
         echo_df = echo_parser.get_processed_echo_df()
         exceptions_df = echo_parser.get_processed_exception_df()
-        file_storage.save_file(f"{stored_uuid}_echo_df.pq", echo_df.to_parquet())
-        file_storage.save_file(
-            f"{stored_uuid}_exceptions_df.pq", exceptions_df.to_parquet()
-        )
+        with file_storage.session_lock(stored_uuid):
+            file_storage.save_file(f"{stored_uuid}_echo_df.pq", echo_df.to_parquet())
+            file_storage.save_file(
+                f"{stored_uuid}_exceptions_df.pq", exceptions_df.to_parquet()
+            )
 
     return None, make_new_upload_view(
         "Files uploaded", "new ECHO files (.csv)"
@@ -426,7 +454,8 @@ def on_upload_eos_data(contents, stored_uuid, file_storage):
 
     eos_decoded = base64.b64decode(contents.split(",")[1]).decode("utf-8")
     eos_df = pd.read_csv(io.StringIO(eos_decoded), dtype="str")
-    file_storage.save_file(f"{stored_uuid}_eos_df.pq", eos_df.to_parquet())
+    with file_storage.session_lock(stored_uuid):
+        file_storage.save_file(f"{stored_uuid}_eos_df.pq", eos_df.to_parquet())
     return None, make_new_upload_view(
         "File uploaded", "new EOS file (.csv)"
     )  # dummy upload eos return
@@ -436,22 +465,23 @@ def on_upload_echo_eos_data(echo_upload, names, eos_upload, stored_uuid, file_st
     echo_df_file_path = f"{stored_uuid}_echo_df.pq"
     eos_df_file_path = f"{stored_uuid}_eos_df.pq"
 
-    if not file_storage.file_exists(echo_df_file_path) or not file_storage.file_exists(
-        eos_df_file_path
-    ):
-        return no_update
+    # both uploads trigger the merge, which rewrites the echo file, so merges and
+    # echo uploads of a session never interleave across workers
+    with file_storage.session_lock(stored_uuid):
+        if not file_storage.file_exists(
+            echo_df_file_path
+        ) or not file_storage.file_exists(eos_df_file_path):
+            return no_update
 
-    echo_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(echo_df_file_path))
-    )
-    eos_df = pd.read_parquet(pa.BufferReader(file_storage.read_file(eos_df_file_path)))
-    echo_parser = EchoFilesParser()
-    echo_parser.set_echo_df(echo_df)
-    echo_parser.retain_key_columns(eos=False)
+        echo_df = file_storage.read_parquet(echo_df_file_path)
+        eos_df = file_storage.read_parquet(eos_df_file_path)
+        echo_parser = EchoFilesParser()
+        echo_parser.set_echo_df(echo_df)
+        echo_parser.retain_key_columns(eos=False)
 
-    no_eos_num = echo_parser.merge_eos(eos_df)
-    echo_df = echo_parser.retain_key_columns().get_processed_echo_df()
-    file_storage.save_file(f"{stored_uuid}_echo_df.pq", echo_df.to_parquet())
+        no_eos_num = echo_parser.merge_eos(eos_df)
+        echo_df = echo_parser.retain_key_columns().get_processed_echo_df()
+        file_storage.save_file(echo_df_file_path, echo_df.to_parquet())
 
     return (
         make_file_list_component(
@@ -504,15 +534,9 @@ def on_summary_entry(
     """
     if current_stage != 4:
         return no_update
-    echo_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_echo_df.pq"))
-    )
-    bmg_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_bmg_df.pq"))
-    )
-    bmg_vals = np.load(
-        io.BytesIO(file_storage.read_file(f"{stored_uuid}_bmg_val.npz"))
-    )["arr_0"]
+    echo_df = file_storage.read_parquet(f"{stored_uuid}_echo_df.pq")
+    bmg_df = file_storage.read_parquet(f"{stored_uuid}_bmg_df.pq")
+    bmg_vals = file_storage.read_npz(f"{stored_uuid}_bmg_val.npz")["arr_0"]
 
     filtered_df, _, filtered_vals = filter_low_quality_plates(
         bmg_df, bmg_vals, z_slider["z_slider_value"]
@@ -531,8 +555,11 @@ def on_summary_entry(
         echo_bmg_combined
     )
     compounds_df = compounds_df.dropna()
-    file_storage.save_file(
-        f"{stored_uuid}_echo_bmg_combined_df.pq", compounds_df.to_parquet()
+    # sorted by plate like the plots, read_table decodes only the needed columns
+    file_storage.save_table(
+        f"{stored_uuid}_echo_bmg_combined_df.pq",
+        compounds_df,
+        sort_by="Destination Plate Barcode",
     )
 
     cmpd_plate_stats_df = aggregate_well_plate_stats(
@@ -546,8 +573,10 @@ def on_summary_entry(
     )
     plate_stats_dfs = [cmpd_plate_stats_df, pos_plate_stats_df, neg_plate_stats_df]
 
-    file_storage.save_file(
-        f"{stored_uuid}_plate_stats_df.pq", cmpd_plate_stats_df.to_parquet()
+    file_storage.save_table(
+        f"{stored_uuid}_plate_stats_df.pq",
+        cmpd_plate_stats_df,
+        sort_by="Destination Plate Barcode",
     )
 
     feature_min = round(compounds_df[screening_options["feature_column"]].min())
@@ -716,20 +745,17 @@ def on_range_update(
     PLATE = "Destination Plate Barcode"
     WELL = "Destination Well"
 
-    compounds_df = pd.read_parquet(
-        pa.BufferReader(
-            file_storage.read_file(f"{stored_uuid}_echo_bmg_combined_df.pq")
-        )
+    # decode only the columns of the plot; row groups are sorted by plate, so
+    # the range filter drops rows after decoding rather than skipping row groups
+    outside_range_df = file_storage.read_table(
+        f"{stored_uuid}_echo_bmg_combined_df.pq",
+        columns=[key, WELL, PLATE, "EOS"],
+        filters=[[(key, "<", min_value)], [(key, ">", max_value)]],
     )
-    cmpd_stats_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_plate_stats_df.pq"))
-    )
-
-    mask = (compounds_df[key] >= min_value) & (compounds_df[key] <= max_value)
-    outside_range_df = compounds_df[~mask].copy()
-    outside_range_df = outside_range_df[[key, WELL, PLATE, "EOS"]].merge(
-        cmpd_stats_df[[f"{key}_x", PLATE]], on=PLATE
+    cmpd_stats_df = file_storage.read_table(
+        f"{stored_uuid}_plate_stats_df.pq", columns=[f"{key}_x", PLATE]
     )
+    outside_range_df = outside_range_df.merge(cmpd_stats_df, on=PLATE)
 
     new_figure.update_traces(
         x=outside_range_df[f"{key}_x"],
@@ -763,10 +789,8 @@ def on_save_results_click(
 
     filename = f"screening_results_{datetime.now().strftime('%Y-%m-%d')}.csv"
 
-    echo_bmg_combined_df = pd.read_parquet(
-        pa.BufferReader(
-            file_storage.read_file(f"{stored_uuid}_echo_bmg_combined_df.pq")
-        ),
+    echo_bmg_combined_df = file_storage.read_parquet(
+        f"{stored_uuid}_echo_bmg_combined_df.pq"
     )
 
     if report_data_csv["key"] == "z_score":
@@ -806,10 +830,8 @@ def on_save_low_quality_plates_click(
     """
     z_slider = z_slider["z_slider_value"]
     filename = f"screening_low_quality_plates_{datetime.now().strftime('%Y-%m-%d')}.csv"
-    raw_bmg = file_storage.read_file(f"{stored_uuid}_bmg_df.pq")
-    bmg_df = pd.read_parquet(pa.BufferReader(raw_bmg))
-    raw_vals = file_storage.read_file(f"{stored_uuid}_bmg_val.npz")
-    bmg_vals = np.load(io.BytesIO(raw_vals))["arr_0"]
+    bmg_df = file_storage.read_parquet(f"{stored_uuid}_bmg_df.pq")
+    bmg_vals = file_storage.read_npz(f"{stored_uuid}_bmg_val.npz")["arr_0"]
 
     _, low_quality_df, _ = filter_low_quality_plates(bmg_df, bmg_vals, z_slider)
     low_quality_df = low_quality_df.rename(
@@ -838,9 +860,7 @@ def on_save_exceptions_click(
 
     filename = f"screening_exceptions_{datetime.now().strftime('%Y-%m-%d')}.csv"
 
-    exceptions_df = pd.read_parquet(
-        pa.BufferReader(file_storage.read_file(f"{stored_uuid}_exceptions_df.pq")),
-    )
+    exceptions_df = file_storage.read_parquet(f"{stored_uuid}_exceptions_df.pq")
 
     return dcc.send_data_frame(exceptions_df.to_csv, filename)
 
@@ -872,20 +892,36 @@ def on_json_generate_button_click(
     return dict(content=json_object, filename=filename)
 
 
-def register_callbacks(elements, file_storage):
+def register_callbacks(elements, file_storage, job_runner: JobRunner):
     callback(
         [
             Output("bmg-filenames", "children"),
-            Output("dummy-upload-bmg-data", "children"),
             Output("upload-bmg-data", "children"),
             Output("user-uuid", "data"),
             Output({"type": elements["BLOCKER"], "index": 0}, "data"),
+            Output("bmg-job-key", "data"),
+            Output("bmg-job-interval", "disabled"),
         ],
         Input("upload-bmg-data", "contents"),
         Input("upload-bmg-data", "filename"),
         Input("upload-bmg-data", "last_modified"),
         State("user-uuid", "data"),
-    )(functools.partial(upload_bmg_data, file_storage=file_storage))
+    )(functools.partial(upload_bmg_data, job_runner=job_runner))
+
+    callback(
+        Output("bmg-filenames", "children", allow_duplicate=True),
+        Output({"type": elements["BLOCKER"], "index": 0}, "data", allow_duplicate=True),
+        Output("bmg-job-interval", "disabled", allow_duplicate=True),
+        Input("bmg-job-interval", "n_intervals"),
+        State("bmg-job-key", "data"),
+        State("upload-bmg-data", "filename"),
+        State("user-uuid", "data"),
+        prevent_initial_call=True,
+    )(
+        functools.partial(
+            on_bmg_job_poll, file_storage=file_storage, job_runner=job_runner
+        )
+    )
 
     callback(
         Output("loaded-setings-screening", "data"),
@@ -1,9 +1,11 @@
 from dash import register_page
 
+from dashboard.data.jobs import shared_runner
 from dashboard.pages.builders import ProcessPageBuilder
 from dashboard.pages.screening.stages import STAGES
 
 from dashboard.pages.screening.callbacks import register_callbacks
+from dashboard.storage.caching import shared_storage
 from dashboard.storage.local import LocalFileStorage
 
 
@@ -22,6 +24,7 @@ STAGE_NAMES = [
 pb.add_stages(STAGES, STAGE_NAMES)
 layout = pb.build()
 
-file_storage = LocalFileStorage()
+file_storage = shared_storage()
+job_runner = shared_runner(LocalFileStorage.data_folder)
 
-register_callbacks(pb.elements, file_storage)
+register_callbacks(pb.elements, file_storage, job_runner)
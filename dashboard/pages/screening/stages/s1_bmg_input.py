@@ -73,6 +73,8 @@ BMG_INPUT_STAGE = html.Div(
             ],
             className="grid-2-1",
         ),
+        dcc.Store(id="bmg-job-key"),
+        dcc.Interval(id="bmg-job-interval", interval=500, disabled=True),
         html.Div(
             id="bmg-filenames",
         ),
@@ -1,2 +1,3 @@
 from .base import FileStorage
+from .caching import CachingFileStorage
 from .local import LocalFileStorage
@@ -0,0 +1,4 @@
+from .sessions import main
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,19 @@
 import abc
+import collections
+import contextlib
+import threading
+import typing
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# rows per parquet row group written by save_table, with rows sorted by plate
+# a row group spans a few plates and filters on plates skip the others
+ROW_GROUP_SIZE = 2**14
+
+_session_locks = collections.defaultdict(threading.Lock)
+_session_locks_lock = threading.Lock()
 
 
 class FileStorage(abc.ABC):
@@ -9,3 +24,97 @@ class FileStorage(abc.ABC):
     @abc.abstractmethod
     def save_file(self, name: str, content: bytes) -> None:
         ...
+
+    def read_buffer(self, name: str) -> pa.Buffer:
+        """
+        Read a file as an arrow buffer, which parquet readers, np.frombuffer and
+        memoryview consume without copying. Storages able to map files return
+        them without reading them into memory.
+
+        :param name: name of the file
+        :return: buffer with the content of the file
+        """
+        return pa.py_buffer(self.read_file(name))
+
+    def file_version(self, name: str) -> typing.Hashable | None:
+        """
+        Get a value that changes whenever the file is written
+
+        :param name: name of the file
+        :return: version of the file, None if the storage does not track versions
+        """
+        return None
+
+    @contextlib.contextmanager
+    def session_lock(self, session: str) -> typing.Iterator[None]:
+        """
+        Hold the lock of a session while reading, modifying and saving its files.
+        Storages shared by several processes lock across them, this default only
+        serializes the threads of this process.
+
+        :param session: session uuid
+        """
+        with _session_locks_lock:
+            lock = _session_locks[session]
+        with lock:
+            yield
+
+    def read_parquet(self, name: str) -> pd.DataFrame:
+        """
+        Read a dataframe saved as parquet
+
+        :param name: name of the file
+        :return: decoded dataframe
+        """
+        return pd.read_parquet(pa.BufferReader(self.read_buffer(name)))
+
+    def read_table(
+        self,
+        name: str,
+        columns: list[str] | None = None,
+        filters: list[tuple] | list[list[tuple]] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Read selected columns and rows of a dataframe saved as parquet. Only the
+        selected columns are decoded and row groups whose statistics rule out
+        the filters are skipped.
+
+        :param name: name of the file
+        :param columns: columns to read, None for all
+        :param filters: pyarrow filters, e.g. [("plate", "in", plates)], a list
+            of lists of them is a disjunction
+        :return: decoded dataframe
+        """
+        return pd.read_parquet(
+            pa.BufferReader(self.read_buffer(name)), columns=columns, filters=filters
+        )
+
+    def save_table(
+        self,
+        name: str,
+        df: pd.DataFrame,
+        sort_by: str | list[str] | None = None,
+        row_group_size: int = ROW_GROUP_SIZE,
+    ) -> None:
+        """
+        Save a dataframe as parquet in row groups, so that read_table reads them
+        selectively
+
+        :param name: name of the file
+        :param df: dataframe to save
+        :param sort_by: columns to sort rows by, keeping the order of equal rows
+        :param row_group_size: number of rows per row group
+        """
+        if sort_by is not None:
+            df = df.sort_values(sort_by, kind="stable")
+        self.save_file(name, df.to_parquet(row_group_size=row_group_size))
+
+    def read_npz(self, name: str) -> dict[str, np.ndarray]:
+        """
+        Read arrays saved as npz
+
+        :param name: name of the file
+        :return: array name -> decoded array
+        """
+        with np.load(pa.BufferReader(self.read_buffer(name))) as npz:
+            return dict(npz)
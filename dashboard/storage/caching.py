@@ -0,0 +1,165 @@
+import collections
+import os
+import threading
+import typing
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .base import FileStorage
+from .local import LocalFileStorage
+
+# default memory budget of decoded artifacts kept by one CachingFileStorage; the
+# pages share one per server process, see `shared_storage`
+CACHE_MAX_BYTES = int(os.environ.get("DRUG_SCREENING_CACHE_MB", 256)) * 2**20
+
+_shared_storage = None
+_shared_storage_lock = threading.Lock()
+
+
+class CachingFileStorage(FileStorage):
+    """
+    FileStorage decorator keeping decoded dataframes and arrays in memory. Entries
+    are keyed by file name and version, evicted least recently used first once
+    they take more than max_bytes, and dropped when the file is saved through
+    this storage. The version comes from the wrapped storage when it tracks one,
+    so files rewritten elsewhere (another worker) are decoded again.
+    """
+
+    def __init__(self, storage: FileStorage, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        """
+        :param storage: wrapped storage
+        :param max_bytes: memory budget of the cached values
+        """
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cached_bytes = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._writes = collections.Counter()
+
+    def read_file(self, name: str) -> bytes:
+        return self.storage.read_file(name)
+
+    def read_buffer(self, name: str) -> pa.Buffer:
+        return self.storage.read_buffer(name)
+
+    def save_file(self, name: str, content: bytes) -> None:
+        self.storage.save_file(name, content)
+        with self._lock:
+            self._writes[name] += 1
+            for kind in ("parquet", "npz"):
+                self._discard((name, kind))
+
+    def file_exists(self, name: str) -> bool:
+        return self.storage.file_exists(name)
+
+    def file_version(self, name: str) -> typing.Hashable | None:
+        return self.storage.file_version(name)
+
+    def session_lock(self, session: str) -> typing.ContextManager[None]:
+        return self.storage.session_lock(session)
+
+    def read_parquet(self, name: str) -> pd.DataFrame:
+        # a shallow copy is safe with copy-on-write, enabled by the app, writes
+        # never reach the cached frame
+        df = self._cached(name, "parquet", super().read_parquet)
+        return df.copy(deep=False)
+
+    def read_table(
+        self,
+        name: str,
+        columns: list[str] | None = None,
+        filters: list[tuple] | list[list[tuple]] | None = None,
+    ) -> pd.DataFrame:
+        # filtered reads are rarely repeated with the same filters
+        return self.storage.read_table(name, columns=columns, filters=filters)
+
+    def read_npz(self, name: str) -> dict[str, np.ndarray]:
+        arrays = self._cached(name, "npz", self._read_readonly_npz)
+        return dict(arrays)
+
+    def stats(self) -> dict[str, int]:
+        """
+        :return: counters of the cache
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.cached_bytes,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+
+    def _read_readonly_npz(self, name: str) -> dict[str, np.ndarray]:
+        arrays = super().read_npz(name)
+        for array in arrays.values():
+            array.flags.writeable = False
+        return arrays
+
+    def _cached(
+        self, name: str, kind: str, read: typing.Callable[[str], typing.Any]
+    ) -> typing.Any:
+        key = (name, kind)
+        with self._lock:
+            version = (self._writes[name], self.storage.file_version(name))
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # decode outside of the lock, concurrent misses of one file are rare
+        value = read(name)
+        size = _size_of(value)
+        with self._lock:
+            if version[0] != self._writes[name]:
+                # saved while decoding, the value may already be stale
+                return value
+            self._discard(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (version, value, size)
+                self.cached_bytes += size
+                while self.cached_bytes > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+                    self.evictions += 1
+        return value
+
+    def _discard(self, key: tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.cached_bytes -= entry[2]
+
+
+def _size_of(value: pd.DataFrame | dict[str, np.ndarray]) -> int:
+    """
+    Estimate memory taken by a decoded artifact
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return sum(array.nbytes for array in value.values())
+
+
+def shared_storage() -> CachingFileStorage:
+    """
+    Get the caching storage of the local data folder, created once per process,
+    so that all pages keep their artifacts within one memory budget
+
+    :return: shared caching storage
+    """
+    global _shared_storage
+    with _shared_storage_lock:
+        if _shared_storage is None:
+            _shared_storage = CachingFileStorage(LocalFileStorage())
+        return _shared_storage
@@ -1,12 +1,24 @@
+import contextlib
 import os
 import pathlib
 import typing
+import uuid
+
+import pandas as pd
+import pyarrow as pa
 
 from .base import FileStorage
+from .sessions import LOCK_DIRECTORY, SessionLifecycle, session_of
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
 
 
 class LocalFileStorage(FileStorage):
     data_folder: typing.ClassVar[pathlib.Path | str]
+    session_lifecycle: typing.ClassVar[SessionLifecycle | None] = None
 
     @classmethod
     def set_data_folder(cls, data_folder: pathlib.Path | str) -> None:
@@ -18,17 +30,95 @@ class LocalFileStorage(FileStorage):
             os.makedirs(data_folder)
         cls.data_folder = data_folder
 
+    @classmethod
+    def set_session_lifecycle(cls, session_lifecycle: SessionLifecycle | None) -> None:
+        cls.session_lifecycle = session_lifecycle
+
+    def _touch(self, name: str) -> None:
+        if self.session_lifecycle is not None:
+            self.session_lifecycle.touch(name)
+
     def read_file(self, name: str) -> bytes:
         if not hasattr(self, "data_folder"):
             raise ValueError("data_folder is not set")
+        self._touch(name)
         with open(self.data_folder / name, "rb") as f:
             return f.read()
 
+    def read_buffer(self, name: str) -> pa.Buffer:
+        if not hasattr(self, "data_folder"):
+            raise ValueError("data_folder is not set")
+        self._touch(name)
+        # the buffer keeps the mapping alive after the file is closed
+        with pa.memory_map(str(self.data_folder / name), "r") as source:
+            return source.read_buffer()
+
+    def read_table(
+        self,
+        name: str,
+        columns: list[str] | None = None,
+        filters: list[tuple] | list[list[tuple]] | None = None,
+    ) -> pd.DataFrame:
+        if not hasattr(self, "data_folder"):
+            raise ValueError("data_folder is not set")
+        self._touch(name)
+        # reading from the path lets pyarrow fetch only the selected column chunks
+        return pd.read_parquet(
+            self.data_folder / name, columns=columns, filters=filters
+        )
+
     def save_file(self, name: str, content: bytes) -> None:
         if not hasattr(self, "data_folder"):
             raise ValueError("data_folder is not set")
-        with open(self.data_folder / name, "wb") as f:
-            f.write(content)
+        # readers of other processes see either the old or the new file, never
+        # a partial one, and mapped buffers of the old file stay valid
+        temp_path = self.data_folder / f".{name}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.data_folder / name)
+        finally:
+            temp_path.unlink(missing_ok=True)
+        self._touch(name)
+
+    def file_version(self, name: str) -> tuple[int, int, int]:
+        if not hasattr(self, "data_folder"):
+            raise ValueError("data_folder is not set")
+        # cached reads only ask for the version, so they count as accesses too
+        self._touch(name)
+        stat = os.stat(self.data_folder / name)
+        # every write replaces the file, the inode tells writes apart even when
+        # they fall within the resolution of the modification time
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextlib.contextmanager
+    def session_lock(self, session: str) -> typing.Iterator[None]:
+        """
+        Hold an advisory lock of a session, exclusive across the threads and
+        processes sharing the data folder
+
+        :param session: session uuid
+        """
+        if not hasattr(self, "data_folder"):
+            raise ValueError("data_folder is not set")
+        if session_of(f"{session}_") != session:
+            raise ValueError(f"{session} is not a session uuid")
+        if fcntl is None:
+            with super().session_lock(session):
+                yield
+            return
+        lock_folder = self.data_folder / LOCK_DIRECTORY
+        lock_folder.mkdir(exist_ok=True)
+        # flock locks belong to the open file, so threads opening the file
+        # separately exclude each other as well
+        with open(lock_folder / f"{session}.lock", "ab") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
     def file_exists(self, name) -> bool:
         if not hasattr(self, "data_folder"):
@@ -0,0 +1,362 @@
+import argparse
+import logging
+import os
+import pathlib
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# session artifacts are named "{session uuid}_{artifact}" and their unfinished
+# writes ".{session uuid}_{artifact}.{random}.tmp", other files and all
+# directories (fingerprints, embeddings, jobs) are shared by the sessions
+SESSION_FILE_PATTERN = re.compile(
+    r"^\.?([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})_"
+)
+# directory of the last access index, one empty marker file per session whose
+# modification time is the last access, shared by all server processes
+INDEX_DIRECTORY = ".sessions"
+# directory of the advisory lock files, one per session
+LOCK_DIRECTORY = ".locks"
+# shared directories of job files, recomputed when missing; their files unused for
+# the TTL are deleted by the sweeper ("projections" held jobs of older versions)
+EXPIRING_DIRECTORIES = ("jobs", "projections")
+# an access is recorded at most this often per session and process
+TOUCH_INTERVAL = 60
+SESSION_TTL = 7 * 24 * 3600
+# sessions accessed more recently are never evicted to fit the quota
+ACTIVE_GRACE = 15 * 60
+SWEEP_INTERVAL = 3600
+
+
+def session_of(name: str) -> str | None:
+    """
+    Find the session of a stored file
+
+    :param name: name of the file
+    :return: session uuid, None for files not belonging to a session
+    """
+    match = SESSION_FILE_PATTERN.match(name)
+    return match.group(1) if match else None
+
+
+@dataclass
+class SessionUsage:
+    """
+    Files of a session in the data folder
+    """
+
+    session: str
+    last_access: float
+    files: list[pathlib.Path] = field(default_factory=list)
+    size: int = 0
+
+
+@dataclass
+class SharedUsage:
+    """
+    Files of a directory shared by the sessions, e.g. the fingerprint store
+    """
+
+    directory: str
+    last_modified: float = 0.0
+    files: list[pathlib.Path] = field(default_factory=list)
+    size: int = 0
+
+
+class SessionLifecycle:
+    """
+    Tracks the last access of sessions and deletes their files once they are
+    older than the TTL or, oldest first, while all files of the data folder take
+    more than the quota. Shared directories count toward the quota, but only
+    top-level "{session uuid}_*" files and expired files of EXPIRING_DIRECTORIES
+    are ever deleted.
+    """
+
+    def __init__(
+        self,
+        data_folder: pathlib.Path | str,
+        ttl: float | None = SESSION_TTL,
+        max_bytes: int | None = None,
+        grace: float = ACTIVE_GRACE,
+    ) -> None:
+        """
+        :param data_folder: data folder of the file storage
+        :param ttl: seconds after the last access when a session expires,
+            None to keep sessions until they exceed the quota
+        :param max_bytes: quota of the session files and shared directories,
+            None for no quota
+        :param grace: seconds after the last access when a session may be evicted
+            to fit the quota
+        """
+        self.data_folder = pathlib.Path(data_folder)
+        self.index_folder = self.data_folder / INDEX_DIRECTORY
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self._touched = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def touch(self, name: str) -> None:
+        """
+        Record an access to a stored file
+
+        :param name: name of the file
+        """
+        session = session_of(name)
+        if session is None:
+            return
+        now = time.time()
+        if now - self._touched.get(session, 0) < TOUCH_INTERVAL:
+            return
+        self._touched[session] = now
+        self.index_folder.mkdir(exist_ok=True)
+        (self.index_folder / session).touch()
+
+    def usage(self) -> list[SessionUsage]:
+        """
+        Collect files and last access of every session
+
+        :return: sessions sorted from the least recently accessed
+        """
+        sessions = {}
+        with os.scandir(self.data_folder) as entries:
+            for entry in entries:
+                session = session_of(entry.name)
+                if session is None or not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                usage = sessions.setdefault(session, SessionUsage(session, 0.0))
+                usage.files.append(pathlib.Path(entry.path))
+                usage.size += stat.st_size
+                # writes are accesses too, also of sessions without a marker
+                usage.last_access = max(usage.last_access, stat.st_mtime)
+        for session, usage in sessions.items():
+            try:
+                marker_time = (self.index_folder / session).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            usage.last_access = max(usage.last_access, marker_time)
+        return sorted(sessions.values(), key=lambda usage: usage.last_access)
+
+    def shared_usage(self) -> list[SharedUsage]:
+        """
+        Collect files of the directories shared by the sessions
+
+        :return: shared directories sorted by name
+        """
+        shared = []
+        with os.scandir(self.data_folder) as entries:
+            for entry in entries:
+                if entry.name in (INDEX_DIRECTORY, LOCK_DIRECTORY):
+                    continue
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                usage = SharedUsage(entry.name)
+                for root, _, names in os.walk(entry.path):
+                    for name in names:
+                        path = pathlib.Path(root) / name
+                        try:
+                            stat = path.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+                        usage.files.append(path)
+                        usage.size += stat.st_size
+                        usage.last_modified = max(usage.last_modified, stat.st_mtime)
+                shared.append(usage)
+        return sorted(shared, key=lambda usage: usage.directory)
+
+    def sweep(self, now: float | None = None, dry_run: bool = False) -> list[str]:
+        """
+        Delete files of expired sessions and expired job files, then files of the
+        least recently accessed sessions until the data folder fits the quota
+
+        :param now: current time, defaults to the system time
+        :param dry_run: only find the sessions to delete
+        :return: deleted sessions
+        """
+        now = time.time() if now is None else now
+        expired_files = self._expired_shared_files(now)
+        shared_size = sum(usage.size for usage in self.shared_usage()) - sum(
+            size for _, size in expired_files
+        )
+        sessions = self.usage()
+        expired = [
+            usage
+            for usage in sessions
+            if self.ttl is not None and usage.last_access < now - self.ttl
+        ]
+        expired_sessions = {usage.session for usage in expired}
+        remaining = [
+            usage for usage in sessions if usage.session not in expired_sessions
+        ]
+        total = shared_size + sum(usage.size for usage in remaining)
+        evicted = []
+        for usage in remaining:
+            if self.max_bytes is None or total <= self.max_bytes:
+                break
+            if usage.last_access >= now - self.grace:
+                break
+            evicted.append(usage)
+            total -= usage.size
+
+        deleted = [usage.session for usage in expired + evicted]
+        if not dry_run:
+            for usage in expired + evicted:
+                self._delete(usage)
+            self._delete_orphan_markers(sessions, now)
+            for path, _ in expired_files:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            if expired_files:
+                logger.info("Deleted %d expired job files", len(expired_files))
+        return deleted
+
+    def start(self, interval: float = SWEEP_INTERVAL) -> None:
+        """
+        Start sweeping in a background thread
+
+        :param interval: seconds between sweeps
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name="session-sweeper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                deleted = self.sweep()
+                if deleted:
+                    logger.info("Deleted files of %d sessions", len(deleted))
+            except Exception:
+                logger.exception("Session sweep failed")
+            self._stop.wait(interval)
+
+    def _delete(self, usage: SessionUsage) -> None:
+        # other server processes may sweep the same session at once
+        for path in usage.files:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        for path in (
+            self.index_folder / usage.session,
+            self.data_folder / LOCK_DIRECTORY / f"{usage.session}.lock",
+        ):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._touched.pop(usage.session, None)
+
+    def _expired_shared_files(self, now: float) -> list[tuple[pathlib.Path, int]]:
+        if self.ttl is None:
+            return []
+        expired = []
+        for directory in EXPIRING_DIRECTORIES:
+            for root, _, names in os.walk(self.data_folder / directory):
+                for name in names:
+                    # lock files stay, processes may wait on them
+                    if name.endswith(".lock"):
+                        continue
+                    path = pathlib.Path(root) / name
+                    try:
+                        stat = path.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    if stat.st_mtime < now - self.ttl:
+                        expired.append((path, stat.st_size))
+        return expired
+
+    def _delete_orphan_markers(self, sessions: list[SessionUsage], now: float) -> None:
+        if self.ttl is None or not self.index_folder.exists():
+            return
+        with_files = {usage.session for usage in sessions}
+        for marker in self.index_folder.iterdir():
+            if marker.name in with_files:
+                continue
+            try:
+                if marker.stat().st_mtime < now - self.ttl:
+                    marker.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def main(args: list[str] | None = None) -> None:
+    """
+    Report disk usage per session or sweep sessions of the data folder
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m dashboard.storage",
+        description="Manage session files of the drug screening data folder",
+    )
+    parser.add_argument("command", choices=["report", "sweep"])
+    parser.add_argument(
+        "--data-dir",
+        default=os.environ.get("DRUG_SCREENING_DATA_DIR", ".drug-screening-data"),
+    )
+    parser.add_argument("--ttl-hours", type=float, default=SESSION_TTL / 3600)
+    parser.add_argument("--quota-gb", type=float, default=None)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only list sessions to delete"
+    )
+    options = parser.parse_args(args)
+
+    lifecycle = SessionLifecycle(
+        options.data_dir,
+        ttl=options.ttl_hours * 3600,
+        max_bytes=None if options.quota_gb is None else int(options.quota_gb * 2**30),
+    )
+    if options.command == "report":
+        sessions = lifecycle.usage()
+        print(f"{'SESSION':<38}{'FILES':>7}{'SIZE':>12}  LAST ACCESS")
+        for usage in reversed(sessions):
+            last_access = datetime.fromtimestamp(usage.last_access)
+            print(
+                f"{usage.session:<38}{len(usage.files):>7}"
+                f"{_format_size(usage.size):>12}  {last_access:%Y-%m-%d %H:%M}"
+            )
+        total = sum(usage.size for usage in sessions)
+        print(f"{len(sessions)} sessions, {_format_size(total)}")
+        shared = lifecycle.shared_usage()
+        print(f"\n{'SHARED DIRECTORY':<38}{'FILES':>7}{'SIZE':>12}  LAST MODIFIED")
+        for usage in shared:
+            last_modified = datetime.fromtimestamp(usage.last_modified)
+            print(
+                f"{usage.directory + '/':<38}{len(usage.files):>7}"
+                f"{_format_size(usage.size):>12}  {last_modified:%Y-%m-%d %H:%M}"
+            )
+        shared_total = sum(usage.size for usage in shared)
+        print(
+            f"{len(shared)} shared directories, {_format_size(shared_total)}; "
+            f"total {_format_size(total + shared_total)}"
+        )
+    else:
+        deleted = lifecycle.sweep(dry_run=options.dry_run)
+        action = "Would delete" if options.dry_run else "Deleted"
+        for session in deleted:
+            print(session)
+        print(f"{action} files of {len(deleted)} sessions")
@@ -0,0 +1,197 @@
+"""
+Per-session caches of rendered hit browser figures with neighbour prefetching.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Hashable, Iterable
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from rdkit import Chem
+
+from dashboard.data.lru_cache import LRUCache
+from dashboard.visualization.plots import plot_ic50, plot_smiles
+
+logger = logging.getLogger(__name__)
+
+IC50_KEY_FIELDS = ["EOS", "TOP", "BOTTOM", "ic50", "slope"]
+
+
+def _hashable_value(value: Any) -> Hashable:
+    """
+    Normalize a value so it can be used in a cache key (NaN is not equal to itself).
+
+    :param value: value to normalize
+    :return: hashable, comparable value
+    """
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def ic50_cache_key(entry: dict) -> tuple:
+    """
+    Build the IC50 figure cache key from a hit determination entry.
+
+    :param entry: hit determination row as a dict
+    :return: tuple of EOS, TOP, BOTTOM and fit parameters
+    """
+    return tuple(_hashable_value(entry[field]) for field in IC50_KEY_FIELDS)
+
+
+def canonical_smiles(smiles: str) -> str:
+    """
+    Canonicalize SMILES, falling back to the raw string for unparsable input.
+
+    :param smiles: SMILES string
+    :return: canonical SMILES
+    """
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        return smiles
+    return Chem.MolToSmiles(mol)
+
+
+class FigureCache:
+    """
+    LRU caches of IC50 figures and SVG depictions for a single session.
+    """
+
+    def __init__(self, max_figures: int = 64, max_depictions: int = 256) -> None:
+        """
+        :param max_figures: maximum number of cached IC50 figures
+        :param max_depictions: maximum number of cached SMILES depictions
+        """
+        self.figures = LRUCache(max_figures)
+        self.depictions = LRUCache(max_depictions)
+
+    def ic50_figure(self, entry: dict, x: np.ndarray, y: np.ndarray) -> go.Figure:
+        """
+        Get the IC50 figure for the entry, rendering it on a miss.
+
+        :param entry: hit determination row as a dict
+        :param x: concentrations
+        :param y: values
+        :return: IC50 figure
+        """
+        return self.figures.get_or_compute(
+            ic50_cache_key(entry), lambda: plot_ic50(entry, x, y)
+        )
+
+    def smiles_svg(self, smiles: str) -> str:
+        """
+        Get the SVG depiction of the SMILES, drawing it on a miss.
+
+        :param smiles: SMILES string
+        :return: svg with plot
+        """
+        return self.depictions.get_or_compute(
+            canonical_smiles(smiles), lambda: plot_smiles(smiles)
+        )
+
+    def clear(self) -> None:
+        self.figures.clear()
+        self.depictions.clear()
+
+
+def neighbour_compounds(
+    compounds: list[str], selected: str, distance: int = 1
+) -> list[str]:
+    """
+    Get compounds adjacent to the selected one in dropdown order.
+
+    :param compounds: compounds in dropdown order
+    :param selected: selected compound
+    :param distance: how many compounds to take on each side
+    :return: list of next and previous compounds
+    """
+    if not compounds or selected not in compounds:
+        return []
+    position = compounds.index(selected)
+    neighbours = []
+    for offset in range(1, distance + 1):
+        for index in (position + offset, position - offset):
+            if 0 <= index < len(compounds) and compounds[index] not in neighbours:
+                neighbours.append(compounds[index])
+    return neighbours
+
+
+class SessionFigureCaches:
+    """
+    Registry of per-session figure caches with a background prefetch worker.
+    """
+
+    def __init__(self, max_sessions: int = 32, prefetch_workers: int = 2) -> None:
+        """
+        :param max_sessions: maximum number of sessions holding a cache
+        :param prefetch_workers: number of background rendering threads
+        """
+        self._sessions = LRUCache(max_sessions)
+        self._executor = ThreadPoolExecutor(
+            max_workers=prefetch_workers, thread_name_prefix="figure-prefetch"
+        )
+
+    def get(self, session_id: str) -> FigureCache:
+        return self._sessions.get_or_compute(session_id, FigureCache)
+
+    def invalidate(self, session_id: str) -> None:
+        """
+        Drop the cached figures of a session, e.g. after new data is uploaded.
+
+        :param session_id: session uuid
+        """
+        self.get(session_id).clear()
+
+    def prefetch(
+        self,
+        session_id: str,
+        compounds: Iterable[str],
+        hit_df: pd.DataFrame,
+        screening_df: pd.DataFrame,
+        smiles_df: pd.DataFrame,
+    ) -> None:
+        """
+        Render figures of the given compounds in the background.
+
+        :param session_id: session uuid
+        :param compounds: compounds to render
+        :param hit_df: hit determination dataframe
+        :param screening_df: screening dataframe
+        :param smiles_df: dataframe mapping EOS to smiles
+        """
+        compounds = list(compounds)
+        if not compounds:
+            return
+        cache = self.get(session_id)
+        entries = hit_df[hit_df["EOS"].isin(compounds)].to_dict("records")
+        screening_subset = screening_df[screening_df["EOS"].isin(compounds)]
+        points = {
+            eos: (group["CONCENTRATION"].to_numpy(), group["VALUE"].to_numpy())
+            for eos, group in screening_subset.groupby("EOS")
+        }
+        smiles = smiles_df.loc[smiles_df["EOS"].isin(compounds), "smiles"].tolist()
+        self._executor.submit(_render_all, cache, entries, points, smiles)
+
+
+def _render_all(
+    cache: FigureCache,
+    entries: list[dict],
+    points: dict[str, tuple[np.ndarray, np.ndarray]],
+    smiles: list[str],
+) -> None:
+    # prefetch must never break the browser, failures are only logged
+    for entry in entries:
+        if entry["EOS"] in points:
+            try:
+                cache.ic50_figure(entry, *points[entry["EOS"]])
+            except Exception:
+                logger.exception("IC50 prefetch failed for %s", entry["EOS"])
+    for smiles_string in smiles:
+        try:
+            cache.smiles_svg(smiles_string)
+        except Exception:
+            logger.exception("SMILES prefetch failed for %s", smiles_string)
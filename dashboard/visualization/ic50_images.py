@@ -0,0 +1,151 @@
+"""
+Static IC50 curve images for exported reports.
+
+Images are drawn with matplotlib's Agg backend, which is much faster than exporting
+plotly figures through kaleido and can run in worker processes.
+"""
+
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, NullFormatter
+
+from dashboard.data.determination import four_param_logistic
+from dashboard.data.jobs import worker_context
+from dashboard.visualization.figure_cache import LRUCache, ic50_cache_key
+
+# NOTE: some of the values are hardcoded as there's a discrepancy in the Image and xlsxwritter scale
+IMG_WIDTH = 285
+IMG_HEIGHT = 145
+IMG_DPI = 100
+
+# below this many images the process pool startup costs more than it saves
+MIN_PARALLEL_IMAGES = 32
+
+IMAGE_CACHE = LRUCache(max_size=5000)
+
+
+def group_screening_points(
+    screening_df: pd.DataFrame,
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    Split the screening dataframe into measured points per EOS in a single pass.
+
+    :param screening_df: screening dataframe
+    :return: dictionary mapping EOS to concentrations and values
+    """
+    return {
+        eos: (group["CONCENTRATION"].to_numpy(), group["VALUE"].to_numpy())
+        for eos, group in screening_df.groupby("EOS", sort=False)
+    }
+
+
+def render_ic50_png(
+    fit_params: tuple[float, float, float, float], x: np.ndarray, y: np.ndarray
+) -> bytes:
+    """
+    Draw the IC50 plot as a png, mirroring `plot_ic50` without the legend.
+
+    :param fit_params: TOP, BOTTOM, ic50 and slope of the fitted curve
+    :param x: concentrations
+    :param y: values
+    :return: png image bytes
+    """
+    top, bottom, ic50, slope = fit_params
+    fig = Figure(figsize=(IMG_WIDTH / IMG_DPI, IMG_HEIGHT / IMG_DPI), dpi=IMG_DPI)
+    ax = fig.add_subplot()
+    ax.scatter(x, y, s=6, color="blue", zorder=3)
+    if not pd.isnull(slope):
+        fit_x = np.logspace(np.log10(x.min()), np.log10(x.max()), 100)
+        fit_y = four_param_logistic(fit_x, bottom, top, ic50, slope)
+        ax.plot(fit_x, fit_y, color="red", linewidth=1)
+        ax.scatter(
+            [ic50],
+            [four_param_logistic(ic50, bottom, top, ic50, slope)],
+            s=20,
+            color="red",
+            marker="D",
+            zorder=4,
+        )
+    ax.set_xscale("log")
+    # plain tick labels, the default mathtext ones dominate the rendering time
+    ax.xaxis.set_major_formatter(FuncFormatter(lambda value, _: f"{value:g}"))
+    ax.xaxis.set_minor_formatter(NullFormatter())
+    ax.set_xlabel("Concentration [uM]", fontsize=6)
+    ax.set_ylabel("% Modulation", fontsize=6)
+    ax.tick_params(labelsize=5)
+    ax.grid(True, color="#ebebeb", linewidth=0.5)
+    fig.subplots_adjust(left=0.15, right=0.98, top=0.96, bottom=0.22)
+
+    stream = io.BytesIO()
+    fig.savefig(stream, format="png")
+    return stream.getvalue()
+
+
+def _render_chunk(tasks: list[tuple]) -> list[bytes]:
+    return [render_ic50_png(*task) for task in tasks]
+
+
+def _image_cache_key(entry: dict, x: np.ndarray, y: np.ndarray) -> tuple:
+    points_digest = hashlib.blake2b(
+        np.ascontiguousarray(x).tobytes() + np.ascontiguousarray(y).tobytes(),
+        digest_size=16,
+    ).hexdigest()
+    return ic50_cache_key(entry) + (points_digest,)
+
+
+def render_ic50_images(
+    entries: list[dict],
+    points: dict[str, tuple[np.ndarray, np.ndarray]],
+    max_workers: int | None = None,
+) -> list[bytes | None]:
+    """
+    Get IC50 png images for the hit determination entries. Cached images are reused,
+    the missing ones are rendered in a process pool.
+
+    :param entries: hit determination rows as dicts
+    :param points: measured points per EOS, see `group_screening_points`
+    :param max_workers: number of worker processes, defaults to cpu count
+    :return: list of png bytes aligned with entries (None if EOS has no points)
+    """
+    images = [None] * len(entries)
+    keys, tasks, positions = [], [], []
+    for i, entry in enumerate(entries):
+        if entry["EOS"] not in points:
+            continue
+        x, y = points[entry["EOS"]]
+        key = _image_cache_key(entry, x, y)
+        cached = IMAGE_CACHE.get(key)
+        if cached is not None:
+            images[i] = cached
+            continue
+        fit_params = (entry["TOP"], entry["BOTTOM"], entry["ic50"], entry["slope"])
+        keys.append(key)
+        tasks.append((fit_params, x, y))
+        positions.append(i)
+
+    if len(tasks) < MIN_PARALLEL_IMAGES:
+        rendered = _render_chunk(tasks)
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        chunk_size = max(1, -(-len(tasks) // (max_workers * 4)))
+        chunks = [
+            tasks[start : start + chunk_size]
+            for start in range(0, len(tasks), chunk_size)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=worker_context()
+        ) as executor:
+            rendered = [
+                png for chunk in executor.map(_render_chunk, chunks) for png in chunk
+            ]
+
+    for key, position, png in zip(keys, positions, rendered):
+        IMAGE_CACHE.put(key, png)
+        images[position] = png
+    return images
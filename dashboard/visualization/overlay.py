@@ -20,7 +20,10 @@ def projection_plot_overlay_controls(
     :return: plotly express scatter plot with control values
     """
     fig_controls = go.Figure(fig)
-    fig_controls.update_traces(marker={"opacity": 0.6})
+    # binned projections are heatmaps, which have no markers
+    fig_controls.update_traces(
+        marker={"opacity": 0.6}, selector=lambda trace: "marker" in trace
+    )
     overlay_func = fig_controls.add_scatter
     if plot_3d:
         overlay_func = fig_controls.add_scatter3d
@@ -1,4 +1,4 @@
-from itertools import product
+from itertools import cycle, product
 
 import numpy as np
 import pandas as pd
@@ -13,84 +13,292 @@ from dashboard.data.determination import four_param_logistic
 from dashboard.visualization.overlay import projection_plot_overlay_controls
 
 PLOTLY_TEMPLATE = "plotly_white"
+# projections with more points are drawn with WebGL instead of SVG
+WEBGL_MIN_POINTS = 5000
+# projections with more points in view are binned into a heatmap (3D: sampled),
+# which bounds the size of the figure sent to the browser
+MAX_PLOT_POINTS = 100_000
+DENSITY_BINS = 200
+# activity colours and cluster symbols of the SMILES projection, "x" marks outliers
+CLUSTER_ACTIVITY_COLORS = ["#009E73", "#F0E442", "#56B4E9"]
+CLUSTER_SYMBOLS = ["circle", "diamond", "square", "cross"]
+
+
+def projection_density(
+    x: np.ndarray,
+    y: np.ndarray,
+    values: np.ndarray | None = None,
+    x_range: tuple[float, float] | None = None,
+    y_range: tuple[float, float] | None = None,
+    bins: int = DENSITY_BINS,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Aggregate points of a projection into a grid of bins.
+
+    :param x: x coordinates of the points
+    :param y: y coordinates of the points
+    :param values: values of the points to average per bin, None to count points
+    :param x_range: binned range of x, defaults to the range of the points
+    :param y_range: binned range of y, defaults to the range of the points
+    :param bins: number of bins along each axis
+    :return: centers of the x and y bins, mean value (or count) and count of points
+        per bin of shape (bins, bins) indexed by y then x, NaN for empty bins
+    """
+    x_range = x_range or ((x.min(), x.max()) if len(x) else (0.0, 1.0))
+    y_range = y_range or ((y.min(), y.max()) if len(y) else (0.0, 1.0))
+    histogram_range = [sorted(x_range), sorted(y_range)]
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins, range=histogram_range)
+    if values is None:
+        z = np.where(counts > 0, counts, np.nan)
+    else:
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        sums, _, _ = np.histogram2d(
+            x[finite],
+            y[finite],
+            bins=bins,
+            range=histogram_range,
+            weights=values[finite],
+        )
+        finite_counts, _, _ = np.histogram2d(
+            x[finite], y[finite], bins=bins, range=histogram_range
+        )
+        z = np.divide(
+            sums, finite_counts, out=np.full_like(sums, np.nan), where=finite_counts > 0
+        )
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return x_centers, y_centers, z.T, counts.T
+
+
+def _in_view(
+    df: pd.DataFrame,
+    projection_x: str,
+    projection_y: str,
+    x_range: tuple[float, float] | None,
+    y_range: tuple[float, float] | None,
+) -> pd.DataFrame:
+    """
+    Select points of a projection inside the viewport, numbering all points first,
+    so that selections of the plot map back to rows of the dataframe.
+    """
+    df = df.assign(row=np.arange(len(df)))
+    mask = np.ones(len(df), dtype=bool)
+    if x_range is not None:
+        mask &= df[projection_x].between(*sorted(x_range)).to_numpy()
+    if y_range is not None:
+        mask &= df[projection_y].between(*sorted(y_range)).to_numpy()
+    return df if mask.all() else df[mask]
+
+
+def _density_heatmap(
+    df: pd.DataFrame,
+    projection_x: str,
+    projection_y: str,
+    values: np.ndarray | None,
+    value_label: str,
+    x_range: tuple[float, float] | None,
+    y_range: tuple[float, float] | None,
+) -> go.Heatmap:
+    """
+    Construct a heatmap of binned points of a projection, its size does not depend
+    on the number of points.
+    """
+    x_centers, y_centers, z, counts = projection_density(
+        df[projection_x].to_numpy(),
+        df[projection_y].to_numpy(),
+        values,
+        x_range,
+        y_range,
+    )
+    return go.Heatmap(
+        x=x_centers,
+        y=y_centers,
+        z=z,
+        customdata=counts,
+        coloraxis="coloraxis",
+        hoverongaps=False,
+        hovertemplate="X: %{x:.2f}<br>Y: %{y:.2f}<br>"
+        + value_label
+        + ": %{z:.2f}<br>Compounds: %{customdata:.0f}<extra></extra>",
+    )
+
+
+def _sample_points(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """
+    Select a fixed random sample of points, keeping their order.
+    """
+    if len(df) <= max_points:
+        return df
+    rng = np.random.default_rng(0)
+    return df.iloc[np.sort(rng.choice(len(df), size=max_points, replace=False))]
+
+
+def _projection_layout(fig: go.Figure) -> go.Figure:
+    fig.update_yaxes(title_standoff=15, automargin=True)
+    fig.update_xaxes(title_standoff=30, automargin=True)
+    fig.update_layout(
+        modebar=dict(orientation="v"),
+        margin=dict(r=35, l=15, b=0),
+        title_x=0.5,
+        coloraxis_colorbar=dict(orientation="h", thickness=15),
+        template=PLOTLY_TEMPLATE,
+    )
+    return fig
+
+
+def viewport_ranges(
+    relayout_data: dict | None,
+) -> tuple[tuple[float, float] | None, tuple[float, float] | None] | None:
+    """
+    Read the viewport of a 2D plot from its relayout data.
+
+    :param relayout_data: relayout data of the plot
+    :return: x and y range, None for an axis showing all points;
+        None if the relayout did not change the axes
+    """
+    if not relayout_data or not any(
+        key.startswith(("xaxis.", "yaxis.")) for key in relayout_data
+    ):
+        return None
+    ranges = []
+    for axis in ("xaxis", "yaxis"):
+        if f"{axis}.range[0]" in relayout_data:
+            ranges.append(
+                (relayout_data[f"{axis}.range[0]"], relayout_data[f"{axis}.range[1]"])
+            )
+        elif f"{axis}.range" in relayout_data:
+            ranges.append(tuple(relayout_data[f"{axis}.range"]))
+        else:
+            ranges.append(None)
+    return tuple(ranges)
+
+
+def selected_rows(selection: dict) -> list[int]:
+    """
+    Find dataframe rows of points selected on a projection plot. Points without
+    a row in customdata (e.g. of the controls overlay) are skipped.
+
+    :param selection: selected data of the plot
+    :return: row numbers of the plotted dataframe
+    """
+    return [
+        point["customdata"][0] for point in selection["points"] if "customdata" in point
+    ]
 
 
 def plot_projection_2d(
     df: pd.DataFrame,
     feature: str,
     projection: str = "pca",
+    max_points: int = MAX_PLOT_POINTS,
+    x_range: tuple[float, float] | None = None,
+    y_range: tuple[float, float] | None = None,
 ) -> go.Figure:
     """
     Plot selected projection and colour points with respect to selected feature.
+    Large data is drawn with WebGL, above max_points in view the points are binned
+    into a heatmap of mean feature values instead.
 
     :param df: DataFrame to be visualized
     :param feature: name of the column with respect to which the plot will be coloured
     :param projection: name of projection to be visualized
-    :param width: plot's width
-    :param height: plot's height
+    :param max_points: maximal number of points in view drawn as points
+    :param x_range: viewport range of x, None for all points
+    :param y_range: viewport range of y, None for all points
     :return: plotly express scatter plot
     """
     projection_x = f"{projection.upper()}_X"
     projection_y = f"{projection.upper()}_Y"
     feature_processed = feature.replace("_", " ").upper()
-    fig = px.scatter(
-        df,
-        x=projection_x,
-        y=projection_y,
-        color=df[feature],
-        range_color=[0, df[feature].max()],
-        labels={
-            projection_x: "X",
-            projection_y: "Y",
-            "EOS": "ID",
-            feature: feature_processed,
-        },
-        title=f"{projection.upper()} projection with respect to {feature_processed}",
-        hover_data={
-            "EOS": True,
-            projection_x: ":.2f",
-            projection_y: ":.2f",
-            feature: ":.2f",
-        },
-    )
+    title = f"{projection.upper()} projection with respect to {feature_processed}"
+    view_df = _in_view(df, projection_x, projection_y, x_range, y_range)
+
+    if len(view_df) > max_points:
+        fig = go.Figure(
+            _density_heatmap(
+                view_df,
+                projection_x,
+                projection_y,
+                view_df[feature].to_numpy(),
+                feature_processed,
+                x_range,
+                y_range,
+            )
+        )
+        fig.update_layout(
+            title=f"{title} ({len(view_df):,} compounds binned, zoom in for points)",
+            xaxis_title="X",
+            yaxis_title="Y",
+            coloraxis=dict(
+                cmin=0,
+                cmax=df[feature].max(),
+                colorbar_title_text=feature_processed,
+            ),
+        )
+    else:
+        fig = px.scatter(
+            view_df,
+            x=projection_x,
+            y=projection_y,
+            color=view_df[feature],
+            range_color=[0, df[feature].max()],
+            labels={
+                projection_x: "X",
+                projection_y: "Y",
+                "EOS": "ID",
+                feature: feature_processed,
+            },
+            title=title,
+            hover_data={
+                "EOS": True,
+                projection_x: ":.2f",
+                projection_y: ":.2f",
+                feature: ":.2f",
+            },
+            custom_data=["row"],
+            render_mode="webgl" if len(view_df) > WEBGL_MIN_POINTS else "svg",
+        )
+        fig.update_traces(marker={"size": 8})
 
-    fig.update_traces(marker={"size": 8})
-    fig.update_yaxes(title_standoff=15, automargin=True)
-    fig.update_xaxes(title_standoff=30, automargin=True)
-    fig.update_layout(
-        modebar=dict(orientation="v"),
-        margin=dict(r=35, l=15, b=0),
-        title_x=0.5,
-        coloraxis_colorbar=dict(orientation="h", thickness=15),
-        template=PLOTLY_TEMPLATE,
-    )
-    return fig
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    if y_range is not None:
+        fig.update_yaxes(range=list(y_range))
+    return _projection_layout(fig)
 
 
 def plot_projection_3d(
     df: pd.DataFrame,
     feature: str,
     projection: str = "pca",
+    max_points: int = MAX_PLOT_POINTS,
 ) -> go.Figure:
     """
     Plot selected projection and colour points with respect to selected feature in 3D.
-    Expects dataframe has projection features X, Y and Z.
+    Expects dataframe has projection features X, Y and Z. Above max_points only
+    a random sample of them is drawn.
 
     :param df: DataFrame to be visualized
     :param feature: name of the column with respect to which the plot will be coloured
     :param projection: type of the projection, defaults to "pca"
+    :param max_points: maximal number of drawn points
     :return: plotly express 3d scatter plot
     """
     projection_x = f"{projection.upper()}_X"
     projection_y = f"{projection.upper()}_Y"
     projection_z = f"{projection.upper()}_Z"
     feature_processed = feature.replace("_", " ").upper()
+    title = f"{projection.upper()} projection with respect to {feature_processed}"
+    if len(df) > max_points:
+        title += f" (sample of {max_points:,} from {len(df):,} compounds)"
+    sample_df = _sample_points(df.assign(row=np.arange(len(df))), max_points)
     fig = px.scatter_3d(
-        df,
+        sample_df,
         x=projection_x,
         y=projection_y,
         z=projection_z,
-        color=df[feature],
+        color=sample_df[feature],
         range_color=[0, df[feature].max()],
         labels={
             projection_x: "X",
@@ -99,7 +307,7 @@ def plot_projection_3d(
             "EOS": "ID",
             feature: feature_processed,
         },
-        title=f"{projection.upper()} projection with respect to {feature_processed}",
+        title=title,
         hover_data={
             "EOS": True,
             projection_x: ":.3f",
@@ -107,19 +315,11 @@ def plot_projection_3d(
             projection_z: ":.3f",
             feature: ":.3f",
         },
+        custom_data=["row"],
     )
 
     fig.update_traces(marker={"size": 8})
-    fig.update_yaxes(title_standoff=15, automargin=True)
-    fig.update_xaxes(title_standoff=30, automargin=True)
-    fig.update_layout(
-        modebar=dict(orientation="v"),
-        margin=dict(r=35, l=15, b=0),
-        title_x=0.5,
-        coloraxis_colorbar=dict(orientation="h", thickness=15),
-        template=PLOTLY_TEMPLATE,
-    )
-    return fig
+    return _projection_layout(fig)
 
 
 def make_projection_plot(
@@ -129,6 +329,8 @@ def make_projection_plot(
     projection_type: str,
     show_controls: bool = False,
     plot_3d: bool = False,
+    x_range: tuple[float, float] | None = None,
+    y_range: tuple[float, float] | None = None,
 ) -> go.Figure:
     """
     Construct a scatterplot from a dataframe.
@@ -138,6 +340,8 @@ def make_projection_plot(
     :param projection_type: projection type
     :param show_controls: whether to show controls
     :param plot_3d: whether to plot in 3d
+    :param x_range: viewport range of x of the 2d plot, None for all points
+    :param y_range: viewport range of y of the 2d plot, None for all points
     :return: dcc Graph element containing the plot
     """
     if projection_type.lower() not in ["pca", "umap"]:
@@ -149,12 +353,18 @@ def make_projection_plot(
     if projection_type.lower() == "umap" and plot_3d:
         projection_type = "umap3d"
 
-    plotting_function = plot_projection_3d if plot_3d else plot_projection_2d
-    figure = plotting_function(
-        projection_df,
-        colormap_feature,
-        projection=projection_type,
-    )
+    if plot_3d:
+        figure = plot_projection_3d(
+            projection_df, colormap_feature, projection=projection_type
+        )
+    else:
+        figure = plot_projection_2d(
+            projection_df,
+            colormap_feature,
+            projection=projection_type,
+            x_range=x_range,
+            y_range=y_range,
+        )
 
     if show_controls:
         default_style = {
@@ -750,16 +960,28 @@ def plot_clustered_smiles(
     feature: str = "activity_final",
     projection: str = "PCA",
     plot_3d: bool = False,
+    clustering: str | None = None,
+    max_points: int = MAX_PLOT_POINTS,
+    x_range: tuple[float, float] | None = None,
+    y_range: tuple[float, float] | None = None,
 ) -> go.Figure:
     """
     Plot selected projection and colour points with respect to selected feature.
+    Points are drawn as one WebGL trace per feature value with clusters marked by
+    symbols. Above max_points in view the 2D plot bins the points into a heatmap
+    of the share of active compounds, the 3D plot draws a random sample.
 
     :param df: DataFrame to be visualized
     :param feature: name of the column with respect to which the plot will be coloured
     :param projection: name of projection to be visualized
     :param plot_3d: if True, plot 3D projection
+    :param clustering: name of clustering marked with symbols (e.g. "Butina"),
+        if None clusters of the projection are used
+    :param max_points: maximal number of points in view drawn as points
+    :param x_range: viewport range of x of the 2D plot, None for all points
+    :param y_range: viewport range of y of the 2D plot, None for all points
 
-    :return: plotly express scatter plot
+    :return: plotly scatter plot
     """
     if projection.lower() not in ["pca", "umap"]:
         raise ValueError(
@@ -772,65 +994,115 @@ def plot_clustered_smiles(
 
     projection_x = f"{projection.upper()}_X"
     projection_y = f"{projection.upper()}_Y"
+    projection_z = f"{projection.upper()}_Z"
     clusters = f"cluster_{projection.upper()}"
-    labels = {
-        projection_x: "X",
-        projection_y: "Y",
-        "EOS": "EOS",
-        feature: "Activity",
-        clusters: "Cluster",
-    }
-    hover_data = {
-        "EOS": True,
-        projection_x: ":.3f",
-        projection_y: ":.3f",
-        feature: True,
-        clusters: True,
-    }
-    extra_args = {}
-    plot_func = px.scatter
+    if clustering is not None and f"cluster_{clustering}" in df.columns:
+        clusters = f"cluster_{clustering}"
+    title = f"{projection.upper()} projection of SMILES with respect to activity"
+
     if plot_3d:
-        projection_z = f"{projection.upper()}_Z"
-        labels[projection_z] = "Z"
-        hover_data[projection_z] = ":.3f"
-        extra_args["z"] = projection_z
-        plot_func = px.scatter_3d
-
-    fig = plot_func(
-        df[df[clusters] != "outlier"],
-        x=projection_x,
-        y=projection_y,
-        color=feature,
-        color_discrete_sequence=["#009E73", "#F0E442", "#56B4E9"],
-        symbol=clusters,
-        opacity=0.7,
-        labels=labels,
-        title=f"{projection.upper()} projection of SMILES with respect to activity",
-        hover_data=hover_data,
-        **extra_args,
-    )
-    fig.add_traces(
-        plot_func(
-            df[df[clusters] == "outlier"],
-            x=projection_x,
-            y=projection_y,
-            labels=labels,
-            hover_data=hover_data,
-            **extra_args,
+        view_df = df.assign(row=np.arange(len(df)))
+        if len(view_df) > max_points:
+            title += f" (sample of {max_points:,} from {len(df):,} compounds)"
+            view_df = _sample_points(view_df, max_points)
+    else:
+        view_df = _in_view(df, projection_x, projection_y, x_range, y_range)
+
+    fig = go.Figure()
+    if not plot_3d and len(view_df) > max_points:
+        fig.add_trace(
+            _density_heatmap(
+                view_df,
+                projection_x,
+                projection_y,
+                (view_df[feature] == "active").to_numpy(dtype=float),
+                "Active share",
+                x_range,
+                y_range,
+            )
         )
-        .update_traces(
-            marker_color="gray",
-            marker_symbol="x",
-            opacity=0.3,
-            name="outliers",
-            showlegend=True,
+        title += f" ({len(view_df):,} compounds binned, zoom in for points)"
+        fig.update_layout(
+            coloraxis=dict(
+                cmin=0, cmax=1, colorscale="Viridis", colorbar_title_text="Active"
+            )
         )
-        .data
-    )
+    else:
+        cluster_labels = view_df[clusters].astype(str).to_numpy()
+        cluster_codes, _ = pd.factorize(cluster_labels)
+        symbol_codes = cluster_codes % len(CLUSTER_SYMBOLS)
+        outlier = cluster_labels == "outlier"
+        hovertemplate = (
+            "EOS=%{customdata[1]}<br>X=%{x:.3f}<br>Y=%{y:.3f}<br>"
+            + ("Z=%{z:.3f}<br>" if plot_3d else "")
+            + "Activity=%{customdata[2]}<br>Cluster=%{customdata[3]}<extra></extra>"
+        )
+        customdata = np.column_stack(
+            [
+                view_df["row"].to_numpy(),
+                view_df["EOS"].to_numpy(),
+                view_df[feature].astype(str).to_numpy(),
+                cluster_labels,
+            ]
+        )
+        activity = view_df[feature].to_numpy()
+        # one trace per activity and symbol, per point symbols are slow to validate
+        groups = [
+            (str(value), (activity == value) & ~outlier, color, 0.7)
+            for value, color in zip(
+                pd.unique(activity[~outlier]), cycle(CLUSTER_ACTIVITY_COLORS)
+            )
+        ]
+        for name, group_mask, color, opacity in groups + [
+            ("outliers", outlier, "gray", 0.3)
+        ]:
+            symbol_masks = (
+                [("x", group_mask)]
+                if name == "outliers"
+                else [
+                    (symbol, group_mask & (symbol_codes == code))
+                    for code, symbol in enumerate(CLUSTER_SYMBOLS)
+                ]
+            )
+            first = True
+            for symbol, mask in symbol_masks:
+                if not mask.any():
+                    continue
+                coordinates = {
+                    "x": view_df[projection_x].to_numpy()[mask],
+                    "y": view_df[projection_y].to_numpy()[mask],
+                }
+                trace_type = go.Scattergl
+                if plot_3d:
+                    coordinates["z"] = view_df[projection_z].to_numpy()[mask]
+                    trace_type = go.Scatter3d
+                fig.add_trace(
+                    trace_type(
+                        **coordinates,
+                        mode="markers",
+                        name=name,
+                        legendgroup=name,
+                        showlegend=first,
+                        marker=dict(color=color, symbol=symbol, opacity=opacity),
+                        customdata=customdata[mask],
+                        hovertemplate=hovertemplate,
+                    )
+                )
+                first = False
+        fig.update_layout(legend_title_text="Activity")
 
+    if plot_3d:
+        fig.update_layout(scene=dict(xaxis_title="X", yaxis_title="Y", zaxis_title="Z"))
+    else:
+        fig.update_layout(xaxis_title="X", yaxis_title="Y")
+        if x_range is not None:
+            fig.update_xaxes(range=list(x_range))
+        if y_range is not None:
+            fig.update_yaxes(range=list(y_range))
     fig.update_yaxes(title_standoff=15, automargin=True)
     fig.update_xaxes(title_standoff=30, automargin=True)
     fig.update_layout(
+        title=title,
         modebar=dict(orientation="v"),
         margin=dict(r=35, l=15, b=0),
         title_x=0.5,
@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.storage import CachingFileStorage, LocalFileStorage
+from dashboard.storage.caching import shared_storage
+
+
+@pytest.fixture
+def local_storage(tmp_path) -> LocalFileStorage:
+    LocalFileStorage.set_data_folder(tmp_path)
+    return LocalFileStorage()
+
+
+def npz_bytes(**arrays) -> bytes:
+    stream = io.BytesIO()
+    np.savez_compressed(stream, **arrays)
+    return stream.getvalue()
+
+
+def test_decoded_artifacts_are_cached(local_storage):
+    storage = CachingFileStorage(local_storage)
+    storage.save_file("a.pq", pd.DataFrame({"x": [1, 2, 3]}).to_parquet())
+    storage.save_file("a.npz", npz_bytes(arr_0=np.arange(4)))
+
+    assert storage.read_parquet("a.pq")["x"].tolist() == [1, 2, 3]
+    assert storage.read_parquet("a.pq")["x"].tolist() == [1, 2, 3]
+    assert storage.read_npz("a.npz")["arr_0"].tolist() == [0, 1, 2, 3]
+    assert storage.read_npz("a.npz")["arr_0"].tolist() == [0, 1, 2, 3]
+    stats = storage.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+    assert stats["bytes"] > 0
+
+
+def test_cached_values_are_not_modified_by_callers(local_storage):
+    storage = CachingFileStorage(local_storage)
+    storage.save_file("a.pq", pd.DataFrame({"x": [1, 2, 3]}).to_parquet())
+    storage.save_file("a.npz", npz_bytes(arr_0=np.arange(4)))
+
+    df = storage.read_parquet("a.pq")
+    df.loc[0, "x"] = 100
+    df["y"] = 1
+    assert storage.read_parquet("a.pq").to_dict("list") == {"x": [1, 2, 3]}
+    with pytest.raises(ValueError):
+        storage.read_npz("a.npz")["arr_0"][0] = 100
+
+
+def test_saving_invalidates_cache(local_storage):
+    storage = CachingFileStorage(local_storage)
+    storage.save_file("a.pq", pd.DataFrame({"x": [1]}).to_parquet())
+    storage.read_parquet("a.pq")
+    storage.save_file("a.pq", pd.DataFrame({"x": [2]}).to_parquet())
+    assert storage.stats()["entries"] == 0
+    assert storage.read_parquet("a.pq")["x"].tolist() == [2]
+
+    # written around the cache, e.g. by another worker
+    local_storage.save_file("a.pq", pd.DataFrame({"x": [3, 3]}).to_parquet())
+    assert storage.read_parquet("a.pq")["x"].tolist() == [3, 3]
+    assert storage.stats()["misses"] == 3
+
+
+def test_least_recently_used_are_evicted(local_storage):
+    size = pd.DataFrame({"x": np.arange(1000)}).memory_usage(deep=True).sum()
+    storage = CachingFileStorage(local_storage, max_bytes=2 * size)
+    for name in ("a.pq", "b.pq", "c.pq"):
+        storage.save_file(name, pd.DataFrame({"x": np.arange(1000)}).to_parquet())
+
+    storage.read_parquet("a.pq")
+    storage.read_parquet("b.pq")
+    storage.read_parquet("a.pq")
+    storage.read_parquet("c.pq")
+    stats = storage.stats()
+    assert (stats["entries"], stats["evictions"]) == (2, 1)
+    assert stats["bytes"] <= 2 * size
+
+    storage.read_parquet("a.pq")
+    assert storage.stats()["hits"] == 2
+    storage.read_parquet("b.pq")
+    assert storage.stats()["misses"] == 4
+
+
+def test_missing_file_raises(local_storage):
+    with pytest.raises(FileNotFoundError):
+        CachingFileStorage(local_storage).read_parquet("missing.pq")
+
+
+def test_pages_share_one_cache():
+    storage = shared_storage()
+    assert isinstance(storage.storage, LocalFileStorage)
+    assert shared_storage() is storage
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from dashboard.data.controls import (
+    LABELED_ANNOTATIONS,
+    annotate_control_masks,
+    generate_control_masks,
+    generate_controls,
+)
+
+
+def test_annotate_control_masks():
+    masks = generate_control_masks(4)
+    assert annotate_control_masks(masks[[0, 15, 1, 14, 3, 7]], 4).tolist() == [
+        "ALL NEGATIVE",
+        "ALL POSITIVE",
+        "ALL BUT ONE NEGATIVE",
+        "ALL BUT ONE POSITIVE",
+        "MORE POSITIVE",
+        "ALL BUT ONE POSITIVE",
+    ]
+    assert annotate_control_masks(masks[[0]], 0).tolist() == ["NOT CONTROL"]
+
+
+def test_generate_controls():
+    columns = ["% ACTIVATION A", "% INHIBITION B", "% ACTIVATION C"]
+    controls = generate_controls(columns)
+    assert len(controls) == 8
+    assert controls.loc[0, columns].tolist() == [0, 100, 0]
+    assert controls.loc[5, columns].tolist() == [100, 100, 100]
+    assert (
+        controls.loc[0, "EOS"]
+        == "POS: ; NEG: % ACTIVATION A, % INHIBITION B, % ACTIVATION C"
+    )
+    assert controls.loc[5, "annotation"] == "ALL BUT ONE POSITIVE"
+    # only labeled annotations get IDs
+    assert (
+        controls["EOS"].notna() == controls["annotation"].isin(LABELED_ANNOTATIONS)
+    ).all()
+
+
+def test_generate_controls_samples_above_cap():
+    num_assays = 30
+    masks = generate_control_masks(num_assays, max_controls=500)
+    assert len(masks) <= 500 and len(np.unique(masks)) == len(masks)
+    counts = dict(
+        zip(*np.unique(annotate_control_masks(masks, num_assays), return_counts=True))
+    )
+    assert counts["ALL NEGATIVE"] == counts["ALL POSITIVE"] == 1
+    assert counts["ALL BUT ONE NEGATIVE"] == counts["ALL BUT ONE POSITIVE"] == 30
+    with pytest.raises(ValueError):
+        generate_control_masks(64)
@@ -0,0 +1,58 @@
+import logging
+
+import numpy as np
+
+from dashboard.visualization.figure_cache import (
+    FigureCache,
+    LRUCache,
+    _render_all,
+    ic50_cache_key,
+    neighbour_compounds,
+)
+
+ENTRY = {"EOS": "EOS1", "TOP": 100.0, "BOTTOM": 0.0, "ic50": 1.0, "slope": 1.5}
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_ic50_cache_key_matches_nan_parameters():
+    entry = {**ENTRY, "ic50": np.nan, "slope": float("nan")}
+    assert ic50_cache_key(entry) == ic50_cache_key(dict(entry))
+
+
+def test_ic50_figure_is_reused_until_parameters_change():
+    cache = FigureCache()
+    x, y = np.array([0.1, 1.0, 10.0]), np.array([5.0, 50.0, 95.0])
+    figure = cache.ic50_figure(ENTRY, x, y)
+    assert cache.ic50_figure(dict(ENTRY), x, y) is figure
+    assert cache.ic50_figure({**ENTRY, "TOP": 90.0}, x, y) is not figure
+
+
+def test_smiles_svg_is_keyed_by_canonical_smiles():
+    cache = FigureCache()
+    svg = cache.smiles_svg("OCC")
+    assert cache.smiles_svg("CCO") is svg
+
+
+def test_neighbour_compounds():
+    compounds = ["a", "b", "c", "d"]
+    assert neighbour_compounds(compounds, "b") == ["c", "a"]
+    assert neighbour_compounds(compounds, "d") == ["c"]
+    assert neighbour_compounds(compounds, "x") == []
+
+
+def test_prefetch_failures_are_logged(caplog):
+    cache = FigureCache()
+    # an entry without fit parameters fails the IC50 rendering
+    points = {"EOS1": (np.array([0.1, 1.0]), np.array([5.0, 95.0]))}
+    with caplog.at_level(logging.WARNING):
+        _render_all(cache, [{"EOS": "EOS1"}], points, [])
+    assert "IC50 prefetch failed for EOS1" in caplog.text
+    assert len(cache.figures) == 0
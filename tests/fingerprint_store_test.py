@@ -0,0 +1,99 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from dashboard.data import fingerprint_store
+from dashboard.data.fingerprint_store import FingerprintStore
+from dashboard.data.structural_similarity import compute_ecfp_descriptors
+
+SMILES = ["CCO", "not a smiles", "OCC", "c1ccccc1"]
+
+
+@pytest.fixture
+def store(tmp_path) -> FingerprintStore:
+    return FingerprintStore(tmp_path)
+
+
+def test_store_returns_same_descriptors_as_direct_computation(store):
+    expected, expected_idx = compute_ecfp_descriptors(SMILES)
+    descriptors, keep_idx = compute_ecfp_descriptors(SMILES, store=store)
+    assert keep_idx == expected_idx
+    assert np.array_equal(descriptors, expected)
+
+    cached, cached_idx = compute_ecfp_descriptors(SMILES, store=store)
+    assert cached_idx == expected_idx
+    assert np.array_equal(cached, expected)
+
+
+def test_store_keys_by_canonical_smiles_and_aliases(store):
+    compute_ecfp_descriptors(["OCC"], store=store)
+    positions, _ = store.lookup(["CCO", "OCC", "CCN"])
+    assert positions.tolist() == [0, 1]
+
+
+def test_store_is_shared_through_disk(store, tmp_path):
+    compute_ecfp_descriptors(SMILES, store=store)
+    other = FingerprintStore(tmp_path)
+    positions, fingerprints = other.lookup(SMILES)
+    assert positions.tolist() == [0, 2, 3]
+    assert fingerprints.shape == (3, 256)
+
+
+def test_store_is_pickled_as_its_directory(store):
+    compute_ecfp_descriptors(SMILES, store=store)
+    unpickled = pickle.loads(pickle.dumps(store))
+    assert unpickled.directory == store.directory
+    assert pickle.dumps(unpickled) == pickle.dumps(store)
+    positions, _ = unpickled.lookup(SMILES)
+    assert positions.tolist() == [0, 2, 3]
+    # jobs of one process share the unpickled store with its loaded fingerprints
+    assert pickle.loads(pickle.dumps(store)) is unpickled
+
+
+def test_store_compacts_segments(store, monkeypatch):
+    monkeypatch.setattr(fingerprint_store, "MAX_SEGMENTS", 2)
+    for smiles in ["C", "CC", "CCC", "CCCC"]:
+        compute_ecfp_descriptors([smiles], store=store)
+    assert len(list(store.directory.glob("segment-*.pq"))) <= 2
+    assert len(store) == 4
+
+
+def test_store_reloads_segments_compacted_by_another_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(fingerprint_store, "MAX_SEGMENTS", 2)
+    reader, writer = FingerprintStore(tmp_path), FingerprintStore(tmp_path)
+    for smiles in ["C", "CC"]:
+        compute_ecfp_descriptors([smiles], store=writer)
+    compute_ecfp_descriptors(["C"], store=reader)
+
+    compute_ecfp_descriptors(["CCC"], store=writer)
+    compute_ecfp_descriptors(["C"], store=reader)
+    assert len(list(reader.directory.glob("segment-*.pq"))) == 1
+    assert len(reader) == 3
+    assert len(reader._fingerprints) == 3
+
+
+def test_store_counts_only_existing_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(fingerprint_store, "MAX_SEGMENTS", 2)
+    compactions = []
+    compact = FingerprintStore._compact
+    monkeypatch.setattr(
+        FingerprintStore,
+        "_compact",
+        lambda self: compactions.append(self) or compact(self),
+    )
+    reader, writer = FingerprintStore(tmp_path), FingerprintStore(tmp_path)
+    for smiles in ["C", "CC"]:
+        compute_ecfp_descriptors([smiles], store=writer)
+    compute_ecfp_descriptors(["C"], store=reader)
+    compute_ecfp_descriptors(["CCC"], store=writer)
+    assert compactions == [writer]
+
+    compute_ecfp_descriptors(["CCCC"], store=reader)
+    assert compactions == [writer]
+    assert len(reader) == 4
+
+
+def test_store_rejects_mismatched_parameters(store):
+    with pytest.raises(ValueError):
+        compute_ecfp_descriptors(SMILES, radius=3, store=store)
@@ -0,0 +1,91 @@
+import io
+import zipfile
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from dashboard.pages.hit_validation.report.generate_report import (
+    PLOTLYJS_FILENAME,
+    get_report_template,
+    write_eos_reports_zip,
+    write_hit_validation_workbook,
+)
+from dashboard.visualization.ic50_images import (
+    IMAGE_CACHE,
+    group_screening_points,
+    render_ic50_images,
+)
+
+
+def make_screening_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "EOS": ["EOS1"] * 3 + ["EOS2"] * 3,
+            "CONCENTRATION": [0.1, 1.0, 10.0] * 2,
+            "VALUE": [5.0, 50.0, 95.0, 1.0, 2.0, 3.0],
+        }
+    )
+
+
+def make_hit_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "EOS": ["EOS1", "EOS2", "EOS3"],
+            "TOP": [100.0, 3.0, 1.0],
+            "BOTTOM": [0.0, 1.0, 0.0],
+            "ic50": [1.0, np.nan, 1.0],
+            "slope": [1.0, np.nan, 1.0],
+        }
+    )
+
+
+def test_group_screening_points():
+    points = group_screening_points(make_screening_df())
+    assert set(points) == {"EOS1", "EOS2"}
+    assert np.array_equal(points["EOS2"][1], [1.0, 2.0, 3.0])
+
+
+def test_render_ic50_images_uses_cache():
+    IMAGE_CACHE.clear()
+    entries = make_hit_df().to_dict("records")
+    points = group_screening_points(make_screening_df())
+    images = render_ic50_images(entries, points)
+    assert images[0].startswith(b"\x89PNG") and images[1] is not None
+    assert images[2] is None
+    assert render_ic50_images(entries, points)[0] is images[0]
+
+
+def test_write_hit_validation_workbook():
+    hit_df = make_hit_df()
+    hit_df.insert(1, "Image", None)
+    stream = io.BytesIO()
+    images = render_ic50_images(
+        hit_df.to_dict("records"), group_screening_points(make_screening_df())
+    )
+    write_hit_validation_workbook(stream, hit_df, images)
+    worksheet = openpyxl.load_workbook(stream).active
+    assert [cell.value for cell in worksheet[1]] == hit_df.columns.tolist()
+    assert [cell.value for cell in worksheet["A"][1:]] == ["EOS1", "EOS2", "EOS3"]
+    assert len(worksheet._images) == 2
+
+
+def test_write_eos_reports_zip_shares_plotlyjs():
+    hit_df = make_hit_df().iloc[:2]
+    hit_df["min_value"] = hit_df["max_value"] = hit_df["r2"] = 0.5
+    hit_df["modulation_ic50"] = hit_df["concentration_50"] = 1.0
+    hit_df["activity_final"] = "active"
+    hit_df["is_partially_active"] = False
+    points = group_screening_points(make_screening_df())
+    tasks = [
+        (entry, *points[entry["EOS"]], smiles, 1.0)
+        for entry, smiles in zip(hit_df.to_dict("records"), ["CCO", None])
+    ]
+    stream = io.BytesIO()
+    write_eos_reports_zip(stream, tasks)
+    archive = zipfile.ZipFile(stream)
+    names = archive.namelist()
+    assert names[0] == PLOTLYJS_FILENAME and len(names) == 3
+    report = archive.read(names[1]).decode()
+    assert f'src="{PLOTLYJS_FILENAME}"' in report and "<svg" in report
+    assert get_report_template() is get_report_template()
@@ -0,0 +1,157 @@
+import pathlib
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.data.jobs import (
+    DONE,
+    FAILED,
+    JobRunner,
+    input_hash,
+    process_instance,
+    shared_runner,
+)
+
+
+def add(a: int, b: int, progress) -> int:
+    progress.update(1.0, "Added")
+    return a + b
+
+
+def fail(path: str, progress) -> None:
+    with open(path, "a") as file:
+        file.write("x")
+    raise ValueError("wrong input")
+
+
+def count_calls(path: str, progress) -> int:
+    with open(path, "a") as file:
+        file.write("x")
+    return len(pathlib.Path(path).read_text())
+
+
+def wait_for_flag(flag: str, progress) -> str:
+    progress.update(0.5, "Waiting", partial=["first"])
+    while not pathlib.Path(flag).exists():
+        time.sleep(0.01)
+    return "done"
+
+
+def wait_until_finished(runner: JobRunner, key: str):
+    for _ in range(1000):
+        status = runner.status(key)
+        if status is not None and status.finished:
+            return status
+        time.sleep(0.02)
+    raise TimeoutError
+
+
+@pytest.fixture
+def runner(tmp_path) -> JobRunner:
+    return JobRunner(tmp_path / "jobs", max_workers=1)
+
+
+def test_input_hash_follows_content():
+    df = pd.DataFrame({"x": [1, 2], "y": ["a", "b"]})
+    assert input_hash(df, 1) == input_hash(df.copy(), 1)
+    assert input_hash(df, 1) != input_hash(df.assign(x=[1, 3]), 1)
+    assert input_hash(np.arange(3)) != input_hash(np.arange(3).astype(float))
+    assert input_hash(("ab", "c")) != input_hash(("a", "bc"))
+    assert input_hash({"a": 1, "b": 2}) == input_hash({"b": 2, "a": 1})
+
+
+def test_job_result(runner):
+    key = runner.submit(add, 1, 2)
+    status = wait_until_finished(runner, key)
+    assert (status.state, status.progress) == (DONE, 1.0)
+    assert runner.result(key) == 3
+    assert runner.status("unknown") is None
+
+
+def test_jobs_are_deduplicated_by_inputs(runner, tmp_path):
+    calls = str(tmp_path / "calls")
+    key = runner.submit(count_calls, calls)
+    wait_until_finished(runner, key)
+    assert runner.submit(count_calls, calls) == key
+    # another runner sharing the directory, e.g. in another server process
+    other = JobRunner(runner.directory)
+    assert other.submit(count_calls, calls) == key
+    assert runner.result(key) == 1
+    assert pathlib.Path(calls).read_text() == "x"
+
+
+def test_concurrent_submits_start_one_job(runner, tmp_path):
+    calls = str(tmp_path / "calls")
+    # separate runners only share the directory, as in separate server processes
+    runners = [JobRunner(runner.directory, max_workers=1) for _ in range(4)]
+    barrier = threading.Barrier(len(runners))
+    keys = []
+
+    def submit(other):
+        barrier.wait()
+        keys.append(other.submit(count_calls, calls))
+
+    threads = [threading.Thread(target=submit, args=(other,)) for other in runners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(keys)) == 1
+    assert wait_until_finished(runner, keys[0]).state == DONE
+    assert pathlib.Path(calls).read_text() == "x"
+
+
+def test_process_instance_is_shared(tmp_path):
+    runner = process_instance(JobRunner, tmp_path)
+    assert process_instance(JobRunner, tmp_path) is runner
+    assert process_instance(JobRunner, tmp_path / "other") is not runner
+
+
+def test_pages_share_runner(tmp_path):
+    runner = shared_runner(tmp_path)
+    assert runner.directory == tmp_path / "jobs"
+    assert shared_runner(str(tmp_path)) is runner
+
+
+def test_failed_job_is_started_again(runner, tmp_path):
+    calls = str(tmp_path / "calls")
+    key = runner.submit(fail, calls)
+    status = wait_until_finished(runner, key)
+    assert (status.state, status.error) == (FAILED, "wrong input")
+    assert runner.submit(fail, calls) == key
+    wait_until_finished(runner, key)
+    assert pathlib.Path(calls).read_text() == "xx"
+
+
+def test_partial_result_is_polled(runner, tmp_path):
+    flag = tmp_path / "flag"
+    key = runner.submit(wait_for_flag, str(flag))
+    for _ in range(1000):
+        status = runner.status(key)
+        if status.partial is not None:
+            break
+        time.sleep(0.02)
+    assert (status.state, status.progress, status.message) == (
+        "running",
+        0.5,
+        "Waiting",
+    )
+    assert status.partial == ["first"]
+    flag.touch()
+    assert wait_until_finished(runner, key).state == DONE
+    assert runner.result(key) == "done"
+
+
+def test_interrupted_job_is_failed(runner):
+    key = runner.submit(add, 2, 2)
+    wait_until_finished(runner, key)
+    status_path = runner.directory / f"{key}.status"
+    status = runner.status(key)
+    status.state, status.pid = "running", 2**22 + 1
+    # left behind by a killed worker
+    status_path.write_bytes(pickle.dumps(status))
+    assert runner.status(key).state == FAILED
@@ -1,3 +1,10 @@
+import multiprocessing
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
 import pytest
 
 from dashboard.storage import LocalFileStorage
@@ -23,3 +30,97 @@ def test_read_file_returns_correctly(temp_file_storage: LocalFileStorage):
 def test_read_file_raises_on_missing_file(temp_file_storage: LocalFileStorage):
     with pytest.raises(FileNotFoundError):
         temp_file_storage.read_file("test")
+
+
+@pytest.fixture
+def plates_df() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 1000
+    return pd.DataFrame(
+        {
+            "plate": rng.choice([f"P{i:02d}" for i in range(20)], n),
+            "value": rng.normal(size=n),
+            "EOS": [f"EOS{i}" for i in range(n)],
+        }
+    )
+
+
+def test_save_table_sorts_rows_into_row_groups(
+    temp_file_storage: LocalFileStorage, plates_df, tmp_path
+):
+    temp_file_storage.save_table(
+        "table.pq", plates_df, sort_by="plate", row_group_size=100
+    )
+    metadata = pq.ParquetFile(tmp_path / "table.pq").metadata
+    assert metadata.num_row_groups == 10
+
+    saved = temp_file_storage.read_parquet("table.pq")
+    assert saved["plate"].is_monotonic_increasing
+    pd.testing.assert_frame_equal(saved.sort_index(), plates_df)
+
+
+def test_read_table_selects_columns_and_rows(
+    temp_file_storage: LocalFileStorage, plates_df
+):
+    temp_file_storage.save_table("table.pq", plates_df, sort_by="plate")
+
+    df = temp_file_storage.read_table(
+        "table.pq",
+        columns=["plate", "value"],
+        filters=[[("plate", "in", ["P03", "P07"])], [("value", ">", 2.0)]],
+    )
+    expected = plates_df[
+        plates_df["plate"].isin(["P03", "P07"]) | (plates_df["value"] > 2.0)
+    ]
+    assert list(df.columns) == ["plate", "value"]
+    assert sorted(df["value"]) == sorted(expected["value"])
+
+
+def test_read_buffer_maps_file(temp_file_storage: LocalFileStorage):
+    temp_file_storage.save_file("test", np.arange(5, dtype=np.int64).tobytes())
+    buffer = temp_file_storage.read_buffer("test")
+    assert not buffer.is_mutable
+    assert np.frombuffer(buffer, dtype=np.int64).tolist() == [0, 1, 2, 3, 4]
+    assert bytes(memoryview(buffer)) == temp_file_storage.read_file("test")
+
+
+def test_save_file_replaces_file(temp_file_storage: LocalFileStorage, tmp_path):
+    temp_file_storage.save_file("test", b"old")
+    version = temp_file_storage.file_version("test")
+    buffer = temp_file_storage.read_buffer("test")
+    temp_file_storage.save_file("test", b"new")
+    # mapped readers keep the file they opened
+    assert bytes(memoryview(buffer)) == b"old"
+    assert temp_file_storage.read_file("test") == b"new"
+    assert temp_file_storage.file_version("test") != version
+    assert [path.name for path in tmp_path.iterdir()] == ["test"]
+
+
+def increment_counter(storage: LocalFileStorage, session: str, times: int) -> None:
+    for _ in range(times):
+        with storage.session_lock(session):
+            count = int(storage.read_file(f"{session}_count"))
+            storage.save_file(f"{session}_count", str(count + 1).encode())
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs fork")
+def test_session_lock_excludes_processes(temp_file_storage: LocalFileStorage):
+    session = str(uuid.uuid4())
+    temp_file_storage.save_file(f"{session}_count", b"0")
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=increment_counter, args=(temp_file_storage, session, 50))
+        for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    increment_counter(temp_file_storage, session, 50)
+    for worker in workers:
+        worker.join()
+    assert temp_file_storage.read_file(f"{session}_count") == b"200"
+
+
+def test_session_lock_rejects_other_names(temp_file_storage: LocalFileStorage):
+    with pytest.raises(ValueError):
+        with temp_file_storage.session_lock("../fingerprints"):
+            pass
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.visualization.plots import (
+    plot_clustered_smiles,
+    plot_projection_2d,
+    plot_projection_3d,
+    projection_density,
+    selected_rows,
+    viewport_ranges,
+)
+
+
+@pytest.fixture
+def projection_df():
+    rng = np.random.default_rng(0)
+    n = 3000
+    return pd.DataFrame(
+        {
+            "EOS": [f"EOS{i}" for i in range(n)],
+            "PCA_X": rng.normal(size=n),
+            "PCA_Y": rng.normal(size=n),
+            "PCA_Z": rng.normal(size=n),
+            "% ACTIVATION": rng.uniform(0, 100, n),
+            "activity_final": rng.choice(["active", "inactive", "not tested"], n),
+            "cluster_PCA": rng.choice(["0", "1", "2", "3", "4", "outlier"], n),
+        }
+    )
+
+
+def test_projection_density_means():
+    x = np.array([0.1, 0.2, 0.9, 0.9, 0.6])
+    y = np.array([0.1, 0.3, 0.9, 0.8, 0.2])
+    values = np.array([1.0, 3.0, 5.0, np.nan, 7.0])
+    _, _, z, counts = projection_density(x, y, values, (0, 1), (0, 1), bins=2)
+    # rows are y bins, columns are x bins
+    assert counts.tolist() == [[2, 1], [0, 2]]
+    assert z[0, 0] == 2.0 and z[0, 1] == 7.0 and z[1, 1] == 5.0
+    assert np.isnan(z[1, 0])
+
+
+def test_large_projection_is_binned(projection_df):
+    fig = plot_projection_2d(projection_df, "% ACTIVATION", max_points=1000)
+    assert [trace.type for trace in fig.data] == ["heatmap"]
+    assert np.nansum(fig.data[0].customdata) == len(projection_df)
+
+    zoomed = plot_projection_2d(
+        projection_df,
+        "% ACTIVATION",
+        max_points=1000,
+        x_range=(0.0, 0.5),
+        y_range=(0.0, 0.5),
+    )
+    rows = zoomed.data[0].customdata[:, 0]
+    in_view = projection_df.iloc[rows]
+    assert zoomed.data[0].type in ("scatter", "scattergl")
+    assert in_view["PCA_X"].between(0.0, 0.5).all()
+    assert (
+        len(rows)
+        == (
+            projection_df["PCA_X"].between(0.0, 0.5)
+            & projection_df["PCA_Y"].between(0.0, 0.5)
+        ).sum()
+    )
+
+
+def test_large_3d_projection_is_sampled(projection_df):
+    fig = plot_projection_3d(projection_df, "% ACTIVATION", max_points=500)
+    rows = fig.data[0].customdata[:, 0]
+    assert len(rows) == 500
+    assert np.all(np.diff(rows) > 0)
+
+
+def test_clustered_smiles_traces(projection_df):
+    fig = plot_clustered_smiles(projection_df)
+    rows = np.concatenate([trace.customdata[:, 0] for trace in fig.data]).astype(int)
+    assert sorted(rows) == list(range(len(projection_df)))
+    assert len(fig.data) <= 3 * 4 + 1
+    assert sorted(trace.name for trace in fig.data if trace.showlegend) == [
+        "active",
+        "inactive",
+        "not tested",
+        "outliers",
+    ]
+    assert (
+        plot_clustered_smiles(projection_df, max_points=100).data[0].type == "heatmap"
+    )
+
+
+def test_viewport_ranges():
+    assert viewport_ranges(None) is None
+    assert viewport_ranges({"autosize": True}) is None
+    assert viewport_ranges({"xaxis.autorange": True}) == (None, None)
+    assert viewport_ranges(
+        {"xaxis.range[0]": 1, "xaxis.range[1]": 2, "yaxis.range": [3, 4]}
+    ) == ((1, 2), (3, 4))
+
+
+def test_selected_rows():
+    selection = {"points": [{"pointIndex": 0, "customdata": [7, "EOS7"]}]}
+    assert selected_rows(selection) == [7]
+    # points of the controls overlay have no row
+    assert selected_rows({"points": [{"pointIndex": 3}]}) == []
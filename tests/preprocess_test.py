@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from dashboard.data.memory import row_chunks
+from dashboard.data.preprocess import MergedAssaysPreprocessor
+
+
+def test_row_chunks_respect_memory_limit():
+    chunks = row_chunks(10, row_bytes=8, memory_limit=32, min_rows=3)
+    assert [(rows.start, rows.stop) for rows in chunks] == [(0, 4), (4, 10)]
+    assert row_chunks(0, row_bytes=8) == []
+
+
+def test_apply_projection_in_chunks_matches_full_fit():
+    rng = np.random.default_rng(0)
+    columns = [f"% ACTIVATION {i}" for i in range(4)]
+    # well separated variances, so that incremental fit approximates full one
+    scales = [5, 3, 1, 0.5]
+    compounds_df = pd.DataFrame(rng.normal(size=(50, 4)) * scales, columns=columns)
+    compounds_df["EOS"] = [f"EOS{i}" for i in range(50)]
+    controls_df = pd.DataFrame(rng.normal(size=(5, 4)), columns=columns)
+
+    def project(projector, memory_limit=None):
+        preprocessor = MergedAssaysPreprocessor()
+        preprocessor.set_compounds_df(compounds_df.copy()).set_controls_df(
+            controls_df.copy()
+        ).set_columns_for_projection(columns)
+        preprocessor.apply_projection(projector, "PCA", memory_limit=memory_limit)
+        return preprocessor.get_processed_compounds_df()[["PCA_X", "PCA_Y"]]
+
+    full = project(PCA(n_components=2))
+    # 10 rows of 4 float64 columns per chunk
+    chunked = project(IncrementalPCA(n_components=2), memory_limit=10 * 4 * 8)
+    assert chunked.shape == full.shape
+    assert np.allclose(np.abs(chunked), np.abs(full), atol=0.05)
+
+
+def test_combine_assays_joins_means_of_assay_columns():
+    def assay_csv(values: list[float]) -> io.StringIO:
+        df = pd.DataFrame(
+            {
+                "EOS": ["E1", "E1", "E2", "E3"][: len(values)],
+                "Source Well": "A01",
+                "Destination Well": "B02",
+                "% ACTIVATION": values,
+                "Z-SCORE": values,
+            }
+        )
+        return io.StringIO(df.to_csv())
+
+    preprocessor = MergedAssaysPreprocessor().combine_assays_for_projections(
+        (("a", assay_csv([1.0, 3.0, 5.0, 7.0])), ("b", assay_csv([0.0, 2.0, 4.0])))
+    )
+    merged_df = preprocessor.get_processed_compounds_df()
+    assert merged_df.index.name == "EOS"
+    assert merged_df.index.tolist() == ["E1", "E2"]
+    assert merged_df.columns.tolist() == [
+        "% ACTIVATION a",
+        "Z-SCORE a",
+        "% ACTIVATION b",
+        "Z-SCORE b",
+    ]
+    assert merged_df["% ACTIVATION a"].tolist() == [2.0, 5.0]
+    assert merged_df["Z-SCORE b"].tolist() == [1.0, 4.0]
@@ -0,0 +1,118 @@
+import pathlib
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.decomposition import PCA
+
+from dashboard.data.jobs import FAILED, JobRunner
+from dashboard.data.projection_jobs import ProjectionJobs
+
+
+@dataclass
+class CountedSetup:
+    """
+    Picklable projection setup, counting its calls in a file, as the jobs run
+    in worker processes
+    """
+
+    calls: str
+    failing_calls: int = 0
+
+    def __call__(self):
+        with open(self.calls, "a") as file:
+            file.write("x")
+        if len(pathlib.Path(self.calls).read_text()) <= self.failing_calls:
+            raise RuntimeError("projection failed")
+        return [(PCA(n_components=3), "PCA"), (PCA(n_components=2), "UMAP")]
+
+
+@pytest.fixture
+def merged_df():
+    rng = np.random.default_rng(0)
+    columns = [f"% ACTIVATION {i}" for i in range(4)] + ["Z-SCORE 0"]
+    df = pd.DataFrame(rng.normal(size=(30, 5)), columns=columns)
+    df.index = pd.Index([f"EOS{i}" for i in range(30)], name="EOS")
+    return df
+
+
+@pytest.fixture(scope="module")
+def runner(tmp_path_factory) -> JobRunner:
+    # shared, so that umap is imported by a single worker process; jobs of the
+    # tests differ by the files counting calls of their setups
+    return JobRunner(tmp_path_factory.mktemp("projections") / "jobs", max_workers=1)
+
+
+@pytest.fixture
+def counted_setup(tmp_path) -> CountedSetup:
+    return CountedSetup(str(tmp_path / "calls"))
+
+
+def wait_for_result(jobs: ProjectionJobs, key: str):
+    # a new worker process imports umap first, which takes a while
+    for _ in range(5000):
+        result = jobs.result(key)
+        if result is not None:
+            return result
+        status = jobs.status(key)
+        if status is not None and status.state == FAILED:
+            return status
+        time.sleep(0.02)
+    raise TimeoutError
+
+
+def test_jobs_are_keyed_by_data(merged_df, runner, counted_setup):
+    jobs = ProjectionJobs(runner, setup_fn=counted_setup)
+    key = jobs.submit(merged_df)
+    result = wait_for_result(jobs, key)
+    assert result.projection_columns == [f"% ACTIVATION {i}" for i in range(4)]
+    assert {"PCA_X", "PCA_Z", "UMAP_Y"} <= set(result.projections_df.columns)
+    assert {"PCA_X", "UMAP_Y", "annotation"} <= set(result.controls_df.columns)
+    assert "PCA_X" not in merged_df.columns
+    assert set(result.spatial_indexes) == {"PCA", "UMAP"}
+    assert result.spatial_indexes["PCA"].query()[0] == len(merged_df)
+    assert jobs.result(key) is result
+
+    changed = merged_df.copy()
+    changed.iloc[0, 0] += 1
+    assert jobs.submit(changed) != key
+
+    # another session or server process reuses the persisted result
+    assert jobs.submit(merged_df.copy()) == key
+    other = ProjectionJobs(
+        JobRunner(runner.directory, max_workers=1), setup_fn=counted_setup
+    )
+    assert other.submit(merged_df) == key
+    reloaded = other.result(key)
+    assert np.allclose(reloaded.projections_df["PCA_X"], result.projections_df["PCA_X"])
+    wait_for_result(jobs, jobs.submit(changed))
+    assert pathlib.Path(counted_setup.calls).read_text() == "xx"
+
+
+def test_results_in_memory_are_bounded(merged_df, runner, counted_setup):
+    jobs = ProjectionJobs(runner, max_results=1, setup_fn=counted_setup)
+    first = jobs.submit(merged_df)
+    second = jobs.submit(merged_df * 2)
+    first_result = wait_for_result(jobs, first)
+    wait_for_result(jobs, second)
+    assert list(jobs._results) == [second]
+    # evicted results are loaded again from the job files
+    reloaded = jobs.result(first)
+    assert reloaded is not first_result
+    assert np.allclose(
+        reloaded.projections_df["PCA_X"], first_result.projections_df["PCA_X"]
+    )
+
+
+def test_failed_job_is_reported_and_restarted(merged_df, runner, tmp_path):
+    setup = CountedSetup(str(tmp_path / "calls"), failing_calls=1)
+    jobs = ProjectionJobs(runner, setup_fn=setup)
+    key = jobs.submit(merged_df)
+    status = wait_for_result(jobs, key)
+    assert (status.state, status.error) == (FAILED, "projection failed")
+    assert jobs.result(key) is None
+
+    assert jobs.submit(merged_df) == key
+    assert "PCA_Y" in wait_for_result(jobs, key).projections_df
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.data import reference_embedding
+from dashboard.data.reference_embedding import (
+    ReferenceEmbeddingStore,
+    TanimotoKnnIndex,
+    embedding_version,
+)
+from dashboard.data.similarity_search import TanimotoSearch
+from dashboard.data.structural_similarity import (
+    compute_ecfp_descriptors,
+    fingerprints_to_csr,
+)
+
+SMILES = ["C" * n for n in range(1, 16)] + ["c1ccccc1" + "C" * n for n in range(15)]
+
+
+@pytest.fixture
+def library_path(tmp_path):
+    path = tmp_path / "library.pq"
+    library_df = pd.DataFrame(
+        {"EOS": [f"EOS{i}" for i in range(len(SMILES))], "smiles": SMILES}
+    )
+    library_df.to_parquet(path)
+    return path
+
+
+def test_knn_index_query_matches_search():
+    packed, _ = compute_ecfp_descriptors(SMILES)
+    indices, distances = TanimotoKnnIndex(packed).query(
+        fingerprints_to_csr(packed[:5]), k=3
+    )
+    expected_indices, similarities = TanimotoSearch(packed).search(packed[:5], k=3)
+    assert indices.dtype == np.int32 and distances.dtype == np.float32
+    assert np.array_equal(indices[:, 0], np.arange(5))
+    assert np.allclose(distances, 1 - similarities)
+
+
+def test_embedding_version_follows_library(library_path):
+    version = embedding_version(library_path)
+    assert embedding_version(library_path) == version
+    pd.DataFrame({"EOS": ["EOS0"], "smiles": ["C"]}).to_parquet(library_path)
+    assert embedding_version(library_path) != version
+
+
+def test_reference_embedding_is_fitted_once_and_places_new_compounds(
+    library_path, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(reference_embedding, "PROJECTION_COMPONENTS", {"PCA": 3})
+    embedding = ReferenceEmbeddingStore(tmp_path / "embeddings", library_path).get()
+    assert len(list((tmp_path / "embeddings").glob("reference_*.pkl"))) == 1
+
+    loaded = ReferenceEmbeddingStore(tmp_path / "embeddings", library_path).get()
+    assert loaded.version == embedding.version
+    assert np.allclose(loaded.projections["PCA"], embedding.projections["PCA"])
+
+    df = pd.DataFrame({"EOS": ["EOS3", "NEW"], "smiles": [SMILES[3], "CCCCO"]})
+    packed, _ = compute_ecfp_descriptors(df["smiles"])
+    projected = loaded.project(df, packed)
+    assert projected.columns.tolist() == [
+        "EOS",
+        "smiles",
+        "PCA_X",
+        "PCA_Y",
+        "PCA_Z",
+        "cluster_PCA",
+    ]
+    assert np.allclose(
+        projected.loc[0, ["PCA_X", "PCA_Y", "PCA_Z"]].to_numpy(dtype=float),
+        embedding.projections["PCA"][3],
+    )
+    assert projected.loc[1, "cluster_PCA"] in set(embedding.clusters["PCA"])
+
+
+def test_pickled_umap_transforms_new_compounds(tmp_path, monkeypatch):
+    # compounds sharing ring bits, so that no vertex of the kNN graph is disconnected
+    smiles = [
+        ring + "C" * n + tail
+        for ring in ("c1ccccc1", "C1CCCCC1", "c1ccncc1")
+        for n in range(1, 10)
+        for tail in ("", "O", "N")
+    ]
+    library_path = tmp_path / "library.pq"
+    pd.DataFrame(
+        {"EOS": [f"EOS{i}" for i in range(len(smiles))], "smiles": smiles}
+    ).to_parquet(library_path)
+    packed, _ = compute_ecfp_descriptors(["c1ccccc1CCCC(=O)O", "C1CCCCC1CCCl"])
+
+    monkeypatch.setattr(reference_embedding, "PROJECTION_COMPONENTS", {"UMAP": 2})
+    embedding = ReferenceEmbeddingStore(tmp_path / "embeddings", library_path).get()
+    loaded = ReferenceEmbeddingStore(tmp_path / "embeddings", library_path).get()
+    assert loaded is not embedding
+    assert isinstance(loaded.models["UMAP"]._knn_search_index, TanimotoKnnIndex)
+    placed, clusters = loaded.transform(packed)["UMAP"]
+    assert placed.shape == (2, 2) and np.isfinite(placed).all()
+    assert set(clusters) <= set(embedding.clusters["UMAP"]) | {"outlier"}
+    # transforming is deterministic for the same reference embedding
+    assert np.allclose(placed, embedding.transform(packed)["UMAP"][0])
+
+
+def test_missing_umap_attributes_are_reported():
+    model = SimpleNamespace(knn_search_index=None, precomputed_knn=(None, None, None))
+    with pytest.raises(RuntimeError, match="_knn_search_index"):
+        reference_embedding._replace_knn_index(model, None)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from dashboard.data import scaffolds as scaffolds_module
+from dashboard.data.scaffolds import (
+    ScaffoldCache,
+    compute_scaffolds,
+    scaffold_hit_statistics,
+)
+
+SMILES = ["c1ccccc1CCO", "OCCc1ccccc1", "c1ccccc1", "CCO", "not a smiles", None]
+
+
+def test_compute_scaffolds():
+    scaffolds = compute_scaffolds(SMILES)
+    assert scaffolds.tolist() == ["c1ccccc1", "c1ccccc1", "c1ccccc1", "", None, None]
+
+
+def test_compute_scaffolds_reuses_cache(monkeypatch):
+    cache = ScaffoldCache()
+    expected = compute_scaffolds(SMILES, cache=cache)
+    # canonical smiles and input spellings of the valid smiles, without repeats
+    assert len(cache) == 4
+
+    def fail(chunk):
+        raise AssertionError("cached smiles were processed again")
+
+    monkeypatch.setattr(scaffolds_module, "_scaffold_chunk", fail)
+    assert compute_scaffolds(SMILES[:4] + ["CCO"], cache=cache).tolist() == (
+        expected[:4].tolist() + [""]
+    )
+
+
+def test_scaffold_cache_is_bounded():
+    cache = ScaffoldCache(max_size=4)
+    # canonical smiles OCCc1ccccc1 and the alias
+    compute_scaffolds(["c1ccccc1CCO"], cache=cache)
+    assert cache.lookup(["c1ccccc1CCO"]) == {0: "c1ccccc1"}
+    compute_scaffolds(["CCO", "C1CCCCC1N"], cache=cache)
+    assert len(cache) == 4
+    # the least recently used smiles are evicted first
+    assert cache.lookup(["c1ccccc1CCO", "OCCc1ccccc1", "CCO"]) == {
+        0: "c1ccccc1",
+        2: "",
+    }
+
+
+def test_scaffold_hit_statistics():
+    df = pd.DataFrame(
+        {
+            "activity_final": ["active", "inactive", "active", "active", "not tested"],
+            "ic50": ["1.0", "3.0", None, "2.0", None],
+        }
+    )
+    scaffolds = np.array(["c1ccccc1", "c1ccccc1", "c1ccncc1", None, "c1ccncc1"])
+    stats = scaffold_hit_statistics(df, scaffolds, ["ic50"])
+    assert stats.columns.tolist() == [
+        "scaffold",
+        "n_compounds",
+        "n_tested",
+        "n_active",
+        "hit_rate",
+        "mean_ic50",
+    ]
+    assert stats["scaffold"].tolist() == ["c1ccccc1", "c1ccncc1"]
+    assert stats["n_compounds"].tolist() == [2, 2]
+    assert stats["n_tested"].tolist() == [2, 1]
+    assert stats["hit_rate"].tolist() == [0.5, 1.0]
+    assert stats.loc[0, "mean_ic50"] == 2.0 and np.isnan(stats.loc[1, "mean_ic50"])
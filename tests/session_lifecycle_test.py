@@ -0,0 +1,146 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from dashboard.storage import LocalFileStorage
+from dashboard.storage.sessions import SessionLifecycle, main, session_of
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def data_folder(tmp_path):
+    for directory in ("fingerprints", "embeddings", "projections"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / f"{uuid.uuid4()}_shared.npz").write_bytes(b"x")
+    (tmp_path / "notes.txt").write_bytes(b"not a session file")
+    return tmp_path
+
+
+def make_session(folder, age: float, size: int = 10) -> str:
+    session = str(uuid.uuid4())
+    timestamp = time.time() - age
+    for artifact in ("bmg_df.pq", "bmg_val.npz"):
+        path = folder / f"{session}_{artifact}"
+        path.write_bytes(b"x" * size)
+        os.utime(path, (timestamp, timestamp))
+    return session
+
+
+def session_files(folder) -> set[str]:
+    return {session_of(path.name) for path in folder.iterdir()} - {None}
+
+
+def test_session_of():
+    session = str(uuid.uuid4())
+    assert session_of(f"{session}_bmg_df.pq") == session
+    assert session_of(f".{session}_bmg_df.pq.1f2e.tmp") == session
+    assert session_of("predictions.pq") is None
+    assert session_of("fingerprints") is None
+
+
+def test_expired_sessions_are_deleted(data_folder):
+    old = make_session(data_folder, age=10 * DAY)
+    recent = make_session(data_folder, age=DAY)
+
+    lifecycle = SessionLifecycle(data_folder, ttl=7 * DAY)
+    assert lifecycle.sweep(dry_run=True) == [old]
+    assert session_files(data_folder) == {old, recent}
+    assert lifecycle.sweep() == [old]
+    assert session_files(data_folder) == {recent}
+    # shared files and directories are kept
+    assert (data_folder / "notes.txt").exists()
+    for directory in ("fingerprints", "embeddings", "projections"):
+        assert len(list((data_folder / directory).iterdir())) == 1
+
+
+def test_access_extends_session(data_folder):
+    session = make_session(data_folder, age=10 * DAY)
+    lifecycle = SessionLifecycle(data_folder, ttl=7 * DAY)
+    LocalFileStorage.set_data_folder(data_folder)
+    LocalFileStorage.set_session_lifecycle(lifecycle)
+    try:
+        LocalFileStorage().read_file(f"{session}_bmg_df.pq")
+    finally:
+        LocalFileStorage.set_session_lifecycle(None)
+    assert lifecycle.sweep() == []
+    assert session_files(data_folder) == {session}
+
+
+def test_oldest_sessions_are_evicted_above_quota(data_folder):
+    oldest = make_session(data_folder, age=3 * DAY, size=100)
+    older = make_session(data_folder, age=2 * DAY, size=100)
+    old = make_session(data_folder, age=DAY, size=100)
+    active = make_session(data_folder, age=60, size=1000)
+
+    lifecycle = SessionLifecycle(data_folder, ttl=None, max_bytes=500)
+    # the active session alone exceeds the quota but is never evicted
+    assert lifecycle.sweep() == [oldest, older, old]
+    assert session_files(data_folder) == {active}
+
+    usage = lifecycle.usage()
+    assert [(u.session, len(u.files), u.size) for u in usage] == [(active, 2, 2000)]
+
+
+def test_shared_directories_count_toward_quota(data_folder):
+    old = make_session(data_folder, age=DAY, size=100)
+    recent = make_session(data_folder, age=DAY / 2, size=100)
+    (data_folder / "fingerprints" / "segment-1.pq").write_bytes(b"x" * 300)
+
+    lifecycle = SessionLifecycle(data_folder, ttl=None, max_bytes=600)
+    shared = lifecycle.shared_usage()
+    assert [(u.directory, len(u.files)) for u in shared] == [
+        ("embeddings", 1),
+        ("fingerprints", 2),
+        ("projections", 1),
+    ]
+    assert sum(u.size for u in shared) == 303
+    assert lifecycle.sweep() == [old]
+    assert session_files(data_folder) == {recent}
+    assert (data_folder / "fingerprints" / "segment-1.pq").exists()
+
+
+def test_expired_job_files_are_deleted(data_folder):
+    jobs = data_folder / "jobs"
+    jobs.mkdir()
+    timestamp = time.time() - 10 * DAY
+    for name in ("old.status", "old.pkl", ".submit.lock"):
+        (jobs / name).write_bytes(b"x")
+        os.utime(jobs / name, (timestamp, timestamp))
+    (jobs / "recent.status").write_bytes(b"x")
+    old_segment = data_folder / "fingerprints" / "segment-1.pq"
+    old_segment.write_bytes(b"x")
+    os.utime(old_segment, (timestamp, timestamp))
+
+    lifecycle = SessionLifecycle(data_folder, ttl=7 * DAY)
+    lifecycle.sweep(dry_run=True)
+    assert len(list(jobs.iterdir())) == 4
+    lifecycle.sweep()
+    assert {path.name for path in jobs.iterdir()} == {".submit.lock", "recent.status"}
+    # other shared directories are only counted
+    assert old_segment.exists()
+
+
+def test_sweeper_thread(data_folder):
+    old = make_session(data_folder, age=10 * DAY)
+    lifecycle = SessionLifecycle(data_folder, ttl=7 * DAY)
+    lifecycle.start(interval=0.01)
+    try:
+        deadline = time.time() + 5
+        while old in session_files(data_folder) and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        lifecycle.stop()
+    assert session_files(data_folder) == set()
+
+
+def test_cli_report(data_folder, capsys):
+    session = make_session(data_folder, age=DAY, size=1024)
+    main(["report", "--data-dir", str(data_folder)])
+    output = capsys.readouterr().out
+    assert session in output
+    assert "1 sessions, 2.0 KB" in output
+    assert "fingerprints/" in output
+    assert "3 shared directories, 3.0 B; total 2.0 KB" in output
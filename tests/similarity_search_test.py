@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+from rdkit import Chem, DataStructs
+from rdkit.Chem import rdFingerprintGenerator
+
+from dashboard.data import similarity_search
+from dashboard.data.similarity_search import (
+    MaxMinPicker,
+    TanimotoSearch,
+    as_words,
+    butina_clusters,
+    popcount_rows,
+    similarity_graph,
+    tanimoto_block,
+)
+from dashboard.data.structural_similarity import (
+    compute_ecfp_descriptors,
+    find_nearest_neighbors,
+)
+
+SMILES = [
+    "CCO",
+    "CCN",
+    "CCCO",
+    "c1ccccc1",
+    "c1ccccc1O",
+    "CC(=O)Oc1ccccc1C(=O)O",
+    "CC(=O)Nc1ccc(O)cc1",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+]
+
+
+def rdkit_similarities(queries: list[str], library: list[str]) -> np.ndarray:
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=2, fpSize=2048)
+    library_fps = [generator.GetFingerprint(Chem.MolFromSmiles(s)) for s in library]
+    return np.array(
+        [
+            DataStructs.BulkTanimotoSimilarity(
+                generator.GetFingerprint(Chem.MolFromSmiles(query)), library_fps
+            )
+            for query in queries
+        ]
+    )
+
+
+def test_tanimoto_block_matches_rdkit():
+    packed, _ = compute_ecfp_descriptors(SMILES)
+    words = as_words(packed)
+    counts = popcount_rows(words)
+    similarities = tanimoto_block(words, counts, words.T.copy(), counts)
+    assert np.allclose(similarities, rdkit_similarities(SMILES, SMILES), atol=1e-6)
+
+
+def test_tanimoto_block_of_empty_fingerprints_is_zero():
+    words = np.zeros((2, 4), dtype=np.uint64)
+    counts = popcount_rows(words)
+    assert not tanimoto_block(words, counts, words.T, counts).any()
+
+
+def test_search_returns_sorted_top_k(monkeypatch):
+    monkeypatch.setattr(similarity_search, "QUERY_BLOCK_SIZE", 3)
+    monkeypatch.setattr(similarity_search, "LIBRARY_BLOCK_SIZE", 2)
+    packed, _ = compute_ecfp_descriptors(SMILES)
+    neighbors, scores = TanimotoSearch(packed).search(packed, k=3)
+
+    expected = rdkit_similarities(SMILES, SMILES)
+    assert neighbors.shape == scores.shape == (len(SMILES), 3)
+    assert (neighbors[:, 0] == np.arange(len(SMILES))).all()
+    assert (np.diff(scores, axis=1) <= 0).all()
+    assert np.allclose(scores, -np.sort(-expected, axis=1)[:, :3], atol=1e-6)
+
+
+def test_search_in_threads_matches_single_thread(monkeypatch):
+    monkeypatch.setattr(similarity_search, "LIBRARY_BLOCK_SIZE", 2)
+    packed, _ = compute_ecfp_descriptors(SMILES)
+    serial = TanimotoSearch(packed).search(packed[:3], k=4)
+    threaded = TanimotoSearch(packed).search(packed[:3], k=4, n_jobs=3)
+    assert np.allclose(serial[1], threaded[1])
+
+
+def test_find_nearest_neighbors():
+    query_df = pd.DataFrame({"EOS": ["Q1", "Q2", "Q3"], "smiles": SMILES[:2] + ["?"]})
+    library_df = pd.DataFrame(
+        {"EOS": [f"L{i}" for i in range(len(SMILES))], "smiles": SMILES}
+    )
+    library_df["toxicity"] = np.arange(len(SMILES), dtype=float)
+    result = find_nearest_neighbors(query_df, library_df, k=2)
+    assert result.columns.tolist() == [
+        "EOS",
+        "rank",
+        "neighbor_EOS",
+        "neighbor_toxicity",
+        "similarity",
+    ]
+    assert result["EOS"].tolist() == ["Q1", "Q1", "Q2", "Q2"]
+    assert result["rank"].tolist() == [1, 2, 1, 2]
+    assert result.loc[result["rank"] == 1, "neighbor_EOS"].tolist() == ["L0", "L1"]
+    assert result.loc[0, "similarity"] == 1
+
+
+def brute_force_similarities(packed: np.ndarray) -> np.ndarray:
+    dense = np.unpackbits(packed, axis=1).astype(np.float64)
+    intersection = dense @ dense.T
+    counts = dense.sum(axis=1)
+    union = counts[:, None] + counts[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(union), where=union > 0)
+
+
+def test_similarity_graph_matches_brute_force(monkeypatch):
+    monkeypatch.setattr(similarity_search, "QUERY_BLOCK_SIZE", 4)
+    monkeypatch.setattr(similarity_search, "LIBRARY_BLOCK_SIZE", 8)
+    rng = np.random.default_rng(0)
+    density = rng.uniform(0.01, 0.3, size=(60, 1))
+    packed = np.packbits(rng.random((60, 128)) < density, axis=1)
+    packed = np.vstack([packed, packed[:10]])  # identical pairs
+
+    expected = brute_force_similarities(packed)
+    np.fill_diagonal(expected, 0)
+    expected[expected < 0.3] = 0
+    for n_jobs in (1, 3):
+        graph = similarity_graph(packed, threshold=0.3, n_jobs=n_jobs)
+        assert np.allclose(graph.toarray(), expected, atol=1e-6)
+
+
+def test_butina_clusters_around_centroids():
+    packed, _ = compute_ecfp_descriptors(SMILES * 2 + ["C"])
+    labels = butina_clusters(packed, threshold=0.99)
+    # every compound is clustered with its duplicate, the single one is an outlier
+    assert labels[-1] == -1
+    assert (labels[: len(SMILES)] == labels[len(SMILES) : 2 * len(SMILES)]).all()
+    assert len(set(labels[:-1])) == len(SMILES)
+
+    similarities = brute_force_similarities(packed)
+    labels = butina_clusters(packed, threshold=0.3)
+    for cluster in set(labels) - {-1}:
+        members = np.flatnonzero(labels == cluster)
+        # some member (the centroid) is within the threshold of all the others
+        assert (similarities[np.ix_(members, members)] >= 0.3).all(axis=1).any()
+
+
+def brute_force_maxmin(packed: np.ndarray, first: int, n_picks: int) -> list[int]:
+    distances = 1 - brute_force_similarities(packed)
+    picked = [first]
+    while len(picked) < n_picks:
+        min_distances = distances[:, picked].min(axis=1)
+        min_distances[picked] = -1
+        picked.append(int(np.argmax(min_distances)))
+    return picked
+
+
+def test_maxmin_picker_matches_brute_force(monkeypatch):
+    monkeypatch.setattr(similarity_search, "LIBRARY_BLOCK_SIZE", 8)
+    rng = np.random.default_rng(0)
+    packed = np.packbits(rng.random((50, 128)) < 0.2, axis=1)
+    picker = MaxMinPicker(packed, random_state=0)
+    picks = picker.pick(4) + picker.pick(6)
+    assert len(set(picks)) == 10
+    assert picks == brute_force_maxmin(packed, picks[0], 10)
+    assert picker.picked == picks
+    assert len(picker.pick(100)) == 40
+
+
+def test_maxmin_picker_avoids_seeds():
+    packed, _ = compute_ecfp_descriptors(SMILES + ["CCCCCCO"])
+    seeds, _ = compute_ecfp_descriptors(SMILES[1:])
+    picks = MaxMinPicker(packed, seeds=seeds).pick(2)
+    # candidates equal to the seeds are picked last
+    assert set(picks) == {0, len(SMILES)}
+    assert MaxMinPicker(packed[:0]).pick(3) == []
@@ -0,0 +1,44 @@
+import io
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from dashboard.pages.data_projection_smiles.callbacks import (
+    on_diverse_picks_button_click,
+)
+from dashboard.storage import LocalFileStorage
+from dashboard.visualization.plots import plot_clustered_smiles
+
+
+def test_diverse_picks_exclude_selected_points_of_any_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(LocalFileStorage, "data_folder", tmp_path)
+    storage = LocalFileStorage()
+    session = str(uuid.uuid4())
+    df = pd.DataFrame(
+        {
+            "EOS": [f"EOS{i}" for i in range(6)],
+            "smiles": ["CCO", "c1ccccc1", "CCN", "CCCl", "c1ccncc1", "CCCCO"],
+            "activity_final": ["inactive", "active"] * 3,
+            "PCA_X": np.arange(6.0),
+            "PCA_Y": np.arange(6.0),
+            "cluster_PCA": ["c0", "c0", "c1", "c1", "outlier", "outlier"],
+        }
+    )
+    storage.save_file(f"{session}_smiles_merged.pq", df.to_parquet())
+
+    # selected points are numbered within their trace, not by dataframe row
+    figure = plot_clustered_smiles(df)
+    selection = {
+        "points": [
+            {"curveNumber": number, "pointIndex": index, "customdata": list(point)}
+            for number, trace in enumerate(figure.data)
+            for index, point in enumerate(trace.customdata)
+            if point[1] in ("EOS3", "EOS5")
+        ]
+    }
+    assert len({point["curveNumber"] for point in selection["points"]}) == 2
+
+    download = on_diverse_picks_button_click(1, 10, selection, session, storage)
+    picked = pd.read_csv(io.StringIO(download["content"]))
+    assert picked["EOS"].tolist() == ["EOS1"]
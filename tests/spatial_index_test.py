@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from dashboard.data.spatial_index import GridIndex
+
+
+def brute_force_query(x, y, x_range, y_range):
+    x_low, x_high = x_range or (-np.inf, np.inf)
+    y_low, y_high = y_range or (-np.inf, np.inf)
+    return np.flatnonzero((x >= x_low) & (x <= x_high) & (y >= y_low) & (y <= y_high))
+
+
+@pytest.mark.parametrize(
+    "x_range, y_range",
+    [
+        ((-0.5, 0.7), (-1.0, 2.0)),
+        ((-3.0, 3.0), None),
+        (None, (0.0, 0.1)),
+        ((-100.0, 100.0), (-100.0, 100.0)),
+        (None, None),
+        ((0.2, 0.2000001), None),
+    ],
+)
+def test_query_matches_brute_force(x_range, y_range):
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=5000), rng.normal(size=5000) * 3
+    index = GridIndex(x, y)
+
+    count, rows = index.query(x_range, y_range)
+    expected = brute_force_query(x, y, x_range, y_range)
+    assert count == len(expected)
+    assert np.array_equal(np.sort(rows), expected)
+
+
+def test_query_pages():
+    rng = np.random.default_rng(1)
+    x, y = rng.uniform(size=2000), rng.uniform(size=2000)
+    index = GridIndex(x, y, points_per_cell=4)
+
+    count, rows = index.query((0.1, 0.8), (0.3, 0.9))
+    pages = [
+        index.query((0.1, 0.8), (0.3, 0.9), offset=offset, limit=100)
+        for offset in range(0, count, 100)
+    ]
+    assert all(page_count == count for page_count, _ in pages)
+    assert np.array_equal(np.concatenate([page for _, page in pages]), rows)
+
+
+def test_query_includes_points_on_bounds():
+    x = np.array([0.0, 1.0, 2.0, 3.0])
+    y = np.array([0.0, 1.0, 2.0, 3.0])
+    count, rows = GridIndex(x, y, points_per_cell=1).query((1.0, 2.0), (1.0, 2.0))
+    assert count == 2
+    assert sorted(rows) == [1, 2]
+
+
+def test_empty_query():
+    index = GridIndex(np.arange(10.0), np.arange(10.0))
+    assert index.query((5.0, 4.0), None)[0] == 0
+    assert index.query((20.0, 30.0), None)[0] == 0
+    assert GridIndex(np.empty(0), np.empty(0)).query()[0] == 0
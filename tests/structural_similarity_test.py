@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+from rdkit import Chem
+from rdkit.Chem import rdFingerprintGenerator
+from sklearn.decomposition import PCA
+
+from dashboard.data import structural_similarity
+from dashboard.data.structural_similarity import (
+    MIN_CLIFF_DISTANCE,
+    FingerprintPCA,
+    butina_cluster_names,
+    calculate_packed_pca,
+    compute_ecfp_descriptors,
+    find_activity_cliffs,
+    fingerprints_to_csr,
+    iter_unpacked_fingerprints,
+    unpack_fingerprints,
+)
+
+SMILES = ["CCO", "not a smiles", "c1ccccc1", None, "CC(=O)Oc1ccccc1C(=O)O", "CCN"]
+
+
+def dense_ecfp(smiles: str) -> np.ndarray:
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=2, fpSize=2048)
+    return generator.GetFingerprintAsNumPy(Chem.MolFromSmiles(smiles))
+
+
+def test_compute_ecfp_descriptors_packs_bits():
+    packed, keep_idx = compute_ecfp_descriptors(SMILES)
+    assert keep_idx == [0, 2, 4, 5]
+    assert packed.dtype == np.uint8 and packed.shape == (4, 256)
+    expected = np.vstack([dense_ecfp(SMILES[i]) for i in keep_idx])
+    assert np.array_equal(unpack_fingerprints(packed, dtype=np.uint8), expected)
+
+
+def test_compute_ecfp_descriptors_in_parallel_matches_serial(monkeypatch):
+    serial, serial_idx = compute_ecfp_descriptors(SMILES * 3)
+    monkeypatch.setattr(structural_similarity, "MIN_PARALLEL_SMILES", 0)
+    monkeypatch.setattr(structural_similarity, "SMILES_CHUNK_SIZE", 4)
+    parallel, parallel_idx = compute_ecfp_descriptors(SMILES * 3, n_jobs=2)
+    assert parallel_idx == serial_idx
+    assert np.array_equal(parallel, serial)
+
+
+def test_compute_ecfp_descriptors_rejects_unaligned_bits():
+    with pytest.raises(ValueError):
+        compute_ecfp_descriptors(SMILES, n_bits=100)
+
+
+def test_iter_unpacked_fingerprints_chunks():
+    packed, _ = compute_ecfp_descriptors(SMILES)
+    chunks = list(iter_unpacked_fingerprints(packed, chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert chunks[0].dtype == np.bool_ and chunks[0].shape[1] == 2048
+
+
+def test_fingerprints_to_csr_matches_dense():
+    packed, _ = compute_ecfp_descriptors(SMILES)
+    sparse = fingerprints_to_csr(packed)
+    assert sparse.shape == (4, 2048) and sparse.dtype == np.float32
+    assert np.array_equal(
+        sparse.toarray(), unpack_fingerprints(packed, dtype=np.float32)
+    )
+
+
+def test_calculate_packed_pca_matches_dense_pca():
+    packed, _ = compute_ecfp_descriptors(SMILES * 4)
+    pca = PCA(n_components=2).fit(unpack_fingerprints(packed, dtype=np.float64))
+    projected = calculate_packed_pca(packed, n_components=2)
+    assert np.allclose(projected, pca.transform(unpack_fingerprints(packed)))
+
+
+def test_fingerprint_pca_in_chunks():
+    packed, _ = compute_ecfp_descriptors(SMILES * 4)
+    expected = FingerprintPCA(n_components=3).fit(packed)
+    # two unpacked rows per chunk
+    model = FingerprintPCA(n_components=3, memory_limit=2 * 2048)
+    model.partial_fit(packed[:5]).partial_fit(packed[5:])
+    assert model.n_samples_seen_ == len(packed)
+    assert np.allclose(model.components_, expected.components_)
+    assert np.allclose(model.transform(packed), expected.transform(packed))
+    assert np.isclose(expected.explained_variance_ratio_.sum(), 1)
+
+
+def test_find_activity_cliffs():
+    df = pd.DataFrame(
+        {
+            "EOS": ["A", "B", "C", "D", "E"],
+            "smiles": ["CCCCCCCCO", "CCCCCCCCO", "c1ccccc1", "c1ccccc1", "CCCCCCCCCO"],
+            "activity_final": ["active", "inactive", "active", "not tested", "active"],
+            "ic50": ["1.0", "9.0", "2.0", None, "4.0"],
+        }
+    )
+    packed, _ = compute_ecfp_descriptors(df["smiles"])
+
+    cliffs = find_activity_cliffs(df, packed, threshold=0.5)
+    assert cliffs[["EOS_1", "EOS_2"]].values.tolist() == [["A", "B"], ["B", "E"]]
+    assert cliffs.loc[0, "similarity"] == 1
+
+    cliffs = find_activity_cliffs(df, packed, activity_column="ic50", threshold=0.5)
+    assert cliffs[["EOS_1", "EOS_2"]].values.tolist() == [
+        ["A", "B"],
+        ["B", "E"],
+        ["A", "E"],
+    ]
+    assert cliffs.loc[0, "score"] == pytest.approx(8 / MIN_CLIFF_DISTANCE)
+    assert np.allclose(cliffs["ic50_1"] - cliffs["ic50_2"], [-8, 5, -3])
+
+
+def test_butina_cluster_names_keep_invalid_smiles_as_outliers():
+    smiles = pd.Series(["CCCCCCCCO", "not a smiles", "CCCCCCCCCO", "c1ccccc1"])
+    names = butina_cluster_names(smiles)
+    assert names[0] == names[2] == "c0"
+    assert names[1] == names[3] == "outlier"
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from rdkit import Chem
+
+from dashboard.data import substructure_search
+from dashboard.data.substructure_search import (
+    SubstructureSearch,
+    parse_query,
+    pattern_fingerprint,
+)
+
+SMILES = [
+    "CCO",
+    "not a smiles",
+    "c1ccccc1",
+    "c1ccccc1O",
+    None,
+    "CC(=O)Oc1ccccc1C(=O)O",
+    "CC(=O)Nc1ccc(O)cc1",
+    "c1ccncc1",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+]
+
+
+def brute_force_matches(query: str) -> list[int]:
+    query_mol = parse_query(query)
+    return [
+        i
+        for i, smiles in enumerate(SMILES)
+        if isinstance(smiles, str)
+        and (mol := Chem.MolFromSmiles(smiles)) is not None
+        and mol.HasSubstructMatch(query_mol)
+    ]
+
+
+def test_pattern_fingerprint_bits_are_contained_in_superstructure():
+    query = pattern_fingerprint(Chem.MolFromSmarts("c1ccccc1"))
+    mol = pattern_fingerprint(Chem.MolFromSmiles("CC(=O)Oc1ccccc1C(=O)O"))
+    assert query.any()
+    assert np.array_equal(query & mol, query)
+
+
+@pytest.mark.parametrize("query", ["c1ccccc1", "[OX2H]", "C(=O)[N,O]", "c1ccncc1"])
+def test_search_matches_rdkit(query, monkeypatch):
+    monkeypatch.setattr(substructure_search, "MOLECULE_CHUNK_SIZE", 3)
+    search = SubstructureSearch(SMILES)
+    assert search.search(query).tolist() == brute_force_matches(query)
+    assert set(search.search(query)) <= set(search.screen(query))
+
+
+def test_kekule_smiles_query_matches_aromatic_molecules():
+    search = SubstructureSearch(SMILES)
+    assert search.search("C1=CC=CC=C1").tolist() == search.search("c1ccccc1").tolist()
+    assert search.search("C1=CC=CC=C1").tolist() == [2, 3, 5, 6]
+
+
+def test_screen_prunes_candidates():
+    search = SubstructureSearch(SMILES)
+    assert len(search.screen("c1ccncc1")) < len(search.valid_idx)
+
+
+def test_invalid_query_raises():
+    with pytest.raises(ValueError):
+        SubstructureSearch(SMILES).search("C((")